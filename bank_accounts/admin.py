@@ -4,6 +4,12 @@ from . models import *
 admin.site.register(BankAccount)
 admin.site.register(Transaction)
 admin.site.register(LedgerEntry)
+admin.site.register(DailyBalance)
+admin.site.register(MonthlyAggregate)
+admin.site.register(PeriodVersion)
+admin.site.register(LedgerCheckpoint)
+admin.site.register(IdempotencyKey)
+admin.site.register(ChangeLog)
 admin.site.register(CashbookEntry)
 admin.site.register(Payment)
 admin.site.register(Budget)
@@ -1,6 +1,38 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 
 
 class BankAccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bank_accounts'
+
+    def ready(self):
+        post_migrate.connect(_ensure_search_index, sender=self)
+        connection_created.connect(_connect_search_index)
+
+        # Keep the authentication user cache in step with the user table
+        from django.contrib.auth import get_user_model
+        from .authentication import evict_cached_user, evict_cached_user_m2m
+
+        User = get_user_model()
+        post_save.connect(evict_cached_user, sender=User, dispatch_uid='bank_accounts.evict_user_save')
+        post_delete.connect(evict_cached_user, sender=User, dispatch_uid='bank_accounts.evict_user_delete')
+        for through in (User.groups.through, User.user_permissions.through):
+            m2m_changed.connect(evict_cached_user_m2m, sender=through)
+
+
+def _ensure_search_index(sender, using, plan=None, **kwargs):
+    # Migrations that rebuild the transaction table on SQLite drop the FTS triggers
+    from .search import install_search_index
+    from .models import Transaction
+
+    connection = connections[using]
+    if Transaction._meta.db_table in connection.introspection.table_names():
+        install_search_index(connection)
+
+
+def _connect_search_index(sender, connection, **kwargs):
+    from .search import connect_search_index
+    connect_search_index(connection)
@@ -0,0 +1,166 @@
+# bank_accounts/async_views.py
+#
+# Async-native versions of the read endpoints behind the slow queries, served under /api/async/.
+# Behind an ASGI server (college_bank_backend/asgi.py) they await Django's async ORM, so a slow
+# client or a long streamed statement waits on the event loop instead of holding a worker
+# thread; under WSGI they still work, one thread per request as usual. Django still runs each
+# query in the process's one sync thread, so query throughput is no higher than the threaded
+# WSGI workers' (`manage.py benchmark_asgi` compares the two). Parameters, status codes and
+# response bodies match the DRF endpoints they mirror, which share the query and shaping code.
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+
+from .authentication import CachedJWTAuthentication
+from .conditional import aaccount_etag, aaccounts_etag, client_has, make_etag
+from .metrics import serializing
+from .models import STATEMENT_ORDER, BankAccount, Transaction
+from .reports import (
+    ACCOUNT_TOTALS, ahead_pivot, dashboard_account, dashboard_month, dashboard_queries, dashboard_summary, pivot_params,
+)
+from .routers import astream_from, reading_from, report_database
+from .serializers import BankAccountSerializer, TransactionSerializer, values_fields
+from .statements import StatementJSONEncoder, astream_statement, statement_period
+from .views import BankAccountViewSet
+
+
+def json_response(data, status=200, headers=None):
+    """JSON like DRF renders it: decimals stay strings, dates are ISO 8601."""
+    return JsonResponse(data, encoder=StatementJSONEncoder, safe=False, status=status, headers=headers)
+
+
+class AsyncReadView(View):
+    """
+    Base for async GET endpoints: authenticated like the DRF API (CachedJWTAuthentication,
+    authenticated users only), with every query going to the report replica (routers.py).
+    Handlers get a DRF Request, so the shared helpers can read `query_params`.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        authenticator = CachedJWTAuthentication()
+        try:
+            credentials = await authenticator.aauthenticate(request)
+        except AuthenticationFailed as exc:
+            return self.unauthorized(request, authenticator, exc.detail)
+        if credentials is None:
+            return self.unauthorized(request, authenticator, "Authentication credentials were not provided.")
+        request.user, request.auth = credentials
+
+        alias = report_database()
+        if alias is None:
+            return await super().dispatch(request, *args, **kwargs)
+        with reading_from(alias):
+            response = await super().dispatch(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = astream_from(alias, response.streaming_content)
+        return response
+
+    @staticmethod
+    def unauthorized(request, authenticator, detail):
+        return json_response(
+            detail if isinstance(detail, dict) else {"detail": detail}, status=status.HTTP_401_UNAUTHORIZED,
+            headers={'WWW-Authenticate': authenticator.authenticate_header(request)},
+        )
+
+
+class AccountListView(AsyncReadView):
+    """BankAccountViewSet.list: the same filters, keyset pages and ETag."""
+
+    async def get(self, request):
+        etag = await aaccounts_etag(request)
+        if client_has(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        # The viewset only configures the query here (no filter backend it uses touches the database)
+        viewset = BankAccountViewSet(request=request, format_kwarg=None, action='list', kwargs={})
+        lookups, to_representation = values_fields(viewset.get_serializer())
+        queryset = viewset.filter_queryset(viewset.get_queryset()).values(*lookups)
+        paginator = viewset.paginator
+        try:
+            page = await paginator.apaginate_queryset(queryset, request, view=viewset)
+        except NotFound as exc:
+            return json_response({"detail": exc.detail}, status=status.HTTP_404_NOT_FOUND)
+        with serializing():
+            data = [to_representation(row) for row in page]
+        return json_response(paginator.get_paginated_data(data), headers={'ETag': etag})
+
+
+class AccountDetailView(AsyncReadView):
+    """BankAccountViewSet.retrieve, with its ETag."""
+
+    async def get(self, request, pk):
+        etag = await aaccount_etag(request, pk)
+        if client_has(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        try:
+            account = await BankAccount.objects.aget(pk=pk)
+        except BankAccount.DoesNotExist:
+            return json_response({"detail": "No BankAccount matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+        return json_response(BankAccountSerializer(account).data, headers={'ETag': etag} if etag else None)
+
+
+class BankStatementView(AsyncReadView):
+    """TransactionViewSet.bank_statement; ?stream=true streams the rows with async iteration."""
+
+    async def get(self, request):
+        try:
+            account_id, start_date, end_date = statement_period(request.query_params)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            account = await BankAccount.objects.aget(id=account_id)
+        except (BankAccount.DoesNotExist, ValueError):
+            return json_response({"error": "Bank account not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = make_etag(account.id, account.version, account.updated_at, request.get_full_path())
+        if client_has(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        account_data = BankAccountSerializer(account).data
+        if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+            return StreamingHttpResponse(
+                astream_statement(account_data, account, start_date, end_date),
+                content_type='application/json', headers={'ETag': etag},
+            )
+        transactions = Transaction.objects.select_related('account', 'created_by').filter(
+            account=account, transaction_date__range=[start_date, end_date],
+        ).order_by(*STATEMENT_ORDER)
+        rows = [txn async for txn in transactions]
+        return json_response({
+            "account": account_data,
+            "transactions": TransactionSerializer(rows, many=True, context={'request': request}).data,
+        }, headers={'ETag': etag})
+
+
+class DashboardSummaryView(AsyncReadView):
+    """views.DashboardSummaryView."""
+
+    async def get(self, request):
+        try:
+            month = dashboard_month(request.query_params.get('month'))
+        except ValueError:
+            return json_response({"error": "month must be YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            account_id = dashboard_account(request.query_params.get('account'))
+        except ValueError:
+            return json_response({"error": "account must be an account id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        accounts, by_type, heads, modes = dashboard_queries(month, account_id)
+        return json_response(dashboard_summary(
+            month, await accounts.aaggregate(**ACCOUNT_TOTALS),
+            [row async for row in by_type], [row async for row in heads], [row async for row in modes],
+        ))
+
+
+class HeadPivotReportView(AsyncReadView):
+    """views.HeadPivotReportView, sharing its cache."""
+
+    async def get(self, request):
+        try:
+            params = pivot_params(request.query_params)
+        except ValueError as exc:
+            return json_response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return json_response(await ahead_pivot(*params))
@@ -0,0 +1,140 @@
+# bank_accounts/authentication.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """Thread-safe LRU of user objects by token user id, each entry expiring after `ttl` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user id -> (expires at, user)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that looks each user up at most once per TTL per process.
+
+    Saving or deleting a user (or changing their groups or permissions) evicts them from
+    this process's cache straight away; other processes notice within AUTH_USER_CACHE_TTL
+    seconds. With AUTH_TOKEN_USER_FOR_SAFE_METHODS, GET/HEAD/OPTIONS requests skip the
+    database entirely and get a TokenUser built from the token's claims, so a deactivated
+    user keeps read access until their access token expires.
+    """
+
+    def authenticate(self, request):
+        self.stateless = (
+            getattr(settings, 'AUTH_TOKEN_USER_FOR_SAFE_METHODS', False) and request.method in SAFE_METHODS
+        )
+        return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views: the token checks and cache hits stay on the event loop;
+        only a cache miss looks the user up, in a thread.
+        """
+        self.stateless = (
+            getattr(settings, 'AUTH_TOKEN_USER_FOR_SAFE_METHODS', False) and request.method in SAFE_METHODS
+        )
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = self.cached_user(validated_token)
+        if user is None:
+            user = await sync_to_async(self.load_user)(validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user = self.cached_user(validated_token)
+        return self.load_user(validated_token) if user is None else user
+
+    def cached_user(self, validated_token):
+        """The token's user without touching the database, or None on a cache miss."""
+        if self.stateless:
+            if api_settings.USER_ID_CLAIM not in validated_token:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        user = user_cache.get(self.user_id(validated_token))
+        if user is None:
+            return None
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        # Each request gets its own copy, so per-request state (permission caches) is not shared
+        return copy.copy(user)
+
+    def load_user(self, validated_token):
+        user = super().get_user(validated_token)  # raises for unknown or inactive users
+        user_cache.set(self.user_id(validated_token), user)
+        return copy.copy(user)
+
+    @staticmethod
+    def user_id(validated_token):
+        try:
+            return str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def evict_cached_user(sender, instance, **kwargs):
+    """post_save / post_delete receiver for the user model."""
+    user_cache.discard(str(getattr(instance, api_settings.USER_ID_FIELD)))
+
+
+def evict_cached_user_m2m(sender, instance, reverse, **kwargs):
+    """m2m_changed receiver for user groups and permissions."""
+    if reverse:  # group.user_set.add(...) and the like may touch any number of users
+        user_cache.clear()
+    else:
+        user_cache.discard(str(getattr(instance, api_settings.USER_ID_FIELD)))
@@ -0,0 +1,370 @@
+# bank_accounts/benchmarks.py
+#
+# Timings and query counts for every API endpoint and the key ORM queries, run against
+# whatever data is in the current database (the `benchmark` command seeds a throwaway one).
+import datetime
+import io
+import json
+import multiprocessing
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from itertools import count
+from typing import Callable, NamedTuple
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Max, Min
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import changes
+from .exports import export_chunks
+from .models import BankAccount, LedgerEntry, Transaction
+from .reports import build_head_pivot
+from .search import search_transactions, search_tokens
+from .services import Posting, locked, post, rebuild_monthly_aggregates
+from .statements import balance_as_of, opening_balance, statement_rows
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable  # (context) -> HTTP status code, or None for ORM cases
+    setup: Callable = None  # (context) -> None, before every run and outside its timing
+
+
+class BenchmarkContext:
+    """Ids and dates the cases work on: the busiest account and its busiest month."""
+
+    def __init__(self):
+        self.user, _ = User.objects.get_or_create(username='benchmark')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.async_client = AsyncClient()
+        # The async views authenticate the JWT themselves (async_views.py)
+        self.async_headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        busiest = (
+            Transaction.objects.values('account').annotate(n=Count('id')).order_by('-n', 'account').first()
+        )
+        if busiest is None:
+            raise ValueError("The database has no transactions to benchmark against.")
+        self.account = BankAccount.objects.get(pk=busiest['account'])
+        last_day = Transaction.objects.filter(account=self.account).latest('transaction_date').transaction_date
+        self.month_start = last_day.replace(day=1)
+        self.month_end = (self.month_start + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+        self.quarter_start = (self.month_start - datetime.timedelta(days=62)).replace(day=1)
+        self.transaction = Transaction.objects.filter(account=self.account).order_by('-id').first()
+        self.ledger_entry = LedgerEntry.objects.order_by('-transaction_ptr_id').first()
+        self.change_seq = changes.latest_seq()
+        self.serial = count()
+        self.doomed = None  # the transaction the delete case removes next
+
+    def statement_params(self, start=None):
+        return {'account_id': self.account.id, 'start_date': start or self.month_start, 'end_date': self.month_end}
+
+    def month_csv(self):
+        rows = Transaction.objects.filter(
+            account=self.account, transaction_date__range=[self.month_start, self.month_end],
+        ).values_list('transaction_date', 'transaction_type', 'amount', 'cheque_no')
+        lines = ['date,type,amount,cheque_no']
+        lines += [f"{day},{kind},{amount},{cheque or ''}" for day, kind, amount, cheque in rows]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def new_transaction(self, **extra):
+        return {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '10.00', 'transaction_date': str(self.month_end),
+            'description': 'Benchmark receipt', **extra,
+        }
+
+
+def _get(path, params=None):
+    def run(ctx):
+        response = ctx.client.get(path(ctx) if callable(path) else path, params(ctx) if params else None)
+        if response.streaming:
+            b''.join(response.streaming_content)  # the test client closes it once consumed
+        return response.status_code
+    return run
+
+
+def _aget(path, params=None):
+    """_get through the ASGI request handler, for the async views."""
+    async def fetch(ctx):
+        response = await ctx.async_client.get(
+            path(ctx) if callable(path) else path, params(ctx) if params else None, headers=ctx.async_headers,
+        )
+        if response.streaming:
+            [chunk async for chunk in response.streaming_content]
+        return response.status_code
+    return async_to_sync(fetch)
+
+
+def _post(path, data, format='json'):
+    def run(ctx):
+        return ctx.client.post(path(ctx) if callable(path) else path, data(ctx), format=format).status_code
+    return run
+
+
+def _patch(path, data):
+    def run(ctx):
+        return ctx.client.patch(path(ctx), data(ctx), format='json').status_code
+    return run
+
+
+def _delete(path):
+    def run(ctx):
+        return ctx.client.delete(path(ctx)).status_code
+    return run
+
+
+def _post_doomed(ctx):
+    ctx.doomed = ctx.client.post('/api/transactions/', ctx.new_transaction(), format='json').data['id']
+
+
+def _orm(fn):
+    def run(ctx):
+        fn(ctx)
+    return run
+
+
+def _first_cursor_page(ctx):
+    first = ctx.client.get('/api/transactions/', {'page_size': 100})
+    return ctx.client.get(first.data['next']).status_code
+
+
+ENDPOINT_CASES = [
+    Case('register', _post('/api/register/', lambda ctx: {
+        'username': f'bench-{time.time_ns()}-{next(ctx.serial)}', 'password': 'benchmark-pw',
+    })),
+    Case('dashboard-summary', _get('/api/dashboard-summary/', lambda ctx: {'month': f'{ctx.month_start:%Y-%m}'})),
+    Case('report-head-pivot', _get('/api/reports/head-pivot/', lambda ctx: {
+        'start_date': ctx.quarter_start, 'end_date': ctx.month_end,
+    })),
+    Case('metrics', _get('/api/metrics/')),
+    Case('bankaccount-list', _get('/api/bank-accounts/')),
+    Case('bankaccount-detail', _get(lambda ctx: f'/api/bank-accounts/{ctx.account.id}/')),
+    Case('bankaccount-balance-as-of', _get(
+        lambda ctx: f'/api/bank-accounts/{ctx.account.id}/balance_as_of/', lambda ctx: {'date': ctx.month_end},
+    )),
+    Case('bankaccount-reconcile', _post(
+        lambda ctx: f'/api/bank-accounts/{ctx.account.id}/reconcile/',
+        lambda ctx: {'file': ctx.month_csv(), 'dry_run': 'true'}, format='multipart',
+    )),
+    Case('transaction-list', _get('/api/transactions/')),
+    Case('transaction-list-page-2', _first_cursor_page),
+    Case('transaction-list-account', _get('/api/transactions/', lambda ctx: {'account': ctx.account.id})),
+    Case('transaction-search', _get('/api/transactions/', lambda ctx: {'search': 'electric'})),
+    Case('transaction-detail', _get(lambda ctx: f'/api/transactions/{ctx.transaction.id}/')),
+    Case('transaction-create', _post('/api/transactions/', lambda ctx: ctx.new_transaction())),
+    Case('transaction-bulk-100', _post('/api/transactions/bulk/', lambda ctx: [ctx.new_transaction()] * 100)),
+    Case('transaction-update', _patch(
+        lambda ctx: f'/api/transactions/{ctx.transaction.id}/', lambda ctx: {'amount': f'{next(ctx.serial) % 90 + 10}.00'},
+    )),
+    Case('transaction-delete', _delete(lambda ctx: f'/api/transactions/{ctx.doomed}/'), setup=_post_doomed),
+    Case('transaction-export-csv', _get(
+        '/api/transactions/export/', lambda ctx: {'account': ctx.account.id, 'transaction_type': 'CREDIT'},
+    )),
+    Case('transaction-bank-statement', _get('/api/transactions/bank_statement/', lambda ctx: ctx.statement_params())),
+    Case('transaction-bank-statement-stream', _get(
+        '/api/transactions/bank_statement/',
+        lambda ctx: {**ctx.statement_params(ctx.quarter_start), 'stream': 'true'},
+    )),
+    Case('transaction-bank-statement-pdf', _get(
+        '/api/transactions/bank_statement_pdf/', lambda ctx: {**ctx.statement_params(), 'wait': 30},
+    )),
+    Case('ledgerentry-list', _get('/api/ledger-entries/')),
+    Case('ledgerentry-detail', _get(lambda ctx: f'/api/ledger-entries/{ctx.ledger_entry.transaction_ptr_id}/')),
+    Case('change-feed-cursor', _get('/api/changes/')),
+    Case('change-feed-page', _get('/api/changes/', lambda ctx: {
+        'since': max(ctx.change_seq - changes.CHANGE_FEED_PAGE_SIZE, 0),
+    })),
+    Case('async-bankaccount-list', _aget('/api/async/bank-accounts/')),
+    Case('async-bankaccount-detail', _aget(lambda ctx: f'/api/async/bank-accounts/{ctx.account.id}/')),
+    Case('async-transaction-bank-statement', _aget(
+        '/api/async/transactions/bank_statement/', lambda ctx: ctx.statement_params(),
+    )),
+    Case('async-transaction-bank-statement-stream', _aget(
+        '/api/async/transactions/bank_statement/',
+        lambda ctx: {**ctx.statement_params(ctx.quarter_start), 'stream': 'true'},
+    )),
+    Case('async-dashboard-summary', _aget(
+        '/api/async/dashboard-summary/', lambda ctx: {'month': f'{ctx.month_start:%Y-%m}'},
+    )),
+    Case('async-report-head-pivot', _aget('/api/async/reports/head-pivot/', lambda ctx: {
+        'start_date': ctx.quarter_start, 'end_date': ctx.month_end,
+    })),
+]
+
+ORM_CASES = [
+    Case('orm-opening-balance', _orm(lambda ctx: opening_balance(ctx.account, ctx.month_start))),
+    Case('orm-balance-as-of', _orm(lambda ctx: balance_as_of(ctx.account, ctx.month_end))),
+    Case('orm-statement-rows', _orm(lambda ctx: list(statement_rows(ctx.account, ctx.quarter_start, ctx.month_end)))),
+    Case('orm-export-first-chunk', _orm(lambda ctx: next(export_chunks(Transaction.objects.all())))),
+    Case('orm-search-match', _orm(lambda ctx: list(search_transactions(
+        Transaction.objects.all(), search_tokens('hostel maint'),
+    ).order_by('-search_rank').values_list('id', flat=True)[:50]))),
+    Case('orm-head-pivot-uncached', _orm(lambda ctx: build_head_pivot(ctx.quarter_start, ctx.month_end))),
+    Case('orm-rebuild-monthly-aggregates', _orm(lambda ctx: rebuild_monthly_aggregates())),
+]
+
+CASES = ENDPOINT_CASES + ORM_CASES
+
+
+def run_cases(repeat=5, cases=CASES):
+    """
+    Run every case once to warm up, then `repeat` times timed.
+
+    Returns {case name: {'median_ms', 'min_ms', 'queries', 'status'}}; 'queries' is from the
+    last run and 'status' is the HTTP status (None for ORM cases).
+    """
+    ctx = BenchmarkContext()
+    pdf_cache = tempfile.mkdtemp(prefix='benchmark-pdf-')
+    results = {}
+    try:
+        with override_settings(STATEMENT_PDF_WORKERS=0, STATEMENT_PDF_CACHE_DIR=pdf_cache,
+                               SLOW_REQUEST_THRESHOLD_MS=10 ** 9):
+            for case in cases:
+                if case.setup:
+                    case.setup(ctx)
+                case.run(ctx)
+                timings = []
+                for _ in range(repeat):
+                    shutil.rmtree(pdf_cache, ignore_errors=True)  # time the render, not the file cache
+                    if case.setup:
+                        case.setup(ctx)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        status = case.run(ctx)
+                        timings.append((time.perf_counter() - start) * 1000)
+                results[case.name] = {
+                    'median_ms': round(statistics.median(timings), 2),
+                    'min_ms': round(min(timings), 2),
+                    'queries': len(queries),
+                    'status': status,
+                }
+    finally:
+        shutil.rmtree(pdf_cache, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, time_tolerance=0.5, min_ms=2.0):
+    """
+    Regressions of `results` against `baseline` (both {size: {case: result}}).
+
+    Returns (query regressions, slowdowns) as lists of (size, case, baseline value, new value).
+    More queries than the baseline is always a regression; a slowdown needs to exceed both
+    `time_tolerance` (relative) and `min_ms` (absolute) to count, as timings are noisy.
+    """
+    query_regressions, slowdowns = [], []
+    for size, cases in results.items():
+        for name, result in cases.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                query_regressions.append((size, name, before['queries'], result['queries']))
+            limit = max(before['median_ms'] * (1 + time_tolerance), before['median_ms'] + min_ms)
+            if result['median_ms'] > limit:
+                slowdowns.append((size, name, before['median_ms'], result['median_ms']))
+    return query_regressions, slowdowns
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def save_baseline(path, results, meta):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def sqlite_throughput(workers=4, duration=10.0, write_share=0.3, seed=0):
+    """
+    Read/write throughput of the current database from `workers` concurrent processes.
+
+    Each process loops for `duration` seconds. A `write_share` of iterations are writes: half
+    post a new transaction, half re-read and amend an existing one, both as the API's
+    BalancePostingMixin does. The rest are reads: a month's statement rows for an account.
+    Returns {'reads': {...}, 'writes': {...}} with 'ops', 'per_sec', 'p50_ms', 'p95_ms' and
+    'errors' (by message), e.g. "database is locked".
+    """
+    span = Transaction.objects.aggregate(
+        first_id=Min('id'), last_id=Max('id'), first_day=Min('transaction_date'), last_day=Max('transaction_date'),
+    )
+    if span['first_id'] is None:
+        raise ValueError("The database has no transactions to benchmark against.")
+    accounts = list(BankAccount.objects.values_list('pk', flat=True))
+    user_id = User.objects.get_or_create(username='benchmark')[0].pk
+    database = {key: connection.settings_dict[key] for key in ('NAME', 'OPTIONS')}
+    # spawn, not fork (as in pdf.py): the caller may be multi-threaded
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=django.setup) as pool:
+        pool.map(_throughput_worker, [None] * workers * 4, chunksize=1)  # finish imports before the clock starts
+        start_at = time.time() + 0.5
+        jobs = [(seed + n, start_at, duration, write_share, accounts, span, user_id, database) for n in range(workers)]
+        results = pool.map(_throughput_worker, jobs, chunksize=1)
+
+    summary = {}
+    for kind in ('reads', 'writes'):
+        timings = sorted(ms for result in results for ms in result[kind])
+        errors = sum((result[f'{kind}_errors'] for result in results), Counter())
+        summary[kind] = {
+            'ops': len(timings),
+            'per_sec': round(len(timings) / duration, 1),
+            'p50_ms': round(timings[len(timings) // 2], 2) if timings else None,
+            'p95_ms': round(timings[int(len(timings) * 0.95)], 2) if timings else None,
+            'errors': dict(errors),
+        }
+    return summary
+
+
+def _throughput_worker(job):
+    if job is None:
+        return None
+    seed, start_at, duration, write_share, accounts, span, user_id, database = job
+    connection.settings_dict.update(database)  # the caller's database, e.g. a test or scratch copy
+    time.sleep(max(0.0, start_at - time.time()))
+    rng = random.Random(seed)
+    days = (span['last_day'] - span['first_day']).days
+    result = {'reads': [], 'writes': [], 'reads_errors': Counter(), 'writes_errors': Counter()}
+    deadline = start_at + duration
+    while time.time() < deadline:
+        kind = 'writes' if rng.random() < write_share else 'reads'
+        day = span['first_day'] + datetime.timedelta(days=rng.randrange(days + 1))
+        start = time.perf_counter()
+        try:
+            if kind == 'reads':
+                account = BankAccount.objects.get(pk=rng.choice(accounts))
+                month = day.replace(day=1)
+                list(statement_rows(account, month, day))
+            elif rng.random() < 0.5:
+                with transaction.atomic():
+                    txn = Transaction.objects.create(
+                        account_id=rng.choice(accounts), transaction_type=rng.choice(['CREDIT', 'DEBIT']),
+                        transaction_head='OTHERS', transaction_mode='NEFT', transaction_date=day,
+                        amount=Decimal(rng.randrange(100, 100_000)).scaleb(-2), created_by_id=user_id,
+                        description='Throughput benchmark',
+                    )
+                    post([Posting.of(txn)])
+            else:
+                with transaction.atomic():
+                    txn = locked(Transaction(pk=rng.randint(span['first_id'], span['last_id'])))
+                    before = Posting.of(txn)
+                    txn.amount = Decimal(rng.randrange(100, 100_000)).scaleb(-2)
+                    txn.save(update_fields=['amount', 'updated_at'])
+                    post([before.reversed(), Posting.of(txn)])
+        except (OperationalError, Transaction.DoesNotExist) as exc:
+            result[f'{kind}_errors'][str(exc)] += 1
+            continue
+        result[kind].append((time.perf_counter() - start) * 1000)
+    connection.close()
+    return result
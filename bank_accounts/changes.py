@@ -0,0 +1,114 @@
+# bank_accounts/changes.py
+#
+# The change feed: every API write appends (model, id, operation) rows to ChangeLog in the
+# writing transaction, and clients poll /api/changes/?since=<seq> for what changed after the
+# last sequence number they saw instead of downloading the lists again. Writes made with
+# bulk UPDATEs (balances, running balances, reconciliation) are logged by their callers.
+from collections import OrderedDict
+
+from django.db import connection, router
+from django.db.models import CharField, DateTimeField, QuerySet, Value
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from .models import AdministrativeOrder, BankAccount, Budget, CashbookEntry, ChangeLog, LedgerEntry, Payment, Transaction
+
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+# What the feed covers; subclass entries are logged under their Transaction's id too
+TRACKED_MODELS = (BankAccount, Transaction, LedgerEntry, CashbookEntry, Payment, Budget, AdministrativeOrder)
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+
+def record(model, ids, operation):
+    """Log `operation` on the `model` rows with primary keys `ids` (and on their parent rows)."""
+    ids = list(ids)
+    if not ids or model not in TRACKED_MODELS:
+        return
+    _lock_log()
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=logged._meta.model_name, object_id=pk, operation=operation)
+        for logged in [model, *model._meta.get_parent_list()] if logged in TRACKED_MODELS
+        for pk in ids
+    ])
+
+
+def record_instance(instance, operation):
+    record(type(instance), [instance.pk], operation)
+
+
+def record_deletion(instance):
+    """
+    Log deleting `instance`, called just before it is deleted: every row the delete cascades
+    to is logged as deleted, and rows whose foreign key it nulls as updated.
+    """
+    collector = Collector(using=router.db_for_write(type(instance), instance=instance), origin=instance)
+    collector.collect([instance])
+    for model, instances in collector.data.items():
+        record(model, [obj.pk for obj in instances], DELETE)
+    for objs in collector.fast_deletes:
+        record(objs.model, _pks(objs), DELETE)
+    for (field, _), updates in collector.field_updates.items():
+        for objs in updates:
+            record(field.model, _pks(objs), UPDATE)
+
+
+def _pks(objs):
+    if isinstance(objs, QuerySet):
+        return objs.values_list('pk', flat=True) if objs.model in TRACKED_MODELS else []
+    return [obj.pk for obj in objs]
+
+
+def record_postings(account_ids, first_changed_days, posted_ids):
+    """
+    Log what services.post changes besides the posted transactions: each account's balance
+    and version, and the running balance of its other transactions from the first day
+    changed, copied into the log with one INSERT ... SELECT per account.
+    """
+    record(BankAccount, account_ids, UPDATE)
+    table = connection.ops.quote_name(ChangeLog._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(name) for name in ('model', 'object_id', 'operation', 'changed_at'))
+    now = timezone.now()
+    for account_id, since in sorted(first_changed_days.items()):
+        later = Transaction.objects.filter(account_id=account_id, transaction_date__gte=since).exclude(
+            pk__in=posted_ids,
+        ).order_by().values_list(
+            Value(Transaction._meta.model_name, output_field=CharField()), 'pk',
+            Value(UPDATE, output_field=CharField()), Value(now, output_field=DateTimeField()),
+        )
+        sql, params = later.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {table} ({columns}) {sql}", params)
+
+
+def _lock_log():
+    """
+    On PostgreSQL, make log writers take turns until they commit, so sequence numbers become
+    visible in order and a reader's cursor never skips a row still being written. Readers are
+    not blocked. SQLite already runs one writer at a time.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(ChangeLog._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def latest_seq():
+    return ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+
+def changes_since(since, limit=CHANGE_FEED_PAGE_SIZE):
+    """
+    Up to `limit` log rows after `since`, collapsed to the last operation per object, in
+    sequence order: ([(seq, model, object_id, operation)], cursor, more).
+    """
+    rows = list(
+        ChangeLog.objects.filter(seq__gt=since).order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'operation')[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = OrderedDict()
+    for seq, model, object_id, operation in rows:
+        latest.pop((model, object_id), None)
+        latest[model, object_id] = (seq, model, object_id, operation)
+    return list(latest.values()), rows[-1][0] if rows else since, more
@@ -0,0 +1,73 @@
+# bank_accounts/conditional.py
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import BankAccount
+
+
+def make_etag(*parts):
+    """Strong ETag over the given values (account versions, request path, ...)."""
+    return '"%s"' % hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def account_etag(request, account_id):
+    """ETag for data derived from one account, or None if the account does not exist."""
+    try:
+        state = _account_state(account_id).first()
+    except ValueError:  # malformed pk; let the view produce its 404
+        return None
+    return _account_etag(request, account_id, state)
+
+
+async def aaccount_etag(request, account_id):
+    """account_etag() for async views."""
+    try:
+        state = await _account_state(account_id).afirst()
+    except ValueError:
+        return None
+    return _account_etag(request, account_id, state)
+
+
+def _account_state(account_id):
+    return BankAccount.objects.filter(pk=account_id).values_list('version', 'updated_at')
+
+
+def _account_etag(request, account_id, state):
+    if state is None:
+        return None
+    return make_etag(account_id, *state, request.get_full_path())
+
+
+# Changes whenever any account is posted to, edited, added or removed
+ACCOUNTS_STATE = {'count': Count('id'), 'last_id': Max('id'), 'versions': Sum('version'), 'updated': Max('updated_at')}
+
+
+def accounts_etag(request):
+    """ETag for data derived from every account."""
+    state = BankAccount.objects.aggregate(**ACCOUNTS_STATE)
+    return make_etag(*state.values(), request.get_full_path())
+
+
+async def aaccounts_etag(request):
+    """accounts_etag() for async views."""
+    state = await BankAccount.objects.aaggregate(**ACCOUNTS_STATE)
+    return make_etag(*state.values(), request.get_full_path())
+
+
+def client_has(request, etag):
+    """True if the client's If-None-Match already covers `etag`."""
+    if etag is None:
+        return False
+    client_etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in client_etags or '*' in client_etags
+
+
+def not_modified(request, etag):
+    """A 304 response if the client already holds `etag`, else None."""
+    if client_has(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
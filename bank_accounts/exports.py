@@ -0,0 +1,106 @@
+# bank_accounts/exports.py
+import tempfile
+
+import pandas as pd
+from django.db.models import Q
+
+from .models import Transaction
+
+EXPORT_CHUNK_SIZE = 5000
+XLSX_MAX_ROWS = 1_048_575  # rows per worksheet, leaving room for the header
+
+# (column heading, values_list lookup) for every exported row
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('transaction_date', 'transaction_date'),
+    ('account', 'account__name'),
+    ('account_number', 'account__account_number'),
+    ('transaction_type', 'transaction_type'),
+    ('transaction_head', 'transaction_head'),
+    ('transaction_mode', 'transaction_mode'),
+    ('cheque_no', 'cheque_no'),
+    ('amount', 'amount'),
+    ('description', 'description'),
+    ('created_by', 'created_by__username'),
+)
+HEAD_LABEL_COLUMN = 'transaction_head_label'
+
+
+def column_names():
+    """Exported column headings: EXPORT_COLUMNS plus the head label after the head code."""
+    names = [name for name, _ in EXPORT_COLUMNS]
+    names.insert(names.index('transaction_head') + 1, HEAD_LABEL_COLUMN)
+    return names
+
+
+def export_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the queryset as DataFrames of at most `chunk_size` rows, in (transaction_date, id) order.
+
+    Each chunk is a keyset seek past the previous one, so only one chunk is ever in memory and
+    late chunks cost the same as early ones.
+    """
+    names = [name for name, _ in EXPORT_COLUMNS]
+    lookups = [lookup for _, lookup in EXPORT_COLUMNS]
+    head_labels = dict(Transaction.TRANSACTION_HEADS)
+    queryset = queryset.order_by('transaction_date', 'id')
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            day, pk = last
+            page = page.filter(Q(transaction_date__gt=day) | Q(transaction_date=day, id__gt=pk))
+        rows = list(page.values_list(*lookups)[:chunk_size])
+        if not rows:
+            return
+        frame = pd.DataFrame.from_records(rows, columns=names)
+        frame.insert(
+            names.index('transaction_head') + 1, HEAD_LABEL_COLUMN,
+            frame['transaction_head'].map(head_labels).fillna(frame['transaction_head']),
+        )
+        yield frame
+        last = (rows[-1][1], rows[-1][0])
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """CSV text for a streaming response, one chunk at a time."""
+    header = True
+    for frame in export_chunks(queryset, chunk_size):
+        yield frame.to_csv(index=False, header=header)
+        header = False
+    if header:  # nothing matched; still send the column headings
+        yield pd.DataFrame(columns=column_names()).to_csv(index=False)
+
+
+def write_xlsx(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the queryset to an anonymous temporary .xlsx file and return it, rewound.
+
+    openpyxl's write-only mode streams rows to disk, so memory stays at one chunk; a new
+    worksheet is started whenever one fills up.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as exc:
+        raise RuntimeError("XLSX export needs the 'openpyxl' package.") from exc
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, 0
+    for frame in export_chunks(queryset, chunk_size):
+        frame = frame.astype(object).where(frame.notna(), None)
+        for row in frame.itertuples(index=False, name=None):
+            if sheet is None or sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f'Transactions {len(workbook.worksheets) + 1}')
+                sheet.append(list(frame.columns))
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet('Transactions 1').append(column_names())
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,98 @@
+# bank_accounts/idempotency.py
+#
+# Idempotency-Key support for POSTs that create rows: the first request with a key runs and
+# its response is stored with the rows it created, in one database transaction; a retry with
+# the same key (per user) gets that response back instead of creating and posting again.
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def idempotent(handler):
+    """
+    Viewset method decorator: a request carrying an Idempotency-Key header runs at most once
+    per key and user within settings.IDEMPOTENCY_KEY_TTL seconds. Repeats get the stored
+    response, marked `Idempotent-Replayed: true`, after a single indexed lookup; reusing a
+    key for a different request is a 422. Only successful responses are stored, so a request
+    that failed can be corrected and sent again under the same key.
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if not 0 < len(key) <= KEY_MAX_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be 1 to {KEY_MAX_LENGTH} characters."}, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_hash(request)
+        stored = _stored(request.user, key)
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    response = handler(self, request, *args, **kwargs)
+                    if status.is_success(response.status_code):
+                        IdempotencyKey.objects.create(
+                            user=request.user, key=key, request_hash=fingerprint,
+                            status_code=response.status_code, response=response.data,
+                            expires_at=timezone.now() + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                        )
+                return response
+            except IntegrityError:
+                # A concurrent retry stored the key first; what this one did was rolled back
+                stored = _stored(request.user, key)
+                if stored is None:
+                    raise
+
+        if stored.request_hash != fingerprint:
+            return Response(
+                {"error": f"This {HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(stored.response, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
+
+    return wrapper
+
+
+def _stored(user, key):
+    """The live stored response for (user, key), or None; an expired one is deleted to free the key."""
+    stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if stored is not None and stored.expires_at <= timezone.now():
+        stored.delete()
+        return None
+    return stored
+
+
+def request_hash(request):
+    """SHA-256 of the request's method, path and parsed body (uploaded files by content)."""
+    body = json.dumps(request.data, sort_keys=True, default=_file_digest)
+    return hashlib.sha256(f'{request.method} {request.get_full_path()}\n{body}'.encode()).hexdigest()
+
+
+def _file_digest(value):
+    if not isinstance(value, UploadedFile):
+        return str(value)
+    digest = hashlib.sha256()
+    for chunk in value.chunks():
+        digest.update(chunk)
+    value.seek(0)
+    return digest.hexdigest()
+
+
+def purge_expired_keys():
+    """Delete stored responses past their expiry; returns how many."""
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,174 @@
+# bank_accounts/integrity.py
+#
+# Ledger verification: every account's current_balance must equal its opening_balance plus
+# the signed sum of its transactions. Accounts are checked in batches, one aggregated query
+# per batch, spread over worker processes. Each account's LedgerCheckpoint remembers the sum
+# through the last transaction id verified, so a run only sums the transactions added since;
+# an account that looks off is recounted from scratch before it is reported, and full=True
+# recounts every account (e.g. after editing rows outside the API). An account whose opening
+# balance was never recorded (opened before it was) cannot be told apart from drift: it is
+# reported until someone checks it and records the opening with accept_opening_balances().
+import datetime
+import multiprocessing
+from decimal import Decimal
+from typing import NamedTuple
+
+import django
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import changes
+from .models import BankAccount, LedgerCheckpoint, Transaction, signed_amount
+from .services import lock_accounts, rebuild_daily_balances, rebuild_monthly_aggregates, rebuild_running_balances
+
+VERIFY_BATCH_SIZE = 50
+VERIFY_WORKERS = 4
+ZERO = Decimal('0.00')
+
+
+class Discrepancy(NamedTuple):
+    account_id: int
+    balance: Decimal   # current_balance as stored
+    expected: Decimal  # opening_balance + transactions
+    repaired: bool = False
+    opening_known: bool = True  # False: expected counts no opening balance, which may be the difference
+
+    @property
+    def difference(self):
+        return self.balance - self.expected
+
+
+class _Scan(NamedTuple):
+    balance: Decimal
+    expected: Decimal
+    opening_known: bool
+    last_transaction_id: int
+    total: Decimal  # of the account's transactions with ids up to last_transaction_id
+
+
+def verify_ledger(account_ids=None, full=False, repair=False, workers=VERIFY_WORKERS, batch_size=VERIFY_BATCH_SIZE):
+    """
+    Check `account_ids` (default every account) and advance their checkpoints. Returns
+    (number of accounts checked, [Discrepancy]); with `repair`, each discrepancy found is
+    corrected by resetting the balance to what the transactions say. Accounts without a
+    recorded opening balance are reported whenever their balance differs from the sum of their
+    transactions, and never repaired.
+
+    Batches run in `workers` processes (spawned, as in benchmarks.py) when there is more than
+    one. Each batch is one transaction with its accounts locked against postings: in parallel
+    on PostgreSQL, one after another on SQLite, whose writers take turns.
+    """
+    accounts = BankAccount.objects.order_by('pk')
+    if account_ids is not None:
+        accounts = accounts.filter(pk__in=account_ids)
+    ids = list(accounts.values_list('pk', flat=True))
+    batches = [ids[n:n + batch_size] for n in range(0, len(ids), batch_size)]
+
+    if workers > 1 and len(batches) > 1:
+        database = {key: connection.settings_dict[key] for key in ('NAME', 'OPTIONS')}
+        jobs = [(batch, full, repair, database) for batch in batches]
+        with multiprocessing.get_context('spawn').Pool(min(workers, len(batches)), initializer=django.setup) as pool:
+            results = pool.map(_verify_worker, jobs, chunksize=1)
+    else:
+        results = [verify_batch(batch, full, repair) for batch in batches]
+    return len(ids), [discrepancy for result in results for discrepancy in result]
+
+
+def _verify_worker(job):
+    batch, full, repair, database = job
+    connection.settings_dict.update(database)  # the caller's database, e.g. a test or scratch copy
+    return verify_batch(batch, full, repair)
+
+
+def verify_batch(account_ids, full=False, repair=False):
+    """Verify one batch of accounts in a single transaction; returns its [Discrepancy]."""
+    with transaction.atomic():
+        lock_accounts(account_ids)
+        scans = _scan(account_ids, full)
+        suspects = [pk for pk, scan in scans.items() if scan.balance != scan.expected]
+        if suspects and not full:
+            # A checkpoint that missed an edit looks just like drift: count those again
+            scans.update(_scan(suspects, full=True))
+
+        now = timezone.now()
+        LedgerCheckpoint.objects.bulk_create(
+            [LedgerCheckpoint(account_id=pk, last_transaction_id=scan.last_transaction_id, total=scan.total,
+                              verified_at=now) for pk, scan in scans.items()],
+            update_conflicts=True, unique_fields=['account'],
+            update_fields=['last_transaction_id', 'total', 'verified_at'],
+        )
+        discrepancies = []
+        for pk, scan in sorted(scans.items()):
+            if scan.balance != scan.expected:
+                repaired = repair and scan.opening_known
+                if repaired:
+                    repair_balance(pk, scan.expected)
+                discrepancies.append(Discrepancy(pk, scan.balance, scan.expected, repaired, scan.opening_known))
+    return discrepancies
+
+
+def _scan(account_ids, full):
+    """
+    {account id: _Scan} from one query: each account's balances and the sum of its
+    transactions past its checkpoint (every transaction if `full`), read from one snapshot.
+    """
+    money = DecimalField(max_digits=15, decimal_places=2)
+    if full:
+        checked_id, checked_total = Value(0), Value(ZERO, output_field=money)
+    else:
+        checked_id = Coalesce(F('ledger_checkpoint__last_transaction_id'), 0)
+        checked_total = Coalesce(F('ledger_checkpoint__total'), ZERO, output_field=money)
+    since = Transaction.objects.filter(account=OuterRef('pk'), id__gt=OuterRef('checked_id')).order_by().values('account')
+    rows = BankAccount.objects.filter(pk__in=account_ids).annotate(
+        checked_id=checked_id,
+        checked_total=checked_total,
+        new_total=Coalesce(Subquery(since.annotate(total=Sum(signed_amount())).values('total')), ZERO,
+                           output_field=money),
+        new_last_id=Subquery(since.annotate(last=Max('id')).values('last')),
+    ).values_list('pk', 'current_balance', 'opening_balance', 'checked_id', 'checked_total', 'new_total', 'new_last_id')
+    return {
+        pk: _Scan(
+            balance=balance,
+            expected=(opening or ZERO) + checked_total + new_total,
+            opening_known=opening is not None,
+            last_transaction_id=new_last_id or checked_id,
+            total=checked_total + new_total,
+        )
+        for pk, balance, opening, checked_id, checked_total, new_total, new_last_id in rows
+    }
+
+
+def accept_opening_balances(account_ids):
+    """
+    Record the opening balance of accounts that have none as whatever their balance holds
+    beyond their transactions, once that has been checked. Returns {account id: opening}.
+    """
+    with transaction.atomic():
+        lock_accounts(account_ids)
+        balances = dict(
+            BankAccount.objects.filter(pk__in=account_ids, opening_balance=None).values_list('pk', 'current_balance')
+        )
+        totals = dict(
+            Transaction.objects.filter(account_id__in=balances).order_by().values('account')
+            .annotate(total=Sum(signed_amount())).values_list('account', 'total')
+        )
+        openings = {pk: balance - totals.get(pk, ZERO) for pk, balance in balances.items()}
+        for pk, opening in openings.items():
+            BankAccount.objects.filter(pk=pk).update(opening_balance=opening)
+    return openings
+
+
+def repair_balance(account_id, balance):
+    """
+    Set an account's balance, and everything derived from it, to `balance`: running balances,
+    daily snapshots, monthly aggregates and the period versions keying cached reports, logged
+    to the change feed as services.post() does.
+    """
+    BankAccount.objects.filter(pk=account_id).update(current_balance=balance, version=F('version') + 1)
+    rebuild_running_balances(account_id)
+    rebuild_daily_balances(BankAccount.objects.get(pk=account_id))
+    rebuild_monthly_aggregates(account_id)  # drift may come from edited amounts; bumps its periods too
+    # Every running balance of the account was rewritten
+    changes.record_postings([account_id], {account_id: datetime.date.min}, ())
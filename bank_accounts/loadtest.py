@@ -0,0 +1,363 @@
+# bank_accounts/loadtest.py
+#
+# End-to-end load: many concurrent asyncio clients, each logged in with its own JWT, drive a
+# weighted mix of reads and writes against a running server. The `loadtest` command starts
+# gunicorn on a seeded throwaway database and reports on it; run_load() works against any URL.
+import asyncio
+import datetime
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import NamedTuple
+from urllib.parse import urlencode, urlsplit
+
+from django.db.models import OuterRef, Subquery, Sum
+
+from .models import BankAccount, DailyBalance, Transaction, signed_amount
+
+SEARCH_TERMS = ['electric', 'hostel', 'library', 'fees', 'maint', 'salar', 'grant', 'water']
+REQUEST_TIMEOUT = 60
+
+
+class Operation(NamedTuple):
+    name: str
+    weight: int
+    method: str  # name of the VirtualClient coroutine that performs it
+
+
+# Roughly a busy office: mostly listings and look-ups, a steady stream of postings, and the
+# occasional correction or deletion of an entry the same clerk made
+OPERATIONS = [
+    Operation('account-list', 10, 'account_list'),
+    Operation('transaction-list', 20, 'transaction_list'),
+    Operation('transaction-search', 15, 'transaction_search'),
+    Operation('bank-statement', 10, 'bank_statement'),
+    Operation('dashboard-summary', 5, 'dashboard_summary'),
+    Operation('transaction-create', 25, 'transaction_create'),
+    Operation('transaction-update', 8, 'transaction_update'),
+    Operation('transaction-delete', 7, 'transaction_delete'),
+]
+
+# Only the read endpoints that have async twins (async_views.py), for comparing WSGI and ASGI
+READ_OPERATIONS = [
+    Operation('account-list', 15, 'account_list'),
+    Operation('account-detail', 15, 'account_detail'),
+    Operation('bank-statement', 35, 'bank_statement'),
+    Operation('dashboard-summary', 20, 'dashboard_summary'),
+    Operation('head-pivot', 15, 'head_pivot'),
+]
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client over asyncio streams; JSON bodies in, bytes out."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """(status, body bytes). A reused connection the server has since closed is reopened once."""
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, body, headers or {})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+            return await self._request(method, path, body, headers or {})
+
+    async def _request(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(payload)}']
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before the response.")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif status in (204, 304) or method == 'HEAD':
+            content = b''
+        else:  # delimited by the server closing the connection
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while size := int((await self.reader.readline()).split(b';')[0], 16):
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+        while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):  # trailers
+            pass
+        return b''.join(chunks)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class LoadStats:
+    """Latencies and status codes per operation."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name, seconds, status):
+        self.latencies[name].append(seconds * 1000)
+        self.statuses[name][status] += 1
+
+    def summary(self, elapsed):
+        """
+        {operation: {'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'statuses'}},
+        plus 'all' over every operation but logging in.
+        """
+        rows = {name: self._row(timings, self.statuses[name], elapsed) for name, timings in sorted(self.latencies.items())}
+        measured = [name for name in self.latencies if name != 'auth-token']
+        if measured:
+            rows['all'] = self._row(
+                [ms for name in measured for ms in self.latencies[name]],
+                sum((self.statuses[name] for name in measured), Counter()), elapsed,
+            )
+        return rows
+
+    @staticmethod
+    def _row(timings, statuses, elapsed):
+        ordered = sorted(timings)
+        return {
+            'requests': len(ordered),
+            'errors': sum(count for status, count in statuses.items() if status is None or status >= 400),
+            'rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(ordered, 50), 1),
+            'p95_ms': round(percentile(ordered, 95), 1),
+            'p99_ms': round(percentile(ordered, 99), 1),
+            'max_ms': round(ordered[-1], 1),
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        }
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class VirtualClient:
+    """One logged-in user issuing operations back to back over its own connection."""
+
+    def __init__(self, connection, credentials, accounts, first_day, last_day, stats, rng,
+                 operations=OPERATIONS, read_prefix='/api'):
+        self.connection = connection
+        self.credentials = credentials
+        self.accounts = accounts
+        self.first_day, self.last_day = first_day, last_day
+        self.stats = stats
+        self.rng = rng
+        self.operations = operations
+        self.read_prefix = read_prefix  # where the read endpoints live: '/api' or '/api/async'
+        self.headers = {}
+        self.owned = []  # [id, account id, signed amount] of transactions this client created
+        self.net = defaultdict(Decimal)  # balance change per account from successful writes
+
+    async def login(self):
+        start = time.perf_counter()
+        status, body = await self.connection.request('POST', '/api/auth/token/', self.credentials)
+        self.stats.record('auth-token', time.perf_counter() - start, status)
+        if status != 200:
+            raise RuntimeError(f"Login as {self.credentials['username']} failed with HTTP {status}.")
+        self.headers = {'Authorization': f"Bearer {json.loads(body)['access']}"}
+
+    async def run(self, deadline):
+        names, weights = zip(*((op.method, op.weight) for op in self.operations))
+        labels = {op.method: op.name for op in self.operations}
+        while time.monotonic() < deadline:
+            method = self.rng.choices(names, weights)[0]
+            if method in ('transaction_update', 'transaction_delete') and not self.owned:
+                method = 'transaction_create'
+            await getattr(self, method)(labels[method])
+
+    async def call(self, name, method, path, params=None, body=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        start = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(
+                self.connection.request(method, path, body, self.headers), REQUEST_TIMEOUT,
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            self.connection.close()
+            status, content = None, b''
+        self.stats.record(name, time.perf_counter() - start, status)
+        return status, content
+
+    def random_day(self):
+        return self.first_day + datetime.timedelta(days=self.rng.randrange((self.last_day - self.first_day).days + 1))
+
+    async def account_list(self, name):
+        await self.call(name, 'GET', f'{self.read_prefix}/bank-accounts/')
+
+    async def account_detail(self, name):
+        await self.call(name, 'GET', f'{self.read_prefix}/bank-accounts/{self.rng.choice(self.accounts)}/')
+
+    async def transaction_list(self, name):
+        await self.call(name, 'GET', '/api/transactions/', {'account': self.rng.choice(self.accounts)})
+
+    async def transaction_search(self, name):
+        await self.call(name, 'GET', '/api/transactions/', {'search': self.rng.choice(SEARCH_TERMS)})
+
+    async def bank_statement(self, name):
+        end = self.random_day()
+        await self.call(name, 'GET', f'{self.read_prefix}/transactions/bank_statement/', {
+            'account_id': self.rng.choice(self.accounts),
+            'start_date': max(self.first_day, end - datetime.timedelta(days=30)), 'end_date': end,
+        })
+
+    async def dashboard_summary(self, name):
+        await self.call(name, 'GET', f'{self.read_prefix}/dashboard-summary/', {'month': f'{self.random_day():%Y-%m}'})
+
+    async def head_pivot(self, name):
+        end = self.random_day()
+        await self.call(name, 'GET', f'{self.read_prefix}/reports/head-pivot/', {
+            'start_date': max(self.first_day, end - datetime.timedelta(days=90)), 'end_date': end,
+            'account': self.rng.choice(self.accounts),
+        })
+
+    async def transaction_create(self, name):
+        account = self.rng.choice(self.accounts)
+        kind = self.rng.choice(['CREDIT', 'DEBIT'])
+        amount = self.random_amount()
+        status, content = await self.call(name, 'POST', '/api/transactions/', body={
+            'account': account, 'transaction_type': kind, 'transaction_head': 'OTHERS',
+            'transaction_mode': 'NEFT', 'amount': str(amount), 'transaction_date': str(self.random_day()),
+            'description': f'Load test {kind.lower()} {self.rng.choice(SEARCH_TERMS)}',
+        })
+        if status == 201:
+            signed = amount if kind == 'CREDIT' else -amount
+            self.owned.append([json.loads(content)['id'], account, signed])
+            self.net[account] += signed
+
+    async def transaction_update(self, name):
+        entry = self.rng.choice(self.owned)
+        amount = self.random_amount()
+        status, _ = await self.call(name, 'PATCH', f'/api/transactions/{entry[0]}/', body={'amount': str(amount)})
+        if status == 200:
+            signed = amount if entry[2] > 0 else -amount
+            self.net[entry[1]] += signed - entry[2]
+            entry[2] = signed
+
+    async def transaction_delete(self, name):
+        entry = self.owned.pop(self.rng.randrange(len(self.owned)))
+        status, _ = await self.call(name, 'DELETE', f'/api/transactions/{entry[0]}/')
+        if status == 204:
+            self.net[entry[1]] -= entry[2]
+        else:
+            self.owned.append(entry)
+
+    def random_amount(self):
+        return Decimal(self.rng.randrange(100, 5_000_000)).scaleb(-2)
+
+
+async def _run_clients(base_url, credentials, accounts, first_day, last_day, duration, seed, operations, read_prefix):
+    url = urlsplit(base_url)
+    stats = LoadStats()
+    clients = [
+        VirtualClient(HTTPConnection(url.hostname, url.port or 80), creds, accounts, first_day, last_day,
+                      stats, random.Random(seed + n), operations, read_prefix)
+        for n, creds in enumerate(credentials)
+    ]
+    try:
+        # Log everyone in first: password hashing is deliberately slow and would swamp the mix
+        await asyncio.gather(*(client.login() for client in clients))
+        start = time.perf_counter()
+        await asyncio.gather(*(client.run(time.monotonic() + duration) for client in clients))
+        elapsed = time.perf_counter() - start
+    finally:
+        for client in clients:
+            client.connection.close()
+    net = defaultdict(Decimal)
+    for client in clients:
+        for account, delta in client.net.items():
+            net[account] += delta
+    return stats.summary(elapsed), dict(net)
+
+
+def run_load(base_url, credentials, accounts, first_day, last_day, duration=30.0, seed=0,
+             operations=OPERATIONS, read_prefix='/api'):
+    """
+    Drive `base_url` with one concurrent client per {'username', 'password'} in `credentials`
+    for `duration` seconds, over account ids `accounts` and dates [first_day, last_day].
+    `operations` is the weighted mix (OPERATIONS, or READ_OPERATIONS), and `read_prefix`
+    where its read endpoints are served ('/api/async' for the async ones).
+
+    Every client logs in through /api/auth/token/ before the clock starts; those requests are
+    reported as 'auth-token' but left out of the 'all' row. Returns (report, net): the
+    LoadStats summary, and the balance change per account that the clients' successful
+    writes should have made.
+    """
+    return asyncio.run(_run_clients(
+        base_url, credentials, accounts, first_day, last_day, duration, seed, operations, read_prefix,
+    ))
+
+
+def balance_snapshot():
+    """
+    {account id: (current_balance, sum of its signed transaction amounts, latest daily closing)}.
+
+    Values are rounded to cents: SQLite keeps running balances as REAL, so they carry float
+    noise wherever Django does not round them on the way out (as in the subquery here).
+    """
+    totals = dict(
+        Transaction.objects.order_by().values('account').annotate(total=Sum(signed_amount()))
+        .values_list('account', 'total')
+    )
+    latest_closing = DailyBalance.objects.filter(account=OuterRef('pk')).order_by('-date').values('closing_balance')[:1]
+    return {
+        pk: (_cents(balance), _cents(totals.get(pk) or 0), None if closing is None else _cents(closing))
+        for pk, balance, closing in BankAccount.objects.annotate(closing=Subquery(latest_closing))
+        .values_list('pk', 'current_balance', 'closing')
+    }
+
+
+def _cents(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def consistency_errors(before, after, net):
+    """
+    Discrepancies between two balance_snapshot()s and the clients' expected `net` changes:
+    every account's balance must have moved exactly as much as its transactions and as the
+    clients' acknowledged writes, and its latest daily snapshot must equal its balance.
+    """
+    errors = []
+    for pk, (balance, total, closing) in sorted(after.items()):
+        old_balance, old_total, _ = before.get(pk, (Decimal('0.00'), Decimal('0.00'), None))
+        moved = balance - old_balance
+        if moved != total - old_total:
+            errors.append(f"Account {pk}: balance moved by {moved} but its transactions by {total - old_total}.")
+        if moved != net.get(pk, Decimal('0.00')):
+            errors.append(f"Account {pk}: balance moved by {moved} but clients posted {net.get(pk, Decimal('0.00'))}.")
+        if closing is not None and closing != balance:
+            errors.append(f"Account {pk}: latest daily closing balance {closing} differs from balance {balance}.")
+    return errors
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import platform
+import tempfile
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from bank_accounts.benchmarks import compare, load_baseline, run_cases, save_baseline
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every API endpoint and the key ORM queries at several data sizes and compare "
+        "timings and query counts with the stored baseline. Runs against a throwaway test "
+        "database seeded with seed_data; the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help="Comma-separated transaction counts to seed and measure (default 1000,10000,100000).")
+        parser.add_argument('--accounts', type=int, default=10, help="Accounts to seed at every size (default 10).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case (default 5).")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline JSON to compare with.")
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+        parser.add_argument('--output', help="Also write the results to this JSON file.")
+        parser.add_argument('--time-tolerance', type=float, default=0.5,
+                            help="Relative slowdown reported as a regression (default 0.5 = 50%%).")
+        parser.add_argument('--fail-on-slowdown', action='store_true',
+                            help="Exit with an error on slowdowns too, not only on extra queries.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+
+        if connection.vendor == 'sqlite':  # keep clear of the test suite's database file
+            connection.settings_dict['TEST'] = {
+                **connection.settings_dict['TEST'],
+                'NAME': str(Path(tempfile.gettempdir()) / f'benchmark-{os.getpid()}.sqlite3'),
+            }
+        results = {}
+        for size in sizes:
+            self.stdout.write(f"Seeding {size} transactions...")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                call_command('seed_data', transactions=size, accounts=options['accounts'], stdout=io.StringIO())
+                results[str(size)] = run_cases(repeat=options['repeat'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        baseline = {}
+        baseline_path = Path(options['baseline'])
+        if baseline_path.exists() and not options['save_baseline']:
+            baseline = load_baseline(baseline_path)
+        self.report(results, baseline)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        if options['save_baseline']:
+            save_baseline(baseline_path, results, {
+                'python': platform.python_version(), 'django': django.get_version(),
+                'database': f"{connection.vendor} {connection.Database.sqlite_version}"
+                if connection.vendor == 'sqlite' else connection.vendor,
+                'machine': platform.machine(), 'repeat': options['repeat'],
+            })
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}."))
+            return
+
+        failed = [
+            (size, name, result['status']) for size, cases in results.items()
+            for name, result in cases.items() if result['status'] is not None and result['status'] >= 400
+        ]
+        query_regressions, slowdowns = compare(results, baseline, options['time_tolerance'])
+        for size, name, before, after in query_regressions:
+            self.stdout.write(self.style.ERROR(f"{size:>8} {name}: {before} -> {after} queries"))
+        for size, name, before, after in slowdowns:
+            self.stdout.write(self.style.WARNING(f"{size:>8} {name}: {before:.1f} -> {after:.1f} ms"))
+        for size, name, status in failed:
+            self.stdout.write(self.style.ERROR(f"{size:>8} {name}: HTTP {status}"))
+        if failed or query_regressions or (slowdowns and options['fail_on_slowdown']):
+            raise CommandError("Benchmark regressions found.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def report(self, results, baseline):
+        self.stdout.write(f"{'size':>8}  {'case':<36} {'median ms':>10} {'baseline':>10} {'queries':>8} {'baseline':>8}")
+        for size, cases in results.items():
+            for name, result in cases.items():
+                before = baseline.get(size, {}).get(name, {})
+                self.stdout.write(
+                    f"{size:>8}  {name:<36} {result['median_ms']:>10.1f} {before.get('median_ms', '-'):>10} "
+                    f"{result['queries']:>8} {before.get('queries', '-'):>8}"
+                )
@@ -0,0 +1,87 @@
+import json
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+
+from bank_accounts.loadtest import READ_OPERATIONS, run_load
+
+from .loadtest import Command as LoadTestCommand
+
+# (label, server, where the read endpoints are served)
+SERVERS = [
+    ('wsgi', 'gunicorn', '/api'),
+    ('asgi', 'uvicorn', '/api/async'),
+    ('asgi-sync-views', 'uvicorn', '/api'),
+]
+
+
+class Command(LoadTestCommand):
+    help = (
+        "Compare concurrent read throughput of the WSGI deployment (gunicorn, the DRF views) "
+        "with the ASGI one (uvicorn, the async views under /api/async/), and of the DRF views "
+        "under uvicorn. Every server gets the same seeded throwaway database, worker count and "
+        "read-only mix of account, statement and report requests; reports req/s and "
+        "p50/p95/p99 latency for each."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(duration=20.0, threads=4)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The benchmark seeds a throwaway SQLite database; configure SQLite to run it.")
+        if options['clients'] < 1 or options['duration'] <= 0:
+            raise CommandError("--clients and --duration must be positive.")
+
+        reports = {}
+        with self.seeded_database(options) as (workdir, credentials, accounts, span):
+            connection.close()
+            for label, server_name, read_prefix in SERVERS:
+                port = options['port'] or self.free_port()
+                command = (self.gunicorn_command if server_name == 'gunicorn' else self.uvicorn_command)(port, options)
+                server = self.start_server(workdir, port, command)
+                try:
+                    self.stdout.write(
+                        f"Running {options['clients']} clients for {options['duration']:g}s against "
+                        f"{server_name} ({read_prefix}/)..."
+                    )
+                    reports[label], _ = run_load(
+                        f'http://127.0.0.1:{port}', credentials, accounts, span['first'], span['last'],
+                        duration=options['duration'], seed=options['seed'],
+                        operations=READ_OPERATIONS, read_prefix=read_prefix,
+                    )
+                finally:
+                    self.stop_server(server)
+
+        for label, report in reports.items():
+            self.stdout.write(f"\n{label}:")
+            self.report(report)
+        self.compare(reports, options)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(reports, indent=2, sort_keys=True) + '\n')
+
+    @staticmethod
+    def uvicorn_command(port, options):
+        module, _, app = settings.ASGI_APPLICATION.rpartition('.')
+        return [
+            sys.executable, '-m', 'uvicorn', f'{module}:{app}', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(options['workers']), '--lifespan', 'off', '--log-level', 'warning', '--no-access-log',
+        ]
+
+    def compare(self, reports, options):
+        self.stdout.write(
+            f"\n{options['workers']} worker processes each (gunicorn with {options['threads']} threads per worker)"
+        )
+        self.stdout.write(f"{'server':<18}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        wsgi_rps = reports['wsgi']['all']['rps']
+        for label, report in reports.items():
+            row = report['all']
+            speedup = f"  x{row['rps'] / wsgi_rps:.2f}" if wsgi_rps else ''
+            self.stdout.write(
+                f"{label:<18}{row['requests']:>9}{row['errors']:>8}{row['rps']:>8}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{speedup}"
+            )
@@ -0,0 +1,95 @@
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from bank_accounts.benchmarks import sqlite_throughput
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare read/write throughput of the configured SQLite mode (settings.DATABASES OPTIONS: "
+        "WAL, pragmas, BEGIN IMMEDIATE, busy timeout) with Django's defaults, using several "
+        "worker processes against copies of one seeded throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=20_000, help="Transactions to seed (default 20000).")
+        parser.add_argument('--accounts', type=int, default=10, help="Accounts to seed (default 10).")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent worker processes (default 4).")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per mode (default 10).")
+        parser.add_argument('--write-share', type=float, default=0.3,
+                            help="Fraction of operations that are writes (default 0.3).")
+        parser.add_argument('--output', help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite configurations; the database is not SQLite.")
+        if options['workers'] < 1 or options['duration'] <= 0 or not 0 <= options['write_share'] <= 1:
+            raise CommandError("--workers and --duration must be positive and --write-share within [0, 1].")
+
+        modes = {
+            # Rollback journal, deferred transactions and a 5 second busy timeout
+            'django-default': ({}, 'DELETE'),
+            # WAL (set on the file by migration 0016) with the settings.DATABASES OPTIONS
+            'configured': (dict(connection.settings_dict['OPTIONS']), 'WAL'),
+        }
+        workdir = Path(tempfile.mkdtemp(prefix='benchmark-sqlite-'))
+        connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'], 'NAME': str(workdir / 'seed.sqlite3')}
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        seeded, configured = connection.settings_dict['NAME'], connection.settings_dict['OPTIONS']
+        results = {}
+        try:
+            self.stdout.write(f"Seeding {options['transactions']} transactions...")
+            call_command('seed_data', transactions=options['transactions'], accounts=options['accounts'],
+                         stdout=io.StringIO())
+            connection.close()
+            for mode, (mode_options, journal_mode) in modes.items():
+                copy = workdir / f'{mode}.sqlite3'
+                self.copy_database(seeded, copy, journal_mode)
+                connection.settings_dict.update(NAME=str(copy), OPTIONS=mode_options)
+                self.stdout.write(f"Running {options['workers']} workers for {options['duration']:g}s ({mode})...")
+                try:
+                    results[mode] = sqlite_throughput(
+                        workers=options['workers'], duration=options['duration'],
+                        write_share=options['write_share'],
+                    )
+                finally:
+                    connection.close()
+                    connection.settings_dict.update(NAME=seeded, OPTIONS=configured)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.report(results)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+    @staticmethod
+    def copy_database(source, target, journal_mode):
+        """Online-backup `source` to `target`, optionally switching the copy's journal mode."""
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+            if journal_mode:
+                dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+        finally:
+            src.close()
+            dst.close()
+
+    def report(self, results):
+        self.stdout.write(f"{'mode':<16}{'kind':<8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+        for mode, kinds in results.items():
+            for kind, row in kinds.items():
+                self.stdout.write(
+                    f"{mode:<16}{kind:<8}{row['per_sec']:>9}{row['p50_ms'] or '-':>9}"
+                    f"{row['p95_ms'] or '-':>9}{sum(row['errors'].values()):>8}"
+                )
+                for message, count in row['errors'].items():
+                    self.stdout.write(f"    {count} x {message}")
@@ -0,0 +1,177 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from bank_accounts.loadtest import balance_snapshot, consistency_errors, run_load
+from bank_accounts.models import BankAccount, Transaction
+
+LOAD_PASSWORD = 'load-test-pw'
+SETTINGS_MODULE = 'loadtest_settings'
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the project under gunicorn against a freshly seeded throwaway database and drive "
+        "it with concurrent clients (each with its own JWT) running a mix of reads and writes. "
+        "Reports throughput and p50/p95/p99 latency per endpoint, then checks that every "
+        "account balance matches its transactions and the writes the clients made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=20_000, help="Transactions to seed (default 20000).")
+        parser.add_argument('--accounts', type=int, default=10, help="Accounts to seed (default 10).")
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent clients (default 32).")
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run for (default 30).")
+        parser.add_argument('--workers', type=int, default=4, help="Gunicorn worker processes (default 4).")
+        parser.add_argument('--threads', type=int, default=1, help="Threads per gunicorn worker (default 1).")
+        parser.add_argument('--port', type=int, default=0, help="Port to serve on (default: any free port).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the clients' choices.")
+        parser.add_argument('--output', help="Also write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The load test seeds a throwaway SQLite database; configure SQLite to run it.")
+        if options['clients'] < 1 or options['duration'] <= 0:
+            raise CommandError("--clients and --duration must be positive.")
+
+        with self.seeded_database(options) as (workdir, credentials, accounts, span):
+            before = balance_snapshot()
+            connection.close()  # the server processes have the database to themselves
+
+            port = options['port'] or self.free_port()
+            server = self.start_server(workdir, port, self.gunicorn_command(port, options))
+            try:
+                self.stdout.write(
+                    f"Running {options['clients']} clients for {options['duration']:g}s against gunicorn "
+                    f"({options['workers']} workers x {options['threads']} threads)..."
+                )
+                report, net = run_load(
+                    f'http://127.0.0.1:{port}', credentials, accounts, span['first'], span['last'],
+                    duration=options['duration'], seed=options['seed'],
+                )
+            finally:
+                self.stop_server(server)
+            errors = consistency_errors(before, balance_snapshot(), net)
+
+        self.report(report)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(
+                {'endpoints': report, 'consistency_errors': errors}, indent=2, sort_keys=True,
+            ) + '\n')
+        if errors:
+            for error in errors:
+                self.stderr.write(error)
+            raise CommandError("Balances are inconsistent after the load test.")
+        self.stdout.write(self.style.SUCCESS("Balances are consistent with every acknowledged write."))
+
+    @contextmanager
+    def seeded_database(self, options):
+        """
+        Swap in a throwaway SQLite database seeded with options['transactions'] and one user
+        per client; yields (workdir, credentials, account ids, {'first', 'last'} transaction dates).
+        """
+        workdir = Path(tempfile.mkdtemp(prefix='loadtest-'))
+        database = workdir / 'loadtest.sqlite3'
+        connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'], 'NAME': str(database)}
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {options['transactions']} transactions...")
+            call_command('seed_data', transactions=options['transactions'], accounts=options['accounts'],
+                         stdout=io.StringIO())
+            credentials = self.create_users(options['clients'])
+            accounts = list(BankAccount.objects.order_by('pk').values_list('pk', flat=True))
+            span = Transaction.objects.aggregate(first=Min('transaction_date'), last=Max('transaction_date'))
+            self.write_settings(workdir, database)
+            yield workdir, credentials, accounts, span
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_users(self, count):
+        users = [User(username=f'load-{n:03d}') for n in range(count)]
+        for user in users:
+            user.set_password(LOAD_PASSWORD)
+        User.objects.bulk_create(users)
+        return [{'username': user.username, 'password': LOAD_PASSWORD} for user in users]
+
+    @staticmethod
+    def write_settings(workdir, database):
+        # The server runs the project's settings with only the database swapped out
+        (workdir / f'{SETTINGS_MODULE}.py').write_text(
+            f"from {settings.SETTINGS_MODULE} import *  # noqa: F401,F403\n\n"
+            f"DEBUG = False\n"
+            f"SLOW_REQUEST_THRESHOLD_MS = 10 ** 9  # the report covers latency\n"
+            f"DATABASES['default']['NAME'] = {str(database)!r}\n"
+            f"REPORT_DATABASE = None  # not the replica of the real database\n"
+        )
+
+    @staticmethod
+    def gunicorn_command(port, options):
+        module, _, app = settings.WSGI_APPLICATION.rpartition('.')
+        return [
+            sys.executable, '-m', 'gunicorn', f'{module}:{app}', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(options['workers']), '--threads', str(options['threads']),
+            '--log-level', 'warning', '--timeout', '120',
+        ]
+
+    def start_server(self, workdir, port, command):
+        """Start `command`, a server for `port`, on the seeded database; returns once it is listening."""
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': SETTINGS_MODULE,
+            'PYTHONPATH': os.pathsep.join([str(workdir), str(settings.BASE_DIR), os.environ.get('PYTHONPATH', '')]),
+        }
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        name = command[2]
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"{name} exited with status {server.returncode}.")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        self.stop_server(server)
+        raise CommandError(f"{name} did not start listening within 30s.")
+
+    @staticmethod
+    def stop_server(server):
+        server.terminate()
+        server.wait(timeout=30)
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'req/s':>8}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        )
+        for name, row in report.items():
+            self.stdout.write(
+                f"{name:<22}{row['requests']:>9}{row['errors']:>8}{row['rps']:>8}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}"
+            )
+        failed = {
+            status: count for status, count in report.get('all', {}).get('statuses', {}).items()
+            if status == 'None' or int(status) >= 400
+        }
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Failed responses by status: {failed}"))
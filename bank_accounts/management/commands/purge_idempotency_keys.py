@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from bank_accounts.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored Idempotency-Key responses past their expiry (settings.IDEMPOTENCY_KEY_TTL). "
+        "Expired keys are already ignored on lookup; this keeps the table small. Run it from cron."
+    )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from bank_accounts.models import BankAccount
+from bank_accounts.services import rebuild_daily_balances
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyBalance snapshots from transactions, for all or selected accounts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help="Account id to rebuild (repeatable). Defaults to every account.")
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to the first transaction.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to the last transaction.")
+
+    def handle(self, *args, **options):
+        start, end = self.parse_day(options['start']), self.parse_day(options['end'])
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end.")
+
+        accounts = BankAccount.objects.order_by('pk')
+        if options['accounts']:
+            accounts = accounts.filter(pk__in=options['accounts'])
+
+        for account in accounts:
+            written = rebuild_daily_balances(account, start, end)
+            self.stdout.write(f"{account}: {written} daily balances")
+        self.stdout.write(self.style.SUCCESS("Daily balances rebuilt."))
+
+    def parse_day(self, value):
+        if value is None:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return day
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bank_accounts.services import rebuild_monthly_aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the MonthlyAggregate table behind the dashboard summary from transactions."
+
+    def handle(self, *args, **options):
+        written = rebuild_monthly_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Monthly aggregates rebuilt: {written} rows."))
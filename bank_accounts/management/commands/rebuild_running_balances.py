@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from bank_accounts.models import BankAccount
+from bank_accounts.services import rebuild_running_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every transaction's stored running balance (balance_after) from its account's "
+        "current balance, for all or selected accounts, one set-based UPDATE per account."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help="Account id to rebuild (repeatable). Defaults to every account.")
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD). Defaults to the first transaction.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since'] is not None:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError(f"Invalid date: {options['since']}")
+
+        accounts = BankAccount.objects.order_by('pk')
+        if options['accounts']:
+            accounts = accounts.filter(pk__in=options['accounts'])
+
+        for account in accounts:
+            written = rebuild_running_balances(account.pk, since)
+            self.stdout.write(f"{account}: {written} running balances")
+        self.stdout.write(self.style.SUCCESS("Running balances rebuilt."))
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the SQLite report replica (settings.REPORT_DATABASE) with an online backup of the "
+        "primary. The snapshot is written next to the replica and swapped in atomically, so report "
+        "queries already running finish against the old snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Alias to copy from (default 'default').")
+        parser.add_argument('--replica', default=getattr(settings, 'REPORT_DATABASE', None),
+                            help="Alias to refresh (default settings.REPORT_DATABASE).")
+
+    def handle(self, *args, **options):
+        source, replica = options['database'], options['replica']
+        for alias in (source, replica):
+            if alias not in settings.DATABASES:
+                raise CommandError(f"Unknown database alias {alias!r}.")
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias!r} is not SQLite; replicate other databases with their own tooling.")
+        target = Path(connections[replica].settings_dict['NAME'])
+        if target == Path(connections[source].settings_dict['NAME']):
+            raise CommandError(f"{replica!r} and {source!r} are the same database file.")
+
+        connection = connections[source]
+        connection.ensure_connection()
+        partial = target.with_name(target.name + '.tmp')
+        partial.unlink(missing_ok=True)
+        snapshot = sqlite3.connect(partial)
+        try:
+            connection.connection.backup(snapshot)
+            # A self-contained file: no -wal/-shm next to it for readers to trip over
+            snapshot.execute('PRAGMA journal_mode = DELETE')
+        except BaseException:
+            snapshot.close()
+            partial.unlink(missing_ok=True)
+            raise
+        snapshot.close()
+        os.replace(partial, target)
+        connections[replica].close()  # this process's next replica read opens the new file
+        self.stdout.write(f"Refreshed {replica!r} ({target}) from {source!r}.")
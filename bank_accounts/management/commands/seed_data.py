@@ -0,0 +1,203 @@
+import datetime
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils.dateparse import parse_date
+
+from bank_accounts.models import (
+    AdministrativeOrder, BankAccount, Budget, CashbookEntry, LedgerEntry, Payment, Transaction,
+)
+
+SEED_USERNAME = 'seed'
+ACCOUNT_PREFIX = 'Seed account'
+
+# Heads that bring money in; every other head is paid out
+CREDIT_HEADS = {
+    'EXAM_FEES_COLLECTION', 'ADMISSION_FEES_COLLECTION', 'DONATIONS_RECEIVED', 'BANK_INTEREST_EARNED',
+    'RENT_RECEIVED', 'RESEARCH_GRANTS_RECEIVED', 'STUDENT_FEES_TUITION', 'GOVT_GRANTS_RECEIVED', 'ADVANCE',
+}
+MODES = ['NEFT', 'RTGS', 'CHEQUE', 'CASH', 'OTHER']
+MODE_WEIGHTS = [0.35, 0.05, 0.2, 0.3, 0.1]
+PAYEES = ['Sharma Traders', 'City Power Board', 'Municipal Water', 'R. Iyer', 'K. Menon', 'BookWorld',
+          'LabTech Supplies', 'SecureGuard', 'Metro Transport', 'PrintHub', 'A. Khan', 'S. Das']
+WORDS = ['monthly', 'quarterly', 'annual', 'arrears', 'advance', 'refund', 'instalment', 'semester',
+         'hostel', 'library', 'laboratory', 'sports', 'canteen', 'maintenance', 'batch', 'department']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic accounts, transactions (with ledger and cashbook entries), payments, "
+        "administrative orders and budgets in bulk, then rebuild the derived balance tables. "
+        "Meant for a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=10, help="Bank accounts to create (default 10).")
+        parser.add_argument('--transactions', type=int, default=100_000, help="Transactions to create (default 100000).")
+        parser.add_argument('--start', default='2022-04-01', help="First transaction date (YYYY-MM-DD).")
+        parser.add_argument('--days', type=int, default=730, help="Number of days the dates are spread over.")
+        parser.add_argument('--ledger-share', type=float, default=0.1, help="Fraction that are ledger entries.")
+        parser.add_argument('--cashbook-share', type=float, default=0.05, help="Fraction that are cashbook entries.")
+        parser.add_argument('--payment-share', type=float, default=0.05, help="Fraction of debits with a Payment.")
+        parser.add_argument('--order-share', type=float, default=0.01, help="Fraction with an administrative order.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT batch.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for repeatable data.")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start'] or '')
+        if start is None:
+            raise CommandError("--start must be a YYYY-MM-DD date.")
+        if options['accounts'] < 1 or options['transactions'] < 0 or options['days'] < 1:
+            raise CommandError("--accounts and --days must be positive and --transactions not negative.")
+        if options['ledger_share'] + options['cashbook_share'] > 1:
+            raise CommandError("--ledger-share and --cashbook-share must add up to at most 1.")
+
+        began = time.perf_counter()
+        self.rng = np.random.default_rng(options['seed'])
+        self.user, _ = User.objects.get_or_create(username=SEED_USERNAME)
+        accounts = self.seed_accounts(options['accounts'])
+        self.head_codes = [code for code, _ in Transaction.TRANSACTION_HEADS]
+        self.head_labels = dict(Transaction.TRANSACTION_HEADS)
+
+        deltas = {account.id: Decimal('0.00') for account in accounts}
+        remaining, created = options['transactions'], 0
+        while remaining > 0:
+            size = min(options['batch_size'], remaining)
+            with transaction.atomic():
+                batch_deltas = self.seed_batch(size, accounts, start, options)
+            for account_id, delta in batch_deltas.items():
+                deltas[account_id] += delta
+            remaining -= size
+            created += size
+            self.stdout.write(f"{created} transactions", ending='\r')
+        self.stdout.write('')
+
+        with transaction.atomic():
+            for account_id, delta in deltas.items():
+                BankAccount.objects.filter(pk=account_id).update(
+                    current_balance=F('current_balance') + delta, version=F('version') + 1,
+                )
+            self.seed_budgets(start, options['days'])
+        self.reset_sequences()
+
+        call_command('rebuild_running_balances', *[f'--account={account.id}' for account in accounts],
+                     stdout=self.stdout)
+        call_command('rebuild_daily_balances', *[f'--account={account.id}' for account in accounts],
+                     stdout=self.stdout)
+        call_command('rebuild_monthly_aggregates', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(accounts)} accounts and {created} transactions in {time.perf_counter() - began:.1f}s."
+        ))
+
+    def seed_accounts(self, count):
+        existing = BankAccount.objects.filter(name__startswith=ACCOUNT_PREFIX).count()
+        banks = ['State Bank of India', 'Canara Bank', 'HDFC Bank', 'Punjab National Bank']
+        return BankAccount.objects.bulk_create(
+            BankAccount(
+                name=f'{ACCOUNT_PREFIX} {existing + n + 1:03d}',
+                account_number=f'SEED{existing + n + 1:08d}',
+                bank_name=banks[n % len(banks)],
+                ifsc_code=f'SEED0{existing + n + 1:06d}',
+                opening_balance=Decimal('0.00'),  # balances are built from the seeded transactions
+            )
+            for n in range(count)
+        )
+
+    def seed_batch(self, size, accounts, start, options):
+        """Insert `size` transactions with their subtype rows; return the balance change per account."""
+        rng = self.rng
+        first_id = (Transaction.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        ids = np.arange(first_id, first_id + size)
+        account_ids = np.array([account.id for account in accounts])[rng.integers(len(accounts), size=size)]
+        heads = np.array(self.head_codes)[rng.integers(len(self.head_codes), size=size)]
+        modes = rng.choice(MODES, size=size, p=MODE_WEIGHTS)
+        kinds = rng.choice(
+            ['plain', 'ledger', 'cashbook'], size=size,
+            p=[1 - options['ledger_share'] - options['cashbook_share'], options['ledger_share'], options['cashbook_share']],
+        )
+        modes[kinds == 'cashbook'] = 'CASH'
+        credits = np.isin(heads, list(CREDIT_HEADS))
+        # Receipts are larger than payments, so seeded balances drift upwards
+        cents = np.round(rng.lognormal(np.where(credits, 11.2, 9.5), 1.1)).astype(np.int64) + 100
+        days = rng.integers(options['days'], size=size)
+        words = rng.integers(len(WORDS), size=size)
+        payees = rng.integers(len(PAYEES), size=size)
+
+        txns, deltas = [], {}
+        for n in range(size):
+            kind = 'CREDIT' if credits[n] else 'DEBIT'
+            amount = Decimal(int(cents[n])).scaleb(-2)
+            account_id = int(account_ids[n])
+            deltas[account_id] = deltas.get(account_id, Decimal('0.00')) + (amount if credits[n] else -amount)
+            txns.append(Transaction(
+                id=int(ids[n]), account_id=account_id, transaction_type=kind, transaction_head=heads[n],
+                transaction_mode=modes[n], amount=amount,
+                cheque_no=f'{int(ids[n]) % 1_000_000:06d}' if modes[n] == 'CHEQUE' else None,
+                description=f'{self.head_labels[heads[n]]} {WORDS[words[n]]} {PAYEES[payees[n]]}',
+                transaction_date=start + datetime.timedelta(days=int(days[n])),
+                created_by=self.user,
+            ))
+        Transaction.objects.bulk_create(txns, batch_size=options['batch_size'])
+
+        # Multi-table subtypes: the parent rows exist, so only the child rows are inserted
+        with connection.cursor() as cursor:
+            ledger = [(int(pk), f'LE-{pk}') for pk in ids[kinds == 'ledger']]
+            if ledger:
+                cursor.executemany(
+                    f'INSERT INTO {LedgerEntry._meta.db_table} (transaction_ptr_id, reference_number) VALUES (%s, %s)',
+                    ledger,
+                )
+            cashbook = [(int(pk), bool(credits[n])) for n, pk in enumerate(ids) if kinds[n] == 'cashbook']
+            if cashbook:
+                cursor.executemany(
+                    f'INSERT INTO {CashbookEntry._meta.db_table} (transaction_ptr_id, is_cash_in) VALUES (%s, %s)',
+                    cashbook,
+                )
+
+        payments = (~credits) & (rng.random(size) < options['payment_share'])
+        Payment.objects.bulk_create(
+            Payment(
+                transaction_id=int(ids[n]),
+                payment_type='TEACHER' if heads[n] == 'REMUNERATION_TEACHERS' else 'VENDOR',
+                payee_name=PAYEES[payees[n]], reference_document=f'INV-{ids[n]}',
+                payment_method={'CHEQUE': 'Cheque', 'CASH': 'Cash'}.get(modes[n], 'Bank Transfer'),
+                payment_date=txns[n].transaction_date,
+            )
+            for n in np.flatnonzero(payments)
+        )
+        orders = rng.random(size) < options['order_share']
+        AdministrativeOrder.objects.bulk_create(
+            AdministrativeOrder(
+                order_number=f'AO-{ids[n]}', title=f'Sanction: {self.head_labels[heads[n]]}',
+                description=txns[n].description, order_date=txns[n].transaction_date,
+                approved_by='Principal', amount_sanctioned=txns[n].amount, related_transaction_id=int(ids[n]),
+            )
+            for n in np.flatnonzero(orders)
+        )
+        return deltas
+
+    def seed_budgets(self, start, days):
+        years = range(start.year, (start + datetime.timedelta(days=days)).year + 1)
+        Budget.objects.bulk_create(
+            Budget(
+                name=f'{head} {year}-{year + 1}', start_date=datetime.date(year, 4, 1),
+                end_date=datetime.date(year + 1, 3, 31),
+                allocated_amount=Decimal(int(self.rng.integers(1, 50)) * 100_000),
+            )
+            for year in years for head in ('Academics', 'Infrastructure', 'Student welfare')
+        )
+
+    def reset_sequences(self):
+        # Transaction ids were assigned here; move the backend's sequence past them
+        statements = connection.ops.sequence_reset_sql(no_style(), [Transaction])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
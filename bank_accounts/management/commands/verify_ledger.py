@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bank_accounts.integrity import VERIFY_BATCH_SIZE, VERIFY_WORKERS, accept_opening_balances, verify_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every account's balance equals its opening balance plus its transactions. "
+        "Only transactions added since the last run are summed (per-account checkpoints); "
+        "--full recounts everything. Exits with an error if any account is off, unless --repair "
+        "reset those balances to what the transactions say. Accounts with no recorded opening "
+        "balance are listed until it is checked and recorded with --accept-opening."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help="Account id to verify (repeatable). Defaults to every account.")
+        parser.add_argument('--full', action='store_true', help="Ignore the checkpoints and sum every transaction.")
+        parser.add_argument('--repair', action='store_true',
+                            help="Reset wrong balances (and the running and daily balances derived from them).")
+        parser.add_argument('--accept-opening', type=int, action='append', dest='accept', default=[],
+                            help="Account id whose balance beyond its transactions has been checked and is its "
+                                 "opening balance (repeatable); recorded before verifying.")
+        parser.add_argument('--workers', type=int, default=VERIFY_WORKERS,
+                            help=f"Worker processes (default {VERIFY_WORKERS}; 1 runs in this process).")
+        parser.add_argument('--batch-size', type=int, default=VERIFY_BATCH_SIZE,
+                            help=f"Accounts per query (default {VERIFY_BATCH_SIZE}).")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be positive.")
+
+        for account_id, opening in sorted(accept_opening_balances(options['accept']).items()):
+            self.stdout.write(f"Account {account_id}: opening balance recorded as {opening}")
+
+        checked, discrepancies = verify_ledger(
+            options['accounts'], full=options['full'], repair=options['repair'],
+            workers=options['workers'], batch_size=options['batch_size'],
+        )
+        for d in discrepancies:
+            if d.opening_known:
+                self.stdout.write(
+                    f"Account {d.account_id}: balance {d.balance}, transactions say {d.expected} "
+                    f"(off by {d.difference}){' - repaired' if d.repaired else ''}"
+                )
+            else:
+                self.stdout.write(
+                    f"Account {d.account_id}: no opening balance recorded; balance {d.balance} is {d.difference} "
+                    f"beyond its transactions. If that is the opening balance, pass --accept-opening {d.account_id}."
+                )
+        unresolved = [d for d in discrepancies if not d.repaired]
+        if unresolved:
+            raise CommandError(f"{len(unresolved)} of {checked} accounts do not match their transactions.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Verified {checked} accounts" + (f", repaired {len(discrepancies)}." if discrepancies else ".")
+        ))
@@ -0,0 +1,235 @@
+# bank_accounts/metrics.py
+#
+# Per-route request metrics kept in process memory and exported in the Prometheus text
+# format. Each worker process keeps its own figures; scrape every worker (or run one).
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('bank_accounts.slow_requests')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# name -> (help text, buckets), in export order
+METRICS = {
+    'http_request_duration_seconds': ('Time from request to response, by route.', DURATION_BUCKETS),
+    'http_request_db_queries': ('SQL queries executed per request, by route.', QUERY_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent executing SQL per request, by route.', DURATION_BUCKETS),
+    'http_response_serialize_duration_seconds': ('Time spent serializing response data (serializers and '
+                                                 'values() row shaping), by route.', DURATION_BUCKETS),
+    'http_response_render_duration_seconds': ('Time spent rendering the response data into bytes, by route.',
+                                              DURATION_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram. Not locked itself; the registry serializes access."""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}  # (metric, route, method) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, values):
+        """Record one request: `values` maps metric name to the observed value."""
+        with self._lock:
+            for name, value in values.items():
+                key = (name, route, method)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(METRICS[name][1])
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            snapshot = sorted(
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()
+            )
+        lines = []
+        for name, (help_text, _) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (metric, route, method), counts, total, count, buckets in snapshot:
+                if metric != name:
+                    continue
+                labels = f'route="{_escape(route)}",method="{method}"'
+                cumulative = 0
+                for bound, bucket_count in zip([*buckets, '+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {total}')
+                lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class SerializationTimer:
+    """Time spent serializing during one request. Nested blocks count once, towards the outermost."""
+    __slots__ = ('total', 'depth', 'started')
+
+    def __init__(self):
+        self.total = 0.0
+        self.depth = 0
+        self.started = 0.0
+
+    def __enter__(self):
+        if not self.depth:
+            self.started = time.perf_counter()
+        self.depth += 1
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if not self.depth:
+            self.total += time.perf_counter() - self.started
+
+
+_serialization_timer = ContextVar('serialization_timer', default=None)
+_not_timed = nullcontext()
+
+
+def serializing():
+    """Context manager counting its block towards the current request's serialization time."""
+    timer = _serialization_timer.get()
+    return _not_timed if timer is None else timer
+
+
+class QueryRecorder:
+    """execute_wrapper recording (duration, sql) of every query run while installed."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+
+class RequestMetricsMiddleware:
+    """
+    Record latency, query count, DB time, serialization time and render time of every request under its route name
+    (e.g. `bankaccount-list`, `transaction-bank-statement`), and log requests slower than
+    SLOW_REQUEST_THRESHOLD_MS with their slowest queries.
+
+    Serialization time covers the blocks run under `serializing()`: the serializers'
+    to_representation (serializers.TimedRepresentationMixin) and the values() row shaping of
+    ValuesListMixin and the async list view, but not the queries that fetch the rows. Render
+    time covers only the renderer turning a DRF Response's data into bytes (JSON encoding).
+    Streamed bodies are produced after the middleware returns, so for them only the time to
+    the first byte is measured.
+    Runs natively under both WSGI and ASGI, so it never forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 500) / 1000
+        self.top_queries = getattr(settings, 'SLOW_REQUEST_TOP_QUERIES', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        timer = SerializationTimer()
+        request._render_times = []
+        start = time.perf_counter()
+        token = _serialization_timer.set(timer)
+        try:
+            with self.recording(recorder):
+                response = self.get_response(request)
+        finally:
+            _serialization_timer.reset(token)
+        self.observe(request, recorder, timer, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        timer = SerializationTimer()
+        request._render_times = []
+        start = time.perf_counter()
+        # Under ASGI the ORM runs a request's queries (async ORM calls and sync views alike) in
+        # the request's one thread-sensitive worker thread, whose connections are the ones to wrap
+        recording = await sync_to_async(self.recording)(recorder)
+        # Sync views see the timer too: sync_to_async runs them in a copy of this context
+        token = _serialization_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+            _serialization_timer.reset(token)
+        self.observe(request, recorder, timer, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def recording(recorder):
+        """An ExitStack that has `recorder` wrapping every connection of this thread until closed."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def observe(self, request, recorder, timer, duration):
+        match = request.resolver_match
+        route = (match.view_name or match.url_name or match.route) if match else '<unresolved>'
+        db_time = sum(elapsed for elapsed, _ in recorder.queries)
+        render_time = request._render_times[1] - request._render_times[0] if len(request._render_times) == 2 else 0.0
+        registry.observe(route, request.method, {
+            'http_request_duration_seconds': duration,
+            'http_request_db_queries': len(recorder.queries),
+            'http_request_db_duration_seconds': db_time,
+            'http_response_serialize_duration_seconds': timer.total,
+            'http_response_render_duration_seconds': render_time,
+        })
+
+        if duration >= self.threshold:
+            slowest = sorted(recorder.queries, key=lambda query: query[0], reverse=True)[:self.top_queries]
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in SQL, %.0f ms serializing, "
+                "%.0f ms rendering%s",
+                request.method, request.get_full_path(), route, duration * 1000, len(recorder.queries),
+                db_time * 1000, timer.total * 1000, render_time * 1000,
+                ''.join(f'\n  {elapsed * 1000:.1f} ms  {sql[:500]}' for elapsed, sql in slowest),
+            )
+
+    def process_template_response(self, request, response):
+        # Called right before the renderer runs (the view has already serialized the data);
+        # the callback runs right after
+        request._render_times.append(time.perf_counter())
+        response.add_post_render_callback(lambda _: request._render_times.append(time.perf_counter()))
+        return response
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0004_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='bank_accounts.bankaccount')),
+            ],
+            options={
+                'ordering': ['account', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'date'), name='daily_balance_account_date')],
+            },
+        ),
+    ]
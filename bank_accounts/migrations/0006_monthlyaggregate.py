@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0005_dailybalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('transaction_head', models.CharField(choices=[('ADVANCE', 'ADVANCE'), ('REIMBURSEMENT', 'REIMBURSEMENT'), ('ELECTRICITY', 'Electricity Bill'), ('REMUNERATION_TEACHERS', 'Teachers Remuneration'), ('SALARIES_STAFF', 'Staff Salaries'), ('MAINTENANCE_BUILDING', 'Building Maintenance'), ('LIBRARY_BOOKS', 'Library Books/Resources'), ('LAB_EQUIPMENT', 'Lab Equipment Purchase'), ('SPORTS_EQUIPMENT', 'Sports Equipment'), ('HOSTEL_EXPENSES', 'Hostel Operations/Maintenance'), ('ADVERTISING_MARKETING', 'Advertising & Marketing'), ('STUDENT_WELFARE', 'Student Welfare Activities'), ('UTILITIES_WATER', 'Water Bill'), ('TELEPHONE_INTERNET', 'Telephone & Internet Bills'), ('TRANSPORTATION', 'Transportation Costs'), ('EXAM_FEES_COLLECTION', 'Exam Fees Collection'), ('ADMISSION_FEES_COLLECTION', 'Admission Fees Collection'), ('DONATIONS_RECEIVED', 'Donations Received'), ('BANK_INTEREST_EARNED', 'Bank Interest Earned'), ('VENDOR_PAYMENT_SUPPLIES', 'Vendor Payment - Office Supplies'), ('SECURITY_SERVICES', 'Security Services'), ('AUDIT_FEES', 'Audit Fees'), ('SCHOLARSHIPS_DISBURSED', 'Scholarships Disbursed'), ('CULTURAL_EVENTS', 'Cultural Event Expenses'), ('SPORTS_EVENTS', 'Sports Event Expenses'), ('RENT_RECEIVED', 'Rent Received (Property/Facilities)'), ('SEMINARS_WORKSHOPS', 'Seminars & Workshops Expenses'), ('RESEARCH_GRANTS_RECEIVED', 'Research Grants Received'), ('BANK_CHARGES', 'Bank Charges/Fees'), ('STUDENT_FEES_TUITION', 'Student Tuition Fees'), ('EQUIPMENT_REPAIR', 'Equipment Repair & Servicing'), ('UNIFORM_PURCHASE', 'Uniform Purchase'), ('PRINTING_STATIONERY', 'Printing & Stationery'), ('GOVT_GRANTS_RECEIVED', 'Government Grants Received'), ('TAX_PAYMENTS', 'Tax Payments'), ('LOAN_REPAYMENT', 'Loan Repayment (Principal & Interest)'), ('CONSTRUCTION_EXPENSES', 'New Construction/Renovation'), ('OTHERS', 'OTHERS')], max_length=50)),
+                ('transaction_mode', models.CharField(choices=[('NEFT', 'NEFT'), ('RTGS', 'RTGS'), ('CHEQUE', 'CHEQUE'), ('CASH', 'CASH'), ('OTHER', 'OTHER')], max_length=50)),
+                ('transaction_type', models.CharField(choices=[('DEBIT', 'Debit'), ('CREDIT', 'Credit')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('count', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_aggregates', to='bank_accounts.bankaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='monthly_aggregate_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'month', 'transaction_head', 'transaction_mode', 'transaction_type'), name='monthly_aggregate_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0006_monthlyaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0007_bankaccount_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='is_reconciled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='reconciled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Full-text index on transaction descriptions: an FTS5 table with sync triggers on SQLite,
+# a generated tsvector column with a GIN index on PostgreSQL, nothing elsewhere.
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from bank_accounts.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from bank_accounts.search import drop_search_index
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0008_transaction_reconciliation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,20 @@
+# Move the SQLite full-text index to a self-contained FTS5 table that also covers the account
+# name and number, so a search is a single MATCH joined to the transactions.
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from bank_accounts.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0009_transaction_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, migrations.RunPython.noop),
+    ]
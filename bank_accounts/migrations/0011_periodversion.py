@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0010_transaction_search_account_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_versions', to='bank_accounts.bankaccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'month'), name='period_version_account_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Stored running balance per transaction, filled in for the existing history.
+
+from django.db import migrations, models
+
+
+def fill_balances(apps, schema_editor):
+    from bank_accounts.services import rebuild_running_balances
+    rebuild_running_balances(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_accounts', '0011_periodversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True),
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# The journal mode is stored in the SQLite file itself, so it is switched once here instead of
+# on every connection (which rewrote the database file whenever any command opened it).
+from django.db import migrations
+
+
+def journal_mode(mode):
+    def switch(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA journal_mode = {mode}')
+    return switch
+
+
+class Migration(migrations.Migration):
+    # SQLite cannot change the journal mode inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('bank_accounts', '0015_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(journal_mode('WAL'), journal_mode('DELETE')),
+    ]
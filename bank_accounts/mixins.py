@@ -0,0 +1,120 @@
+# bank_accounts/mixins.py
+from contextlib import ExitStack
+
+from django.db import transaction
+from rest_framework.response import Response
+
+from . import changes
+from .idempotency import idempotent
+from .metrics import serializing
+from .routers import reading_from, report_database, stream_from
+from .serializers import values_fields
+from .services import Posting, locked, post
+
+
+class ValuesListMixin:
+    """
+    Serve `list` from values() dicts instead of model instances.
+
+    Only for viewsets whose serializer is flat (no nested serializers); related columns
+    such as `account.name` become joins in the single list query. Annotations added by
+    filter backends (e.g. `search_rank`) are selected too and passed through to the output.
+    """
+
+    def list(self, request, *args, **kwargs):
+        lookups, to_representation = values_fields(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        annotations = [name for name in queryset.query.annotations if name not in lookups]
+        queryset = queryset.values(*lookups, *annotations)
+
+        def represent(row):
+            data = to_representation(row)
+            data.update((name, row[name]) for name in annotations)
+            return data
+
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        with serializing():
+            data = [represent(row) for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class IdempotentCreateMixin:
+    """Honour an Idempotency-Key header on `create`, so a retried POST is answered from storage (idempotency.py)."""
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+
+class ChangeLogMixin:
+    """
+    Log each create, update and delete to the change feed (changes.py) in the same database
+    transaction as the write. List it before mixins that override the same methods.
+    """
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            changes.record_instance(serializer.instance, changes.CREATE)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+            changes.record_instance(serializer.instance, changes.UPDATE)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            changes.record_deletion(instance)
+            super().perform_destroy(instance)
+
+
+class BalancePostingMixin:
+    """Viewset mixin that posts every transaction write to its account balance."""
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            instance = serializer.save(created_by=self.request.user)
+            post([Posting.of(instance)])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            before = Posting.of(locked(serializer.instance))
+            instance = serializer.save()
+            post([before.reversed(), Posting.of(instance)])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            before = Posting.of(locked(instance))
+            instance.delete()
+            post([before.reversed()])
+
+
+class ReplicaReadMixin:
+    """
+    Serve GET/HEAD requests for `replica_actions` from the report replica (routers.py).
+
+    Routing starts after authentication and permission checks, covers the body of streaming
+    responses, and falls back to the primary for the rest of the request once it writes.
+    `replica_actions = None` routes every safe request (for plain APIViews).
+    """
+    replica_actions = ('list',)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.replica_alias = None
+        with ExitStack() as self._replica_reads:  # always left, even if the view raises
+            response = super().dispatch(request, *args, **kwargs)
+        if self.replica_alias is not None and response.streaming:
+            response.streaming_content = stream_from(self.replica_alias, response.streaming_content)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and (
+            self.replica_actions is None or getattr(self, 'action', None) in self.replica_actions
+        ):
+            self.replica_alias = report_database()
+            if self.replica_alias is not None:
+                self._replica_reads.enter_context(reading_from(self.replica_alias))
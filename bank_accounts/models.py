@@ -1,6 +1,8 @@
 # bank_accounts/models.py
 from django.db import models
+from django.db.models import Case, F, Value, When
 from django.contrib.auth.models import User # For user authentication
+from django.core.serializers.json import DjangoJSONEncoder
 
 class BankAccount(models.Model):
     """Represents a bank account held by the college."""
@@ -9,9 +11,19 @@ class BankAccount(models.Model):
     bank_name = models.CharField(max_length=255, blank=True, null=True)
     ifsc_code = models.CharField(max_length=20, blank=True, null=True)
     current_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    # The balance the account was opened with, not backed by transactions; defaults to its
+    # balance when first saved. current_balance = opening_balance + its transactions (integrity.py).
+    # NULL for accounts opened before it was recorded, until integrity.accept_opening_balances
+    opening_balance = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
+    version = models.PositiveBigIntegerField(default=0) # Bumped by services.post on every posting
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.opening_balance is None:
+            self.opening_balance = self.current_balance
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.account_number})"
 
@@ -80,31 +92,49 @@ class Transaction(models.Model):
     cheque_no = models.CharField(max_length=10, blank=True, null=True )
     description = models.TextField(blank=True, null=True)
     transaction_date = models.DateField()
+    # Account balance once this transaction is applied in STATEMENT_ORDER;
+    # kept up to date by services.post
+    balance_after = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Set when the transaction is matched to a line of the bank's own statement
+    is_reconciled = models.BooleanField(default=False)
+    reconciled_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-transaction_date', '-created_at'] # Order by latest transactions
+        indexes = [
+            # Statements and per-account listings: account filter, date range, stable order
+            models.Index(fields=['account', 'transaction_date', 'created_at'], name='txn_account_date_idx'),
+            models.Index(fields=['transaction_type', 'transaction_date'], name='txn_type_date_idx'),
+            models.Index(fields=['transaction_head', 'transaction_date'], name='txn_head_date_idx'),
+            # Unfiltered listing in Meta.ordering order
+            models.Index(fields=['transaction_date', 'created_at'], name='txn_date_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type} {self.amount} on {self.transaction_date}"
 
+# The order an account's transactions apply in: statements, running balances (balance_after)
+STATEMENT_ORDER = ('transaction_date', 'created_at', 'id')
+
+def signed_amount():
+    """SQL expression for a transaction's effect on its account: credits add, debits subtract."""
+    return Case(
+        When(transaction_type='CREDIT', then=F('amount')),
+        When(transaction_type='DEBIT', then=-F('amount')),
+        default=Value(0),
+        output_field=models.DecimalField(max_digits=15, decimal_places=2),
+    )
+
 class LedgerEntry(Transaction):
     """Specific entry for the general ledger."""
     # Inherits from Transaction, so it has account, type, amount, date, etc.
     reference_number = models.CharField(max_length=100, unique=True, blank=True, null=True)
     # You might add specific ledger accounts here if needed, e.g., a ForeignKey to a ChartOfAccounts model
 
-    def save(self, *args, **kwargs):
-        # Update bank account balance on save
-        if not self.pk: # Only on creation
-            if self.transaction_type == 'CREDIT':
-                self.account.current_balance += self.amount
-            elif self.transaction_type == 'DEBIT':
-                self.account.current_balance -= self.amount
-            self.account.save()
-        super().save(*args, **kwargs)
+    # Balance posting happens in services.post, called from the viewsets.
 
 class CashbookEntry(Transaction):
     """Specific entry for the cash book (cash-in-hand transactions)."""
@@ -123,6 +153,121 @@ class CashbookEntry(Transaction):
         super().save(*args, **kwargs)
 
 
+class DailyBalance(models.Model):
+    """End-of-day snapshot of an account, kept up to date by services.post."""
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    debit_total = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    credit_total = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+
+    class Meta:
+        ordering = ['account', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='daily_balance_account_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.account.name} on {self.date}: {self.closing_balance}"
+
+
+class MonthlyAggregate(models.Model):
+    """Per-month totals of an account's transactions by head, mode and type, kept up to date by services.post."""
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='monthly_aggregates')
+    month = models.DateField() # First day of the month
+    transaction_head = models.CharField(max_length=50, choices=Transaction.TRANSACTION_HEADS)
+    transaction_mode = models.CharField(max_length=50, choices=Transaction.TRANSACTION_MODE)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'month', 'transaction_head', 'transaction_mode', 'transaction_type'],
+                name='monthly_aggregate_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='monthly_aggregate_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account.name} {self.month:%Y-%m} {self.transaction_head}/{self.transaction_mode} {self.transaction_type}: {self.total}"
+
+
+class PeriodVersion(models.Model):
+    """Posting counter per account and month, bumped by services.post; keys the report cache (reports.py)."""
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='period_versions')
+    month = models.DateField() # First day of the month
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'month'], name='period_version_account_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.account.name} {self.month:%Y-%m} v{self.version}"
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    How far the ledger verifier (integrity.py) has summed an account: the total of its
+    transactions with ids up to `last_transaction_id`. services.post keeps the total in step
+    when one of those transactions is edited or deleted.
+    """
+    account = models.OneToOneField(BankAccount, on_delete=models.CASCADE, related_name='ledger_checkpoint')
+    last_transaction_id = models.BigIntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    verified_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.account.name} through #{self.last_transaction_id}: {self.total}"
+
+
+class IdempotencyKey(models.Model):
+    """A create request's response, replayed when the client retries it with the same Idempotency-Key (idempotency.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64) # Of the method, path and body the key was first used with
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_user_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_key_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id}): {self.status_code}"
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only record of API writes, one row per object created, updated or deleted, written
+    in the writing transaction (changes.py); clients sync from it with /api/changes/?since=<seq>.
+    """
+    OPERATIONS = (
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=100) # Model name, e.g. 'transaction'
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATIONS)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.operation} {self.model} {self.object_id}"
+
+
 class Payment(models.Model):
     """Base model for all payments (teachers, vendors)."""
     PAYMENT_TYPES = (
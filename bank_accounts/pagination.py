@@ -0,0 +1,173 @@
+# bank_accounts/pagination.py
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import F, OrderBy, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite ordering such as (-transaction_date, -created_at, -id).
+
+    The cursor carries the ordering values of the row at the edge of the page, so every page is
+    an index seek (`WHERE (date, created_at, id) < (...)`) rather than an OFFSET, and no COUNT(*)
+    is issued. Ordering comes from the queryset's explicit order_by() (e.g. OrderingFilter), then
+    the model's Meta.ordering, with the primary key appended as a tiebreaker.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        try:
+            rows = list(queryset)
+        except (ValueError, ValidationError):  # cursor values of the wrong type
+            raise NotFound(self.invalid_cursor_message)
+        return self.page_from(rows)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, reading the page with async iteration."""
+        queryset = self.page_queryset(queryset, request)
+        try:
+            rows = [row async for row in queryset]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return self.page_from(rows)
+
+    def page_queryset(self, queryset, request):
+        """The query for the requested page, plus one row to tell whether there is another."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+
+        # values() querysets must carry the ordering columns for the cursor, e.g. a child
+        # model's `transaction_ptr` primary key that its serializer exposes as `id`
+        selected = getattr(queryset, '_fields', None)
+        if selected:
+            missing = [field.lstrip('-') for field in self.ordering if field.lstrip('-') not in selected]
+            if missing:
+                queryset = queryset.values(*selected, *missing)
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self.seek(self.cursor_values, self.reverse))
+        order_by = [self.flip(field) for field in self.ordering] if self.reverse else self.ordering
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def page_from(self, rows):
+        """The page out of page_queryset()'s rows; sets the next/previous positions."""
+        reverse = self.reverse
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_position = self.previous_position = None
+        if page:
+            if reverse or has_more:
+                self.next_position = self.position(page[-1])
+            if (reverse and has_more) or (not reverse and self.cursor_values is not None):
+                self.previous_position = self.position(page[0])
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        }
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [
+            self.ordering_name(field) for field in queryset.query.order_by or queryset.model._meta.ordering
+        ]
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+            last_descending = ordering[-1].startswith('-') if ordering else True
+            ordering.append(f'-{pk_name}' if last_descending else pk_name)
+        return [f'{pk_name}{field[3:]}' if field.lstrip('-') == 'pk' else field for field in ordering]
+
+    @staticmethod
+    def ordering_name(field):
+        """
+        An order_by() entry as 'name' / '-name'. Expressions other than a plain column or annotation
+        cannot be carried in a cursor; paging without them would skip or repeat rows, so they are
+        refused rather than dropped (annotate them and order by the annotation instead).
+        """
+        if isinstance(field, str):
+            return field
+        if isinstance(field, F):
+            return field.name
+        if isinstance(field, OrderBy) and isinstance(field.expression, F):
+            return f"{'-' if field.descending else ''}{field.expression.name}"
+        raise ImproperlyConfigured(f"Keyset pagination cannot order by {field!r}; order by a field or annotation.")
+
+    def seek(self, values, reverse):
+        """Q for rows strictly after `values` in the (possibly reversed) ordering."""
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            ties = {self.ordering[j].lstrip('-'): values[j] for j in range(i)}
+            clauses.append(Q(**ties, **{f"{name}__{'lt' if descending else 'gt'}": values[i]}))
+        return reduce(or_, clauses)
+
+    def position(self, row):
+        if isinstance(row, dict):  # values() querysets
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        cursor = json.dumps({'v': position, 'r': reverse}, default=str, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return list(cursor['v']), bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
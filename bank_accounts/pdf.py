@@ -0,0 +1,221 @@
+# bank_accounts/pdf.py
+#
+# PDF bank statements read and rendered in a process pool, so the web process only works out
+# the cache file name. Workers are spawned with django.setup() as their initializer; Django
+# models are imported inside functions so importing this module never needs the app registry.
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+from xml.sax.saxutils import escape
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+
+MAX_WAIT = 30.0  # seconds a request may block for a running render
+
+_executor = None
+_pending = {}  # cache path -> Future of the render writing it
+_lock = threading.Lock()
+
+
+class PdfJob(NamedTuple):
+    path: Path
+    ready: bool
+    error: Optional[str] = None
+
+
+def statement_pdf(account, start_date, end_date, wait=0.0):
+    """
+    Start (or look up) the PDF for this statement and report whether it is ready.
+
+    Files are keyed by account, date range, account version and last edit (as make_etag is); a
+    posting bumps the version and editing the account its updated_at, so a cached PDF is never
+    stale. `wait` is how many seconds to block for a running render.
+    """
+    path = cache_dir() / (
+        f"statement-{account.id}-{start_date}-{end_date}-v{account.version}-{account.updated_at:%Y%m%d%H%M%S%f}.pdf"
+    )
+    if path.exists():
+        return PdfJob(path, True)
+
+    with _lock:
+        future = _pending.get(path)
+    if future is None:
+        with _lock:
+            future = _pending.get(path)
+            if future is None:
+                executor = get_executor()
+                # A worker reads from the database the account came from (e.g. the report replica);
+                # rendering inline keeps this request's routing instead
+                database = None if isinstance(executor, _InlineExecutor) else {
+                    key: connections[account._state.db].settings_dict[key] for key in ('NAME', 'OPTIONS')
+                }
+                future = _pending[path] = executor.submit(
+                    render_statement, str(path), database, account.pk, start_date, end_date,
+                )
+
+    try:
+        future.result(timeout=wait)
+    except TimeoutError:
+        return PdfJob(path, False)
+    except Exception as exc:
+        error = str(exc) or type(exc).__name__
+    else:
+        error = None
+    with _lock:
+        _pending.pop(path, None)
+    return PdfJob(path, error is None, error)
+
+
+def pdf_wait(value):
+    """Seconds to block from ?wait=, clamped to [0, MAX_WAIT]; ValueError unless a finite number."""
+    if not value:
+        return 0.0
+    wait = float(value)
+    if not math.isfinite(wait):
+        raise ValueError(f"wait must be a finite number, not {value!r}.")
+    return min(max(wait, 0.0), MAX_WAIT)
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'STATEMENT_PDF_CACHE_DIR', Path(tempfile.gettempdir()) / 'statement_pdfs'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_executor():
+    """Process pool for rendering; STATEMENT_PDF_WORKERS = 0 renders in the calling thread instead."""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'STATEMENT_PDF_WORKERS', 2)
+        if workers:
+            # spawn, not fork: the web process may be multi-threaded and holds DB connections
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        else:
+            _executor = _InlineExecutor()
+    return _executor
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+def render_statement(path, database, account_id, start_date, end_date):
+    """Read the statement of `account_id` from `database` and write its PDF to `path`. Runs in a worker."""
+    from .models import BankAccount
+
+    if database is not None and {key: connection.settings_dict[key] for key in database} != database:
+        connection.close()  # a previous job read another database, e.g. the primary rather than the replica
+        connection.settings_dict.update(database)
+    header, rows = statement_data(BankAccount.objects.get(pk=account_id), start_date, end_date)
+    return render_statement_pdf(path, header, rows)
+
+
+def statement_data(account, start_date, end_date):
+    """Plain statement content (header dict, row tuples) for render_statement_pdf."""
+    from .models import Transaction
+    from .statements import signed_amount_of, statement_opening, statement_rows
+
+    head_labels = dict(Transaction.TRANSACTION_HEADS)
+    opening, stored = statement_opening(account, start_date)
+    closing = opening
+    rows = []
+    for row in statement_rows(account, start_date, end_date).iterator():
+        closing = row['running_balance'] if stored else closing + signed_amount_of(row)
+        debit = row['amount'] if row['transaction_type'] == 'DEBIT' else None
+        credit = row['amount'] if row['transaction_type'] == 'CREDIT' else None
+        rows.append((
+            row['transaction_date'].isoformat(),
+            head_labels.get(row['transaction_head'], row['transaction_head']),
+            row['description'] or '',
+            row['transaction_mode'],
+            row['cheque_no'] or '',
+            f'{debit:,.2f}' if debit is not None else '',
+            f'{credit:,.2f}' if credit is not None else '',
+            f'{closing:,.2f}',
+        ))
+    header = {
+        'name': account.name,
+        'account_number': account.account_number,
+        'bank_name': account.bank_name or '',
+        'ifsc_code': account.ifsc_code or '',
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'opening_balance': f'{opening:,.2f}',
+        'closing_balance': f'{closing:,.2f}',
+    }
+    return header, rows
+
+
+def render_statement_pdf(path, header, rows):
+    """Write the statement PDF to `path` atomically and drop older versions of it. Runs in a worker."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    small = styles['BodyText'].clone('small', fontSize=8, leading=10)
+    story = [
+        Paragraph(escape(f"Bank statement: {header['name']}"), styles['Title']),
+        Paragraph(escape(
+            f"Account {header['account_number']}  {header['bank_name']}  {header['ifsc_code']}".strip()
+        ), styles['Normal']),
+        Paragraph(escape(f"Period {header['start_date']} to {header['end_date']}"), styles['Normal']),
+        Paragraph(escape(f"Opening balance {header['opening_balance']}"), styles['Normal']),
+        Spacer(1, 5 * mm),
+    ]
+    table_rows = [['Date', 'Head', 'Description', 'Mode', 'Cheque', 'Debit', 'Credit', 'Balance']]
+    table_rows += [
+        [date, Paragraph(escape(head), small), Paragraph(escape(description), small), *rest]
+        for date, head, description, *rest in rows
+    ]
+    table = Table(
+        table_rows, repeatRows=1,
+        colWidths=[22 * mm, 45 * mm, 80 * mm, 18 * mm, 20 * mm, 28 * mm, 28 * mm, 30 * mm],
+    )
+    table.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('ALIGN', (5, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke]),
+    ]))
+    story += [table, Spacer(1, 5 * mm),
+              Paragraph(escape(f"Closing balance {header['closing_balance']}"), styles['Normal'])]
+
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        SimpleDocTemplate(
+            tmp_path, pagesize=landscape(A4), title=f"Statement {header['account_number']}",
+            leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=10 * mm,
+        ).build(story)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    prefix = name.rsplit('-v', 1)[0]
+    for stale in Path(directory).glob(f'{prefix}-v*.pdf'):
+        if stale.name != name:
+            stale.unlink(missing_ok=True)
+    return path
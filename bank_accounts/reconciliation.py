@@ -0,0 +1,214 @@
+# bank_accounts/reconciliation.py
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import changes
+from .models import BankAccount, Transaction
+
+DEFAULT_TOLERANCE_DAYS = 3
+UPDATE_BATCH_SIZE = 900  # ids per UPDATE, under SQLite's bound-parameter limit
+
+# Accepted spellings of the bank file's columns (compared lower-cased, spaces as underscores)
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction_date', 'txn_date', 'value_date', 'posting_date'),
+    'amount': ('amount', 'transaction_amount'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'dr'),
+    'credit': ('credit', 'deposit', 'deposits', 'cr'),
+    'type': ('type', 'transaction_type', 'dr_cr', 'cr_dr'),
+    'cheque_no': ('cheque_no', 'cheque', 'cheque_number', 'chq_no', 'check_no'),
+    'mode': ('mode', 'transaction_mode'),
+    'description': ('description', 'narration', 'particulars', 'remarks'),
+}
+TYPE_ALIASES = {'DR': 'DEBIT', 'D': 'DEBIT', 'DEBIT': 'DEBIT', 'CR': 'CREDIT', 'C': 'CREDIT', 'CREDIT': 'CREDIT'}
+
+
+class ReconciliationResult(NamedTuple):
+    matches: pd.DataFrame             # line, transaction_id
+    unmatched_lines: pd.DataFrame     # bank lines with no transaction
+    unmatched_transactions: pd.DataFrame
+
+
+def read_bank_statement(file, dayfirst=True):
+    """
+    Normalise a bank CSV into columns line, day, type, cents, cheque_no, mode (+ originals).
+
+    Amounts may be given as debit/credit columns, as amount plus a DR/CR type column, or as
+    a signed amount (negative = debit). ISO dates (2025-04-03) are always read as such; other
+    numeric dates are read day first (03/04/2025 is 3 April, as Indian banks write it) unless
+    `dayfirst` is False. Raises ValueError when the file cannot be understood.
+    """
+    raw = pd.read_csv(file, dtype=str, keep_default_na=False, skipinitialspace=True)
+    raw.columns = [str(c).strip().lower().replace(' ', '_') for c in raw.columns]
+    columns = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        columns[name] = next((alias for alias in aliases if alias in raw.columns), None)
+    if columns['date'] is None:
+        raise ValueError("The statement needs a date column.")
+
+    def money(column):
+        cleaned = raw[column].str.replace(',', '', regex=False).str.strip().replace('', '0')
+        return pd.to_numeric(cleaned, errors='raise')
+
+    if columns['debit'] and columns['credit']:
+        debit, credit = money(columns['debit']), money(columns['credit'])
+        amount = credit - debit
+    elif columns['amount']:
+        amount = money(columns['amount'])
+        if columns['type']:
+            kinds = raw[columns['type']].str.strip().str.upper().map(TYPE_ALIASES)
+            if kinds.isna().any():
+                raise ValueError("The type column must hold DEBIT/CREDIT or DR/CR.")
+            amount = amount.abs().where(kinds == 'CREDIT', -amount.abs())
+    else:
+        raise ValueError("The statement needs debit/credit columns or an amount column.")
+
+    days = _parse_days(raw[columns['date']].str.strip(), dayfirst)
+    if days.isna().any():
+        bad = int(days.isna().idxmax()) + 1
+        raise ValueError(f"Unreadable date on line {bad}.")
+
+    statement = pd.DataFrame({
+        'line': np.arange(1, len(raw) + 1),
+        'date': days.dt.date,
+        'day': _ordinal_days(days),
+        'type': np.where(amount < 0, 'DEBIT', 'CREDIT'),
+        'cents': (amount.abs() * 100).round().astype('int64'),
+        'cheque_no': _cheques(raw[columns['cheque_no']]) if columns['cheque_no'] else '',
+        'mode': raw[columns['mode']].str.strip().str.upper() if columns['mode'] else '',
+        'description': raw[columns['description']] if columns['description'] else '',
+    })
+    return statement, columns['mode'] is not None
+
+
+def load_transactions(account, first_day, last_day):
+    """Unreconciled transactions of `account` dated within [first_day, last_day], as a DataFrame."""
+    rows = (
+        Transaction.objects
+        .filter(account=account, is_reconciled=False, transaction_date__range=[first_day, last_day])
+        .values_list('id', 'transaction_date', 'transaction_type', 'amount', 'cheque_no', 'transaction_mode')
+    )
+    book = pd.DataFrame.from_records(
+        list(rows), columns=['transaction_id', 'date', 'type', 'amount', 'cheque_no', 'mode'],
+    )
+    book['day'] = _ordinal_days(pd.to_datetime(book['date']))
+    book['cents'] = (book['amount'].astype(float) * 100).round().astype('int64')
+    book['cheque_no'] = _cheques(book['cheque_no'].fillna(''))
+    return book
+
+
+def match(statement, book, tolerance_days=DEFAULT_TOLERANCE_DAYS, match_mode=False):
+    """
+    Pair bank lines with book transactions one-to-one.
+
+    Every pass is a hash join on (type, cents[, mode][, cheque_no], day + offset) in which
+    duplicates of a key are paired off by rank (1st with 1st, 2nd with 2nd, ...), so even
+    thousands of identical fee receipts match in a single merge. Passes go from the strictest
+    key to the loosest: cheque numbers agreeing, then lines where either side has no cheque
+    number, each at date offsets 0, ±1, ... ±tolerance_days. Two cheque numbers that differ
+    never match.
+    """
+    keys = ['type', 'cents'] + (['mode'] if match_mode else [])
+    offsets = [0] + [sign * d for d in range(1, tolerance_days + 1) for sign in (1, -1)]
+    lines = statement[['line', 'day', 'cheque_no', *keys]]
+    txns = book[['transaction_id', 'day', 'cheque_no', *keys]]
+    found = []
+
+    def run(line_filter, txn_filter, with_cheque):
+        nonlocal lines, txns
+        for offset in offsets:
+            left = lines[line_filter(lines)]
+            right = txns[txn_filter(txns)]
+            if left.empty or right.empty:
+                return
+            pairs = _rank_join(left, right.assign(day=right['day'] + offset),
+                               keys + ['day'] + (['cheque_no'] if with_cheque else []))
+            if pairs.empty:
+                continue
+            found.append(pairs)
+            lines = lines[~lines['line'].isin(pairs['line'])]
+            txns = txns[~txns['transaction_id'].isin(pairs['transaction_id'])]
+
+    has_cheque = lambda frame: frame['cheque_no'] != ''
+    no_cheque = lambda frame: frame['cheque_no'] == ''
+    anything = lambda frame: np.ones(len(frame), dtype=bool)
+    run(has_cheque, has_cheque, with_cheque=True)
+    run(no_cheque, anything, with_cheque=False)
+    run(has_cheque, no_cheque, with_cheque=False)
+
+    matches = (pd.concat(found) if found else pd.DataFrame(columns=['line', 'transaction_id'])).sort_values('line')
+    return ReconciliationResult(
+        matches=matches.reset_index(drop=True),
+        unmatched_lines=statement[statement['line'].isin(lines['line'])],
+        unmatched_transactions=book[book['transaction_id'].isin(txns['transaction_id'])],
+    )
+
+
+def reconcile(account, file, tolerance_days=DEFAULT_TOLERANCE_DAYS, dry_run=False, dayfirst=True):
+    """Match a bank statement file against `account` and mark matched transactions reconciled."""
+    statement, match_mode = read_bank_statement(file, dayfirst)
+    if statement.empty:
+        raise ValueError("The statement has no lines.")
+    window = datetime.timedelta(days=tolerance_days)
+    first_day, last_day = statement['date'].min(), statement['date'].max()
+    book = load_transactions(account, first_day - window, last_day + window)
+    result = match(statement, book, tolerance_days, match_mode)
+
+    if not dry_run and not result.matches.empty:
+        ids = result.matches['transaction_id'].astype(int).tolist()
+        now = timezone.now()
+        with transaction.atomic():
+            for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+                Transaction.objects.filter(id__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                    is_reconciled=True, reconciled_at=now,
+                )
+            # Statements show reconciliation status; invalidate their ETags
+            BankAccount.objects.filter(pk=account.pk).update(version=F('version') + 1)
+            changes.record(Transaction, ids, changes.UPDATE)
+            changes.record(BankAccount, [account.pk], changes.UPDATE)
+
+    # Book entries only just outside the statement period were candidates, not omissions
+    in_period = result.unmatched_transactions['date'].between(first_day, last_day)
+    return result._replace(unmatched_transactions=result.unmatched_transactions[in_period])
+
+
+def _rank_join(left, right, keys):
+    """Inner join on `keys`, pairing equal keys one-to-one in line / transaction order."""
+    left = left.sort_values('line')
+    right = right.sort_values('transaction_id')
+    left = left.assign(_rank=left.groupby(keys, sort=False).cumcount())
+    right = right.assign(_rank=right.groupby(keys, sort=False).cumcount())
+    pairs = left.merge(right, on=keys + ['_rank'], how='inner', suffixes=('', '_book'))
+    return pairs[['line', 'transaction_id']]
+
+
+def _parse_days(values, dayfirst):
+    """
+    Dates of a statement column, NaT where unreadable. Numeric dates (03/04/2025, 03-04-25) are
+    split explicitly, so a day over 12 in the month position is an error rather than a silent
+    swap; ISO dates are read as ISO, and anything else (03-Apr-2025) by pandas' parser.
+    """
+    parts = values.str.extract(r'^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})$').astype(float)
+    first, second, year = parts[0], parts[1], parts[2].where(parts[2] >= 100, parts[2] + 2000)
+    numeric = pd.to_datetime(pd.DataFrame({
+        'year': year, 'month': second if dayfirst else first, 'day': first if dayfirst else second,
+    }), errors='coerce')
+    iso = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    worded = pd.to_datetime(
+        values.where(parts[0].isna() & iso.isna()), format='mixed', dayfirst=dayfirst, errors='coerce',
+    )
+    return numeric.where(parts[0].notna(), iso.fillna(worded))
+
+
+def _ordinal_days(timestamps):
+    return (timestamps.values.astype('datetime64[D]').astype('int64')).astype('int64')
+
+
+def _cheques(values):
+    """Cheque numbers compared without whitespace or leading zeros."""
+    return values.astype(str).str.strip().str.lstrip('0')
@@ -0,0 +1,247 @@
+# bank_accounts/reports.py
+#
+# Summary reports shared by the DRF views and their async counterparts (async_views.py): each
+# report is lazy querysets plus a pure function shaping the evaluated rows into the response.
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import BankAccount, MonthlyAggregate, PeriodVersion, Transaction
+
+# Pivot column dimensions: the SQL expression grouped on
+PIVOT_COLUMNS = {
+    'month': TruncMonth('transaction_date'),
+    'mode': F('transaction_mode'),
+}
+# Output keys for transaction types
+PIVOT_VALUES = {'CREDIT': 'income', 'DEBIT': 'expense'}
+PIVOT_MAX_DAYS = 366 * 5
+
+DASHBOARD_TOP_HEADS = 5
+ACCOUNT_TOTALS = {'total': Sum('current_balance'), 'count': Count('id')}
+
+
+def pivot_params(params, max_days=PIVOT_MAX_DAYS):
+    """
+    (start_date, end_date, account_ids or None, columns) from head pivot query parameters.
+    Raises ValueError with a message for the client when they are missing or malformed.
+    """
+    try:
+        start_date, end_date = parse_date(params.get('start_date', '')), parse_date(params.get('end_date', ''))
+    except ValueError:
+        start_date = end_date = None
+    if start_date is None or end_date is None:
+        raise ValueError("start_date and end_date must be YYYY-MM-DD dates.")
+    if not 0 <= (end_date - start_date).days <= max_days:
+        raise ValueError(f"end_date must be on or after start_date and at most {max_days} days later.")
+    columns = params.get('columns', 'month')
+    if columns not in PIVOT_COLUMNS:
+        raise ValueError(f"columns must be one of: {', '.join(PIVOT_COLUMNS)}.")
+    try:
+        account_ids = sorted({int(value) for value in params.getlist('account')}) or None
+    except ValueError:
+        raise ValueError("account must be an account id.")
+    return start_date, end_date, account_ids, columns
+
+
+def head_pivot(start_date, end_date, account_ids=None, columns='month'):
+    """
+    Income and expense by transaction head x `columns` ('month' or 'mode') per account.
+
+    Cached (settings.REPORT_CACHE_TIMEOUT) under a key that includes the PeriodVersion of
+    every (account, month) in range, so any posting to one of them invalidates the report.
+    """
+    state = list(_period_versions(start_date, end_date, account_ids))
+    key = _cache_key(start_date, end_date, account_ids, columns, state)
+    report = cache.get(key)
+    if report is None:
+        report = build_head_pivot(start_date, end_date, account_ids, columns)
+        cache.set(key, report, settings.REPORT_CACHE_TIMEOUT)
+    return report
+
+
+async def ahead_pivot(start_date, end_date, account_ids=None, columns='month'):
+    """head_pivot() for async views."""
+    state = [version async for version in _period_versions(start_date, end_date, account_ids)]
+    key = _cache_key(start_date, end_date, account_ids, columns, state)
+    report = await cache.aget(key)
+    if report is None:
+        rows = [row async for row in _pivot_rows(start_date, end_date, account_ids, columns)]
+        report = shape_head_pivot(rows, start_date, end_date, account_ids, columns)
+        await cache.aset(key, report, settings.REPORT_CACHE_TIMEOUT)
+    return report
+
+
+def _period_versions(start_date, end_date, account_ids):
+    versions = PeriodVersion.objects.filter(month__range=(start_date.replace(day=1), end_date))
+    if account_ids is not None:
+        versions = versions.filter(account_id__in=account_ids)
+    return versions.order_by('account_id', 'month').values_list('account_id', 'month', 'version')
+
+
+def _cache_key(start_date, end_date, account_ids, columns, state):
+    digest = hashlib.sha1(
+        json.dumps([str(start_date), str(end_date), account_ids, columns, state], default=str).encode()
+    ).hexdigest()
+    return f'bank_accounts:head_pivot:{digest}'
+
+
+def build_head_pivot(start_date, end_date, account_ids=None, columns='month'):
+    """The uncached report: one GROUP BY over the range, reshaped with pandas."""
+    rows = list(_pivot_rows(start_date, end_date, account_ids, columns))
+    return shape_head_pivot(rows, start_date, end_date, account_ids, columns)
+
+
+def _pivot_rows(start_date, end_date, account_ids, columns):
+    transactions = Transaction.objects.filter(
+        transaction_date__range=(start_date, end_date), transaction_type__in=PIVOT_VALUES
+    )
+    if account_ids is not None:
+        transactions = transactions.filter(account_id__in=account_ids)
+    return (
+        transactions.annotate(column=PIVOT_COLUMNS[columns])
+        .values_list('account_id', 'transaction_head', 'column', 'transaction_type')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+
+
+def shape_head_pivot(rows, start_date, end_date, account_ids, columns):
+    """The report body from (account, head, column, type, total) rows."""
+    frame = pd.DataFrame.from_records(rows, columns=['account', 'head', 'column', 'type', 'total'])
+
+    if columns == 'month':
+        labels = list(pd.period_range(start_date, end_date, freq='M').strftime('%Y-%m'))
+        frame['column'] = [f'{month:%Y-%m}' for month in frame['column']]
+    else:
+        labels = [code for code, _ in Transaction.TRANSACTION_MODE]
+    frame['cents'] = (frame['total'].astype(float) * 100).round().astype('int64')
+    # (account, head) rows x (type, column) cents, every label present even where nothing was posted
+    table = frame.set_index(['account', 'head', 'type', 'column'])['cents'].unstack(['type', 'column']).reindex(
+        columns=pd.MultiIndex.from_product([list(PIVOT_VALUES), labels]), fill_value=0
+    ).fillna(0).astype('int64')
+
+    head_order = {code: n for n, (code, _) in enumerate(Transaction.TRANSACTION_HEADS)}
+    head_labels = dict(Transaction.TRANSACTION_HEADS)
+    accounts = sorted({int(account) for account in frame['account']} | set(account_ids or ()))
+    posted = set(table.index.get_level_values('account'))
+    report = []
+    for account in accounts:
+        block = table.xs(account, level='account') if account in posted else table.iloc[:0]
+        block = block.sort_index(key=lambda heads: heads.map(head_order))
+        entry = {"account": int(account), "heads": []}
+        for head, values in zip(block.index, block.to_numpy().reshape(len(block), len(PIVOT_VALUES), len(labels))):
+            item = {"head": head, "label": head_labels.get(head, head)}
+            for (key, line) in zip(PIVOT_VALUES.values(), values):
+                item[key] = _cents(line)
+                item[f'{key}_total'] = _cents(line.sum())
+            entry["heads"].append(item)
+        totals = block.to_numpy().sum(axis=0).reshape(len(PIVOT_VALUES), len(labels))
+        for key, line in zip(PIVOT_VALUES.values(), totals):
+            entry[key] = _cents(line)
+            entry[f'{key}_total'] = _cents(line.sum())
+        report.append(entry)
+
+    return {
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "columns": columns,
+        "column_labels": labels,
+        "accounts": report,
+    }
+
+
+def dashboard_month(value):
+    """The month (its first day) named by ?month=YYYY-MM, default this month; ValueError if malformed."""
+    if not value:
+        return timezone.localdate().replace(day=1)
+    return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+def dashboard_account(value):
+    """The account id from ?account=, or None for every account; ValueError if not a whole number."""
+    if not value:
+        return None
+    return int(value)
+
+
+def dashboard_queries(month, account_id=None, top_heads=DASHBOARD_TOP_HEADS):
+    """
+    The dashboard's querysets, read from MonthlyAggregate rather than the transaction table:
+    (accounts, to aggregate with ACCOUNT_TOTALS; totals by type; top heads; modes).
+    """
+    accounts = BankAccount.objects.all()
+    aggregates = MonthlyAggregate.objects.filter(month=month)
+    if account_id is not None:
+        accounts = accounts.filter(pk=account_id)
+        aggregates = aggregates.filter(account_id=account_id)
+
+    by_type = aggregates.values_list('transaction_type').annotate(Sum('total')).order_by()
+    by_type_amounts = {
+        'credit': Sum('total', filter=Q(transaction_type='CREDIT')),
+        'debit': Sum('total', filter=Q(transaction_type='DEBIT')),
+        'count': Sum('count'),
+    }
+    heads = (
+        aggregates.values('transaction_head')
+        .annotate(amount=Sum('total'), **by_type_amounts)
+        .order_by('-amount', 'transaction_head')[:top_heads]
+    )
+    modes = aggregates.values('transaction_mode').annotate(**by_type_amounts).order_by('transaction_mode')
+    return accounts, by_type, heads, modes
+
+
+def dashboard_summary(month, balances, by_type, heads, modes):
+    """The dashboard body from the evaluated dashboard_queries()."""
+    by_type = dict(by_type)
+    head_labels = dict(Transaction.TRANSACTION_HEADS)
+    return {
+        "total_balance": _money(balances['total']),
+        "account_count": balances['count'],
+        "month": f"{month:%Y-%m}",
+        "month_to_date": {
+            "credit": _money(by_type.get('CREDIT')),
+            "debit": _money(by_type.get('DEBIT')),
+        },
+        "top_heads": [
+            {
+                "head": row['transaction_head'],
+                "label": head_labels.get(row['transaction_head'], row['transaction_head']),
+                "credit": _money(row['credit']),
+                "debit": _money(row['debit']),
+                "count": row['count'],
+            }
+            for row in heads
+        ],
+        "modes": [
+            {
+                "mode": row['transaction_mode'],
+                "credit": _money(row['credit']),
+                "debit": _money(row['debit']),
+                "count": row['count'],
+            }
+            for row in modes
+        ],
+    }
+
+
+def _money(value):
+    """Format an aggregated amount like DecimalField does (SQLite sums come back unscaled)."""
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+def _cents(cents):
+    """Cents (a scalar or an array of them) as DecimalField-style strings."""
+    if np.ndim(cents):
+        return [_cents(value) for value in cents]
+    return str(Decimal(int(cents)).scaleb(-2))
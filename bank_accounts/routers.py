@@ -0,0 +1,92 @@
+# bank_accounts/routers.py
+#
+# Report reads on a replica. Views opt in per action (ReplicaReadMixin), which routes this
+# app's reads for the rest of the request to settings.REPORT_DATABASE; everything else,
+# and every read after the request's first write, stays on the primary.
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_APP_LABELS = {'bank_accounts'}  # auth, sessions etc. are always read from the primary
+
+_routing = ContextVar('report_routing', default=None)
+
+
+class _Routing:
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+
+def report_database():
+    """
+    The alias report reads should use, or None to stay on the primary: when no replica is
+    configured, when it is the primary itself (as under the test runner's MIRROR), or when a
+    SQLite replica has not been created yet by refresh_replica.
+    """
+    alias = getattr(settings, 'REPORT_DATABASE', None)
+    if not alias or alias == DEFAULT_DB_ALIAS or alias not in settings.DATABASES:
+        return None
+    replica, primary = connections[alias].settings_dict, connections[DEFAULT_DB_ALIAS].settings_dict
+    if replica['NAME'] == primary['NAME']:
+        return None
+    if connections[alias].vendor == 'sqlite' and not Path(replica['NAME']).exists():
+        return None
+    return alias
+
+
+@contextmanager
+def reading_from(alias):
+    """Route this app's reads to `alias` until the block exits or something is written."""
+    token = _routing.set(_Routing(alias))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def stream_from(alias, iterable):
+    """Iterate `iterable` (a streaming response body) with its queries routed to `alias`."""
+    iterator = iter(iterable)
+    while True:
+        with reading_from(alias):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def astream_from(alias, aiterable):
+    """stream_from() for async streaming bodies."""
+    iterator = aiter(aiterable)
+    while True:
+        with reading_from(alias):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+class ReportReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and not routing.wrote and model._meta.app_label in REPLICA_APP_LABELS:
+            return routing.alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True  # read your writes: the rest of the request reads the primary
+        # Explicitly, or objects read from the replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == getattr(settings, 'REPORT_DATABASE', None):
+            return False  # a snapshot of the primary; refresh_replica replaces it wholesale
+        return None
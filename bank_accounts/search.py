@@ -0,0 +1,215 @@
+# bank_accounts/search.py
+#
+# Full-text search over transactions. SQLite keeps an FTS5 table of each transaction's
+# description and account name/number, in step through triggers on both tables; PostgreSQL
+# gets a generated tsvector column over the description with a GIN index. Other backends fall
+# back to DRF's icontains search.
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+TRANSACTION_TABLE = 'bank_accounts_transaction'
+ACCOUNT_TABLE = 'bank_accounts_bankaccount'
+FTS_TABLE = 'bank_accounts_transaction_fts'
+# Search fields each backend's index covers, with the SQLite FTS column holding each
+FULLTEXT_FIELDS = {
+    'sqlite': {'description': 'description', 'account__name': 'account_name',
+               'account__account_number': 'account_number'},
+    'postgresql': {'description': 'description'},
+}
+MAX_SEARCH_TOKENS = 8
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# The FTS table keeps its own copy of the text rather than reading it from the tables
+# (external content): a view joining the two would stop migrations rebuilding either table.
+_FTS_COLUMNS = 'description, account_name, account_number'
+_FTS_ROWS = f"""SELECT t.id, t.description, a.name, a.account_number
+    FROM {TRANSACTION_TABLE} t JOIN {ACCOUNT_TABLE} a ON a.id = t.account_id"""
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_FTS_COLUMNS}, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TRANSACTION_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) {_FTS_ROWS} WHERE t.id = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TRANSACTION_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, account_id ON {TRANSACTION_TABLE}
+    WHEN old.description IS NOT new.description OR old.account_id IS NOT new.account_id BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) {_FTS_ROWS} WHERE t.id = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_account_au AFTER UPDATE OF name, account_number ON {ACCOUNT_TABLE}
+    WHEN old.name IS NOT new.name OR old.account_number IS NOT new.account_number BEGIN
+        UPDATE {FTS_TABLE} SET account_name = new.name, account_number = new.account_number
+        WHERE rowid IN (SELECT id FROM {TRANSACTION_TABLE} WHERE account_id = new.id);
+    END""",
+]
+SQLITE_TRIGGERS = ['ai', 'ad', 'au', 'account_au']
+SQLITE_DROP_SQL = [
+    *(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{name}" for name in SQLITE_TRIGGERS),
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRES_INDEX_SQL = [
+    f"""ALTER TABLE {TRANSACTION_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(description, ''))) STORED""",
+    f"CREATE INDEX IF NOT EXISTS txn_search_vector_idx ON {TRANSACTION_TABLE} USING GIN (search_vector)",
+]
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS txn_search_vector_idx",
+    f"ALTER TABLE {TRANSACTION_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install_search_index(connection):
+    """
+    Create the full-text index for `connection`'s backend if any part of it is missing.
+
+    Idempotent; also run after every migrate because SQLite drops the triggers whenever a
+    migration rebuilds a table. A (re)created SQLite index is filled from the tables.
+    """
+    if connection.vendor == 'sqlite':
+        names = [FTS_TABLE, *(f'{FTS_TABLE}_{name}' for name in SQLITE_TRIGGERS)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names,
+            )
+            if cursor.fetchone()[0] == len(names):
+                return
+            for sql in SQLITE_DROP_SQL + SQLITE_INDEX_SQL:  # also replaces older layouts of the index
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) {_FTS_ROWS}")
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for sql in POSTGRES_INDEX_SQL:
+                cursor.execute(sql)
+
+
+def connect_search_index(connection):
+    """
+    Load the FTS5 table into a new SQLite connection before it opens any transaction.
+
+    SQLite connects a virtual table on first use by reading its config, so the first insert
+    of a connection would take a read lock before its write lock; two such writers deadlock
+    and one fails with "database is locked" instead of waiting.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(f"SELECT 1 FROM {FTS_TABLE} WHERE rowid = 0")
+        except DatabaseError:  # not migrated yet
+            pass
+
+
+def drop_search_index(connection):
+    statements = {'sqlite': SQLITE_DROP_SQL, 'postgresql': POSTGRES_DROP_SQL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def search_tokens(text):
+    """Words of a search string, lower-cased; punctuation never reaches the query syntax."""
+    return TOKEN_RE.findall(text.lower())[:MAX_SEARCH_TOKENS]
+
+
+def search_transactions(queryset, tokens, fields=('description',), alternatives=None):
+    """
+    `queryset` narrowed to transactions where every token prefix-matches a word of the indexed
+    `fields`, annotated with `search_rank` (higher is better).
+
+    On SQLite the FTS table is joined in, so the query and bm25() are evaluated once per query
+    rather than once per row. `alternatives` (a Q of further matches, rank 0) is PostgreSQL-only:
+    SQLite cannot OR a MATCH with other conditions.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        if alternatives is not None:
+            raise ValueError("SQLite full-text matches cannot be combined with other conditions.")
+        columns = ' '.join(FULLTEXT_FIELDS['sqlite'][field] for field in fields)
+        query = '{%s} : %s' % (columns, ' '.join(f'"{token}"*' for token in tokens))
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {TRANSACTION_TABLE}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+        ).annotate(search_rank=RawSQL(f'-bm25({FTS_TABLE})', [], output_field=FloatField()))
+    if vendor == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        matches = Q(pk__in=RawSQL(
+            f"SELECT id FROM {TRANSACTION_TABLE} WHERE search_vector @@ to_tsquery('simple', %s)", [query],
+        ))
+        return queryset.filter(matches | alternatives if alternatives is not None else matches).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({TRANSACTION_TABLE}.search_vector, to_tsquery('simple', %s))",
+                [query], output_field=FloatField(),
+            ),
+        )
+    raise ValueError(f"No full-text index on {vendor}.")
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ?search= through the full-text index, best matches first.
+
+    Every word must prefix-match a word of the indexed search fields (`FULLTEXT_FIELDS`).
+    On PostgreSQL, which indexes only the description, every word may instead appear in the
+    remaining search fields; those across a foreign key (`account__name`) are searched in the
+    related table and applied as `account_id IN (...)`. Results are annotated with
+    `search_rank` and, unless ?ordering= says otherwise, ordered by it. Backends (or
+    search_fields) the index does not cover get the plain SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        terms = self.get_search_terms(request)
+        tokens = search_tokens(' '.join(terms))
+        if not search_fields or not tokens:
+            return queryset
+        vendor = connections[queryset.db].vendor
+        indexed = [field for field in search_fields if field in FULLTEXT_FIELDS.get(vendor, {})]
+        others = [field for field in search_fields if field not in indexed]
+        if not indexed or (others and vendor == 'sqlite'):
+            return super().filter_queryset(request, queryset, view)
+
+        alternatives = None
+        for field_name, fields in self.other_fields(queryset.model, others).items():
+            if field_name is None:
+                condition = self.all_terms_in(queryset, fields, terms)
+            else:
+                related = queryset.model._meta.get_field(field_name).related_model.objects.all()
+                condition = Q(**{f'{field_name}__in': related.filter(
+                    self.all_terms_in(related, fields, terms)
+                ).values('pk')})
+            alternatives = condition if alternatives is None else alternatives | condition
+
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        queryset = search_transactions(queryset, tokens, indexed, alternatives)
+        return queryset.order_by('-search_rank', *ordering)
+
+    @staticmethod
+    def other_fields(model, search_fields):
+        """Search fields grouped by foreign key name (None for the model's own)."""
+        groups = {}
+        for field in search_fields:
+            prefix = field[0] if field[0] in SearchFilter.lookup_prefixes else ''
+            head, _, rest = field[len(prefix):].partition('__')
+            if rest and model._meta.get_field(head).many_to_one:
+                groups.setdefault(head, []).append(prefix + rest)
+            else:
+                groups.setdefault(None, []).append(field)
+        return groups
+
+    def all_terms_in(self, queryset, fields, terms):
+        lookups = [self.construct_search(str(field), queryset) for field in fields]
+        condition = Q()
+        for term in terms:
+            any_field = Q()
+            for lookup in lookups:
+                any_field |= Q(**{lookup: term})
+            condition &= any_field
+        return condition
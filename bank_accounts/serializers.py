@@ -2,12 +2,26 @@ from rest_framework import serializers
 from .models import BankAccount, Transaction, LedgerEntry, CashbookEntry, Payment, Budget, AdministrativeOrder
 from django.contrib.auth.models import User
 
+from .metrics import serializing
+
 # class UserSerializer(serializers.ModelSerializer):
 #     class Meta:
 #         model = User
 #         fields = ['id', 'username', 'email']
 
-class BankAccountSerializer(serializers.ModelSerializer):
+class TimedRepresentationMixin:
+    """Count `to_representation` towards the request's serialization time (metrics.py).
+
+    With `many=True` each row is timed as the list serializer reaches it, so fetching the
+    rows from the database is left out.
+    """
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+
+class BankAccountSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
      # This creates a writable field 'balance' that maps to 'current_balance'
     balance = serializers.DecimalField(
         max_digits=15,
@@ -19,10 +33,33 @@ class BankAccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = BankAccount
         fields = '__all__'
-
-
-
-class TransactionSerializer(serializers.ModelSerializer):
+        read_only_fields = ['version', 'opening_balance']
+
+    def validate(self, attrs):
+        # Sending the balance back unchanged (e.g. a PUT of what was read) is fine; changing it is not
+        if self.instance is not None:
+            for name in ('balance', 'current_balance'):
+                if name in self.initial_data and self.fields[name].to_internal_value(
+                    self.initial_data[name]
+                ) != self.instance.current_balance:
+                    raise serializers.ValidationError({
+                        name: "The balance changes only through transactions; post one to adjust it.",
+                    })
+        return attrs
+
+    def update(self, instance, validated_data):
+        # The balance is set when the account is opened and only moved by services.post after
+        # that; saving every column would write back a balance and version read before
+        # concurrent postings (or the 0.00 default, on a PUT that leaves the balance out)
+        validated_data.pop('current_balance', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+
+class TransactionSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     account = serializers.PrimaryKeyRelatedField(
      queryset=BankAccount.objects.all() # This tells DRF which BankAccount objects are valid
     )
@@ -31,10 +68,31 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = '__all__'
-        read_only_fields = ['created_by', 'created_by_username', 'bank_account_name']
+        read_only_fields = ['created_by', 'created_by_username', 'bank_account_name', 'is_reconciled', 'reconciled_at', 'balance_after']
+
+
+class TransactionImportSerializer(serializers.Serializer):
+    """Validates one row of a bulk import without touching the database.
+
+    Reused across rows via `run_validation`; the caller supplies the set of valid
+    account ids in `context['account_ids']`.
+    """
+    account = serializers.IntegerField()
+    transaction_type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES)
+    transaction_head = serializers.ChoiceField(choices=Transaction.TRANSACTION_HEADS)
+    transaction_mode = serializers.ChoiceField(choices=Transaction.TRANSACTION_MODE)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+    cheque_no = serializers.CharField(max_length=10, required=False, allow_blank=True, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    transaction_date = serializers.DateField()
 
+    def validate_account(self, value):
+        if value not in self.context['account_ids']:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return value
 
-class LedgerEntrySerializer(serializers.ModelSerializer):
+
+class LedgerEntrySerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     # Inherits fields from Transaction implicitly because LedgerEntry is a sub-model
     transaction_type = serializers.CharField(read_only=True) # Force 'DEBIT' or 'CREDIT' based on frontend logic
     account_name = serializers.CharField(source='account.name', read_only=True)
@@ -42,16 +100,18 @@ class LedgerEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = LedgerEntry
         fields = '__all__'
+        read_only_fields = ['balance_after']
 
-class CashbookEntrySerializer(serializers.ModelSerializer):
+class CashbookEntrySerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     transaction_type = serializers.CharField(read_only=True) # Will be set by `save` method of model
     account_name = serializers.CharField(source='account.name', read_only=True)
 
     class Meta:
         model = CashbookEntry
         fields = '__all__'
+        read_only_fields = ['balance_after']
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     transaction = TransactionSerializer(read_only=True) # Nested serializer for transaction details
     transaction_id = serializers.PrimaryKeyRelatedField(
         queryset=Transaction.objects.all(), source='transaction', write_only=True
@@ -61,12 +121,12 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = '__all__'
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Budget
         fields = '__all__'
 
-class AdministrativeOrderSerializer(serializers.ModelSerializer):
+class AdministrativeOrderSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     related_transaction = TransactionSerializer(read_only=True)
     related_transaction_id = serializers.PrimaryKeyRelatedField(
         queryset=Transaction.objects.all(), source='related_transaction', write_only=True, allow_null=True, required=False
@@ -77,8 +137,43 @@ class AdministrativeOrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
         
 
+def values_fields(serializer):
+    """
+    Describe a flat serializer's output as `values()` lookups.
+
+    Returns the lookups to select and a function turning one values() dict into the same
+    representation `serializer.data` would give for the instance, without loading models.
+    """
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)) or field.source == '*':
+            raise TypeError(f"{type(serializer).__name__}.{name} cannot be read from values()")
+        lookup = field.source.replace('.', '__')
+        # Related fields come back from values() as the raw primary key already
+        convert = None if isinstance(field, serializers.RelatedField) else field.to_representation
+        # DRF leaves out e.g. `created_by.username` when `created_by` is null
+        omit_null = len(field.source_attrs) > 1 and not field.allow_null and not field.required
+        columns.append((name, lookup, convert, omit_null))
+
+    def to_representation(row):
+        data = {}
+        for name, lookup, convert, omit_null in columns:
+            value = row[lookup]
+            if value is None:
+                if not omit_null:
+                    data[name] = None
+            else:
+                data[name] = value if convert is None else convert(value)
+        return data
+
+    lookups = list(dict.fromkeys(column[1] for column in columns))
+    return lookups, to_representation
+
+
 # --- New User Serializer for Registration ---
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
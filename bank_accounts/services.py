@@ -0,0 +1,330 @@
+# bank_accounts/services.py
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Count, DecimalField, F, Min, Q, Sum, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce, Round, TruncMonth
+
+from . import changes
+from .models import (
+    STATEMENT_ORDER, BankAccount, DailyBalance, LedgerCheckpoint, MonthlyAggregate, PeriodVersion, Transaction,
+    signed_amount,
+)
+
+REBUILD_BATCH_SIZE = 1000
+
+
+class Posting(NamedTuple):
+    """The effect of one transaction on its account (sign=-1 reverses it)."""
+    account_id: int
+    transaction_type: str
+    amount: Decimal
+    transaction_date: datetime.date
+    transaction_head: str
+    transaction_mode: str
+    sign: int = 1
+    transaction_id: Optional[int] = None
+
+    @classmethod
+    def of(cls, txn):
+        return cls(
+            transaction_id=txn.pk,
+            account_id=txn.account_id,
+            transaction_type=txn.transaction_type,
+            amount=Decimal(txn.amount),
+            transaction_date=txn.transaction_date,
+            transaction_head=txn.transaction_head,
+            transaction_mode=txn.transaction_mode,
+        )
+
+    def reversed(self):
+        return self._replace(sign=-self.sign)
+
+    @property
+    def delta(self):
+        """Signed change to the account balance."""
+        if self.transaction_type == 'CREDIT':
+            return self.sign * self.amount
+        if self.transaction_type == 'DEBIT':
+            return -self.sign * self.amount
+        return Decimal('0.00')
+
+
+def post(postings):
+    """
+    Apply postings to account balances, the running balances of the transactions they touch,
+    daily snapshots, monthly aggregates, the (account, month) versions that key cached reports,
+    the ledger verifier's checkpoints and the change feed (changes.py).
+
+    Deltas are summed per account and written with one `UPDATE ... SET current_balance =
+    current_balance + delta, version = version + 1` each, so concurrent writers never overwrite
+    each other and every touched account gets a new version (see conditional.py). Accounts
+    are locked in primary-key order (where the backend has row locks) to avoid deadlocks.
+    """
+    postings = list(postings)
+    deltas = defaultdict(Decimal)
+    for posting in postings:
+        deltas[posting.account_id] += posting.delta
+    if not deltas:
+        return
+
+    account_ids = sorted(deltas)
+    with transaction.atomic():
+        lock_accounts(account_ids)
+        for account_id in account_ids:
+            BankAccount.objects.filter(pk=account_id).update(
+                current_balance=F('current_balance') + deltas[account_id], version=F('version') + 1
+            )
+        first_changed_days = _first_changed_days(postings)
+        for account_id, since in first_changed_days.items():
+            rebuild_running_balances(account_id, since)
+        _post_daily_balances(postings, deltas)
+        _post_monthly_aggregates(postings)
+        bump_period_versions({(p.account_id, p.transaction_date.replace(day=1)) for p in postings})
+        _post_checkpoints(postings)
+        changes.record_postings(account_ids, first_changed_days, {p.transaction_id for p in postings})
+
+
+def lock_accounts(account_ids):
+    """Row-lock accounts for the rest of the transaction (where the backend can), in primary-key order."""
+    if connection.features.has_select_for_update:
+        list(
+            BankAccount.objects.select_for_update()
+            .filter(pk__in=account_ids).order_by('pk').values_list('pk', flat=True)
+        )
+
+
+def _first_changed_days(postings):
+    """
+    Per account, the earliest date whose running balances `postings` change. A posting and its
+    reversal cancel out, so editing only a description changes none.
+    """
+    net = defaultdict(int)
+    for posting in postings:
+        net[posting._replace(sign=1)] += posting.sign
+    days = {}
+    for posting, count in net.items():
+        if count:
+            day = days.get(posting.account_id, posting.transaction_date)
+            days[posting.account_id] = min(day, posting.transaction_date)
+    return days
+
+
+def rebuild_running_balances(account_id=None, since=None, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute `balance_after` for the transactions of `account_id` (default every account)
+    dated `since` or later (default all), in one set-based UPDATE. Returns the rows written.
+
+    A transaction's balance is its account's current balance less everything applied after
+    it, a window sum over the suffix being rewritten: earlier rows are never read, so a
+    backdated posting costs as much as the history after it.
+    """
+    rows = Transaction.objects.using(using)
+    if account_id is not None:
+        rows = rows.filter(account_id=account_id)
+    if since is not None:
+        rows = rows.filter(transaction_date__gte=since)
+    applied_later = Window(
+        expression=Sum(signed_amount()),
+        partition_by=[F('account_id')],
+        order_by=[F(field).desc() for field in STATEMENT_ORDER],
+        frame=RowRange(start=None, end=-1),
+    )
+    balances = rows.annotate(
+        balance=Round(F('account__current_balance') - Coalesce(applied_later, Decimal('0.00')), 2,
+                      output_field=DecimalField(max_digits=15, decimal_places=2)),
+    ).order_by().values('id', 'balance')
+
+    # UPDATE ... FROM (SQLite 3.33+, PostgreSQL): the ORM cannot update from a window function
+    sql, params = balances.query.sql_with_params()
+    db = connections[using]
+    table = db.ops.quote_name(Transaction._meta.db_table)
+    with db.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET balance_after = running.balance FROM ({sql}) AS running WHERE {table}.id = running.id",
+            params,
+        )
+        return cursor.rowcount
+
+
+def _post_daily_balances(postings, deltas):
+    """Add postings to their day's totals and carry the change forward to every later day.
+
+    Runs after the balance UPDATEs; `deltas` recovers each account's balance before them.
+    """
+    days = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])  # (account, date) -> [debit, credit]
+    for posting in postings:
+        if posting.transaction_type == 'DEBIT':
+            days[posting.account_id, posting.transaction_date][0] += posting.sign * posting.amount
+        elif posting.transaction_type == 'CREDIT':
+            days[posting.account_id, posting.transaction_date][1] += posting.sign * posting.amount
+
+    for (account_id, day), (debit, credit) in sorted(days.items()):
+        if not debit and not credit:
+            continue
+        snapshots = DailyBalance.objects.filter(account_id=account_id)
+        if not snapshots.filter(date=day).exists():
+            DailyBalance.objects.create(
+                account_id=account_id, date=day,
+                closing_balance=_closing_before(account_id, day, deltas[account_id]),
+            )
+        snapshots.filter(date=day).update(
+            debit_total=F('debit_total') + debit, credit_total=F('credit_total') + credit
+        )
+        snapshots.filter(date__gte=day).update(closing_balance=F('closing_balance') + credit - debit)
+
+
+def _closing_before(account_id, day, posted_delta):
+    """Balance at the end of the last snapshotted day before `day`."""
+    snapshots = DailyBalance.objects.filter(account_id=account_id)
+    previous = snapshots.filter(date__lt=day).order_by('-date').first()
+    if previous is not None:
+        return previous.closing_balance
+    following = snapshots.filter(date__gt=day).order_by('date').first()
+    if following is not None:
+        return following.closing_balance - following.credit_total + following.debit_total
+    # First snapshot of the account: everything it holds predates this posting
+    return BankAccount.objects.values_list('current_balance', flat=True).get(pk=account_id) - posted_delta
+
+
+def _post_monthly_aggregates(postings):
+    """Add postings to their (account, month, head, mode, type) totals."""
+    buckets = defaultdict(lambda: [Decimal('0.00'), 0])  # key -> [total, count]
+    for posting in postings:
+        key = (
+            posting.account_id, posting.transaction_date.replace(day=1),
+            posting.transaction_head, posting.transaction_mode, posting.transaction_type,
+        )
+        buckets[key][0] += posting.sign * posting.amount
+        buckets[key][1] += posting.sign
+
+    for (account_id, month, head, mode, transaction_type), (total, count) in sorted(buckets.items()):
+        if not total and not count:
+            continue
+        bucket = MonthlyAggregate.objects.filter(
+            account_id=account_id, month=month, transaction_head=head,
+            transaction_mode=mode, transaction_type=transaction_type,
+        )
+        updated = bucket.update(total=F('total') + total, count=F('count') + count)
+        if updated and count < 0:
+            bucket.filter(count=0).delete() # Last transaction left the bucket
+        elif not updated:
+            MonthlyAggregate.objects.create(
+                account_id=account_id, month=month, transaction_head=head,
+                transaction_mode=mode, transaction_type=transaction_type, total=total, count=count,
+            )
+
+
+def _post_checkpoints(postings):
+    """
+    Add postings for already verified transactions to their accounts' LedgerCheckpoint totals.
+
+    Only edits and deletes can touch one (new transactions get ids past every checkpoint): the
+    postings of transactions this batch reverses, including where they move to another account.
+    """
+    amended = {p.transaction_id for p in postings if p.sign < 0 and p.transaction_id is not None}
+    postings = [p for p in postings if p.transaction_id in amended]
+    if not postings:
+        return
+    verified_through = dict(
+        LedgerCheckpoint.objects.filter(account_id__in={p.account_id for p in postings})
+        .values_list('account_id', 'last_transaction_id')
+    )
+    deltas = defaultdict(Decimal)
+    for posting in postings:
+        if posting.transaction_id <= verified_through.get(posting.account_id, 0):
+            deltas[posting.account_id] += posting.delta
+    for account_id, delta in sorted(deltas.items()):
+        if delta:
+            LedgerCheckpoint.objects.filter(account_id=account_id).update(total=F('total') + delta)
+
+
+def bump_period_versions(periods):
+    """Bump the version of each (account_id, first-of-month) period, creating it at 1."""
+    for account_id, month in sorted(periods):
+        updated = PeriodVersion.objects.filter(account_id=account_id, month=month).update(version=F('version') + 1)
+        if not updated:
+            PeriodVersion.objects.create(account_id=account_id, month=month, version=1)
+
+
+def rebuild_daily_balances(account, start=None, end=None):
+    """
+    Recompute `account`'s snapshots from its transactions for days in [start, end].
+
+    Defaults to the whole history. Returns the number of snapshots written.
+    """
+    txns = Transaction.objects.filter(account=account)
+    if start is None:
+        start = txns.aggregate(first=Min('transaction_date'))['first']
+    snapshots = DailyBalance.objects.filter(account=account)
+    if start is None:
+        snapshots.delete()
+        return 0
+
+    in_range = txns.filter(transaction_date__gte=start)
+    if end is not None:
+        in_range = in_range.filter(transaction_date__lte=end)
+        snapshots = snapshots.filter(date__lte=end)
+
+    with transaction.atomic():
+        account = locked(account)
+        since_start = txns.filter(transaction_date__gte=start).aggregate(
+            total=Coalesce(Sum(signed_amount()), Decimal('0.00'))
+        )['total']
+        balance = account.current_balance - since_start
+        days = (
+            in_range.values('transaction_date')
+            .annotate(
+                debit=Coalesce(Sum('amount', filter=Q(transaction_type='DEBIT')), Decimal('0.00')),
+                credit=Coalesce(Sum('amount', filter=Q(transaction_type='CREDIT')), Decimal('0.00')),
+            )
+            .order_by('transaction_date')
+        )
+        rebuilt = []
+        for day in days:
+            balance += day['credit'] - day['debit']
+            rebuilt.append(DailyBalance(
+                account=account, date=day['transaction_date'], closing_balance=balance,
+                debit_total=day['debit'], credit_total=day['credit'],
+            ))
+        snapshots.filter(date__gte=start).delete()
+        DailyBalance.objects.bulk_create(rebuilt, batch_size=REBUILD_BATCH_SIZE)
+    return len(rebuilt)
+
+
+def rebuild_monthly_aggregates(account_id=None):
+    """Recompute the MonthlyAggregate rows of `account_id` (default every account) in one GROUP BY."""
+    txns, aggregates, versions = Transaction.objects.all(), MonthlyAggregate.objects.all(), PeriodVersion.objects.all()
+    if account_id is not None:
+        txns, aggregates, versions = (
+            queryset.filter(account_id=account_id) for queryset in (txns, aggregates, versions)
+        )
+    rows = (
+        txns
+        .annotate(month=TruncMonth('transaction_date'))
+        .values('account_id', 'month', 'transaction_head', 'transaction_mode', 'transaction_type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        aggregates.delete()
+        created = MonthlyAggregate.objects.bulk_create(
+            (MonthlyAggregate(**row) for row in rows.iterator()), batch_size=REBUILD_BATCH_SIZE
+        )
+        # Transactions may have been loaded behind post()'s back: invalidate the cached reports
+        versions.update(version=F('version') + 1)
+        PeriodVersion.objects.bulk_create(
+            [PeriodVersion(account_id=account_id, month=month, version=1)
+             for account_id, month in {(row.account_id, row.month) for row in created}],
+            batch_size=REBUILD_BATCH_SIZE, ignore_conflicts=True,
+        )
+    return len(created)
+
+
+def locked(instance):
+    """Re-read `instance` from the database, row-locked for the rest of the transaction."""
+    return type(instance)._base_manager.select_for_update().get(pk=instance.pk)
@@ -0,0 +1,206 @@
+# bank_accounts/statements.py
+import logging
+from decimal import Decimal
+
+from django.db.models import DecimalField, Exists, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import STATEMENT_ORDER, DailyBalance, Transaction, signed_amount
+
+# Columns emitted for each statement row. Mirrors TransactionSerializer, but read straight
+# from the joined query so no per-row lookups of `account` / `created_by` happen.
+STATEMENT_FIELDS = (
+    'id', 'account', 'transaction_type', 'transaction_head', 'transaction_mode', 'amount',
+    'cheque_no', 'description', 'transaction_date', 'balance_after', 'is_reconciled', 'reconciled_at',
+    'created_at', 'updated_at', 'created_by',
+)
+
+STREAM_CHUNK_SIZE = 2000
+logger = logging.getLogger('bank_accounts.statements')
+_TOTAL = Coalesce(Sum(signed_amount()), Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
+
+
+class StatementJSONEncoder(JSONEncoder):
+    """DRF's encoder, but keeps Decimals as strings like DecimalField does."""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+def statement_period(params):
+    """
+    (account_id, start_date, end_date) from bank statement query parameters. Raises
+    ValueError with a message for the client when they are missing or malformed.
+    """
+    account_id, start_date, end_date = (params.get(name) for name in ('account_id', 'start_date', 'end_date'))
+    if not all([account_id, start_date, end_date]):
+        raise ValueError("account_id, start_date, and end_date are required.")
+    try:
+        start_date, end_date = parse_date(start_date), parse_date(end_date)
+    except ValueError:
+        start_date = end_date = None
+    if start_date is None or end_date is None:
+        raise ValueError("start_date and end_date must be YYYY-MM-DD dates.")
+    return account_id, start_date, end_date
+
+
+def opening_balance(account, start_date):
+    """Balance of `account` at the start of `start_date`."""
+    return statement_opening(account, start_date)[0]
+
+
+def statement_opening(account, start_date):
+    """
+    (opening balance, stored) for a statement from `start_date`. Normally the opening is the
+    stored balance before the first transaction since then (or the current balance if nothing
+    has been posted since) and `stored` is True. If some of those transactions have no stored
+    balance (written without services.post), the opening is summed instead and `stored` is
+    False: the rows' running balances must then be added up from the opening too.
+
+    That fallback is summed in Python from exact Decimals, not with a SQL window: a GET cannot
+    store the missing balances (the read may be on the read-only replica), and SQLite returns
+    window sums as unrounded floats. It is logged, since `manage.py rebuild_running_balances`
+    restores the stored balances for good.
+    """
+    row = _first_posted_since(account, start_date).first()
+    if row is not None and row[2]:
+        _log_missing_balances(account, start_date)
+        return account.current_balance - _since(account, start_date).aggregate(total=_TOTAL)['total'], False
+    return _balance_before(row, account), True
+
+
+async def astatement_opening(account, start_date):
+    """statement_opening() for async views."""
+    row = await _first_posted_since(account, start_date).afirst()
+    if row is not None and row[2]:
+        _log_missing_balances(account, start_date)
+        total = (await _since(account, start_date).aaggregate(total=_TOTAL))['total']
+        return account.current_balance - total, False
+    return _balance_before(row, account), True
+
+
+def _log_missing_balances(account, start_date):
+    logger.warning(
+        "Account %s has transactions since %s without a stored running balance; summing them instead. "
+        "Run `manage.py rebuild_running_balances --account %s` to store them.", account.pk, start_date, account.pk,
+    )
+
+
+def _since(account, start_date):
+    return Transaction.objects.filter(account=account, transaction_date__gte=start_date)
+
+
+def _first_posted_since(account, start_date):
+    return (
+        _since(account, start_date).order_by(*STATEMENT_ORDER)
+        .values_list('balance_after', signed_amount(), Exists(_since(account, start_date).filter(balance_after=None)))
+    )
+
+
+def _balance_before(row, account):
+    if row is None:
+        return account.current_balance
+    balance_after, amount, _ = row
+    return balance_after - amount
+
+
+def signed_amount_of(row):
+    """A statement row's effect on its account, as signed_amount() computes it in SQL."""
+    if row['transaction_type'] == 'CREDIT':
+        return row['amount']
+    if row['transaction_type'] == 'DEBIT':
+        return -row['amount']
+    return Decimal('0.00')
+
+
+def balance_as_of(account, day):
+    """Closing balance of `account` on `day`, read from the nearest daily snapshot."""
+    snapshots = DailyBalance.objects.filter(account=account)
+    latest = snapshots.filter(date__lte=day).order_by('-date').first()
+    if latest is not None:
+        return latest.closing_balance
+    first = snapshots.order_by('date').first()
+    if first is not None:
+        # `day` is before any activity: back out the first day's movement
+        return first.closing_balance - first.credit_total + first.debit_total
+    return account.current_balance
+
+
+def statement_rows(account, start_date, end_date):
+    """Statement rows as dicts, with each transaction's stored `balance_after` as `running_balance`."""
+    return (
+        Transaction.objects
+        .filter(account=account, transaction_date__range=[start_date, end_date])
+        .annotate(
+            account_name=F('account__name'),
+            created_by_username=F('created_by__username'),
+            running_balance=F('balance_after'),
+        )
+        .order_by(*STATEMENT_ORDER)
+        .values(*STATEMENT_FIELDS, 'account_name', 'created_by_username', 'running_balance')
+    )
+
+
+def stream_statement(account_data, account, start_date, end_date, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a bank statement as JSON text, one chunk of rows at a time."""
+    opening, stored = statement_opening(account, start_date)
+    writer = _StatementWriter(account_data, opening, chunk_size, summed=not stored)
+    yield writer.head()
+    for row in statement_rows(account, start_date, end_date).iterator(chunk_size=chunk_size):
+        chunk = writer.add(row)
+        if chunk is not None:
+            yield chunk
+    yield writer.tail()
+
+
+async def astream_statement(account_data, account, start_date, end_date, chunk_size=STREAM_CHUNK_SIZE):
+    """stream_statement() as an async iterator, for async views."""
+    opening, stored = await astatement_opening(account, start_date)
+    writer = _StatementWriter(account_data, opening, chunk_size, summed=not stored)
+    yield writer.head()
+    async for row in statement_rows(account, start_date, end_date).aiterator(chunk_size=chunk_size):
+        chunk = writer.add(row)
+        if chunk is not None:
+            yield chunk
+    yield writer.tail()
+
+
+class _StatementWriter:
+    """The JSON framing of a streamed statement, emitted `chunk_size` rows at a time."""
+
+    def __init__(self, account_data, opening, chunk_size, summed=False):
+        self.encoder = StatementJSONEncoder()
+        self.summed = summed  # running balances are added up here rather than read from the rows
+        self.account_data = account_data
+        self.opening = self.closing = opening
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.first = True
+
+    def head(self):
+        return '{"account": %s, "opening_balance": %s, "transactions": [' % (
+            self.encoder.encode(self.account_data), self.encoder.encode(self.opening),
+        )
+
+    def add(self, row):
+        """Buffer one statement row; returns the next chunk of text once `chunk_size` are waiting."""
+        if self.summed:
+            row['running_balance'] = self.closing + signed_amount_of(row)
+        self.closing = row['running_balance']
+        self.buffer.append(self.encoder.encode(row))
+        if len(self.buffer) >= self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        chunk = ('' if self.first else ',') + ','.join(self.buffer)
+        self.buffer, self.first = [], False
+        return chunk
+
+    def tail(self):
+        rest = self.flush() if self.buffer else ''
+        return rest + '], "closing_balance": %s}' % self.encoder.encode(self.closing)
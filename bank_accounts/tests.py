@@ -1,3 +1,1530 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import F, Sum
+from django.db.models.functions import Lower
+from django.test import AsyncClient, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import integrity
+from .authentication import user_cache
+from .benchmarks import CASES, compare, run_cases, sqlite_throughput
+from .changes import latest_seq
+from .exports import iter_csv
+from .integrity import Discrepancy, verify_ledger
+from .loadtest import OPERATIONS, balance_snapshot, consistency_errors, percentile, run_load
+from .metrics import registry
+from .models import (
+    STATEMENT_ORDER, AdministrativeOrder, BankAccount, CashbookEntry, ChangeLog, DailyBalance, IdempotencyKey,
+    LedgerCheckpoint, LedgerEntry, MonthlyAggregate, PeriodVersion, Transaction, signed_amount,
+)
+from .pagination import KeysetPagination
+from .pdf import pdf_wait, statement_data
+from .routers import ReportReplicaRouter, reading_from, report_database
+from .serializers import TransactionSerializer
+from .services import Posting, post, rebuild_daily_balances, rebuild_monthly_aggregates, rebuild_running_balances
+from .statements import statement_rows
+from .views import BankAccountViewSet, TransactionViewSet
+
+
+@override_settings(SLOW_REQUEST_THRESHOLD_MS=60_000)  # contention is the point here; don't log it
+class ConcurrentPostingTests(TransactionTestCase):
+    """Many writers posting to one account must not lose balance updates."""
+
+    WRITERS = 8
+    POSTS_PER_WRITER = 20
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(
+            name='Fee Collection', account_number='111', current_balance=Decimal('1000.00')
+        )
+
+    def run_writers(self, work):
+        errors = []
+
+        def writer(index):
+            try:
+                work(index)
+            except Exception as exc:  # surfaced through `errors` below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_api_posts_do_not_drift(self):
+        def work(index):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            for n in range(self.POSTS_PER_WRITER):
+                response = client.post('/api/transactions/', {
+                    'account': self.account.id,
+                    'transaction_type': 'CREDIT' if n % 2 else 'DEBIT',
+                    'transaction_head': 'OTHERS',
+                    'transaction_mode': 'CASH',
+                    'amount': '1.25' if n % 2 else '0.50',
+                    'transaction_date': '2024-04-01',
+                }, format='json')
+                assert response.status_code == 201, response.content
+
+        self.run_writers(work)
+
+        self.account.refresh_from_db()
+        per_writer = (Decimal('1.25') - Decimal('0.50')) * (self.POSTS_PER_WRITER // 2)
+        self.assertEqual(self.account.current_balance, Decimal('1000.00') + per_writer * self.WRITERS)
+        self.assertEqual(Transaction.objects.count(), self.WRITERS * self.POSTS_PER_WRITER)
+
+    def test_concurrent_service_posts_do_not_drift(self):
+        posting = Posting(self.account.id, 'CREDIT', Decimal('0.10'), datetime.date(2024, 4, 1), 'OTHERS', 'CASH')
+
+        def work(index):
+            for _ in range(self.POSTS_PER_WRITER):
+                post([posting])
+
+        self.run_writers(work)
+
+        self.account.refresh_from_db()
+        self.assertEqual(
+            self.account.current_balance,
+            Decimal('1000.00') + Decimal('0.10') * self.WRITERS * self.POSTS_PER_WRITER,
+        )
+
+    def test_concurrent_amendments_wait_for_the_write_lock(self):
+        # Updates read the row before writing; with deferred transactions the lock upgrade
+        # fails outright ("database is locked") when another writer is active
+        entries = [Transaction.objects.create(
+            account=self.account, transaction_type='CREDIT', transaction_head='OTHERS', transaction_mode='CASH',
+            amount=Decimal('10.00'), transaction_date=datetime.date(2024, 4, 1),
+        ) for _ in range(self.WRITERS)]
+        Transaction.objects.filter(pk__in=[e.pk for e in entries]).update(amount=Decimal('0.00'))
+
+        def work(index):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            for n in range(1, self.POSTS_PER_WRITER + 1):
+                response = client.patch(f'/api/transactions/{entries[index].pk}/', {'amount': f'{n}.00'}, format='json')
+                assert response.status_code == 200, response.content
+
+        self.run_writers(work)
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('1000.00') + self.POSTS_PER_WRITER * self.WRITERS)
+
+    def test_production_mode_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_throughput_benchmark_from_worker_processes(self):
+        Transaction.objects.create(
+            account=self.account, transaction_type='CREDIT', transaction_head='OTHERS', transaction_mode='CASH',
+            amount=Decimal('10.00'), transaction_date=datetime.date(2024, 4, 1),
+        )
+        result = sqlite_throughput(workers=2, duration=0.5, write_share=0.5)
+        self.assertGreater(result['reads']['ops'] + result['writes']['ops'], 0)
+        self.assertEqual(result['writes']['errors'], {})
+
+    def test_update_and_delete_reverse_original_posting(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        other = BankAccount.objects.create(name='Salary', account_number='222')
+        created = client.post('/api/transactions/', {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '100.00', 'transaction_date': '2024-04-01',
+        }, format='json').json()
+
+        client.patch(f"/api/transactions/{created['id']}/", {
+            'account': other.id, 'transaction_type': 'DEBIT', 'amount': '40.00',
+        }, format='json')
+        self.account.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('1000.00'))
+        self.assertEqual(other.current_balance, Decimal('-40.00'))
+
+        client.delete(f"/api/transactions/{created['id']}/")
+        other.refresh_from_db()
+        self.assertEqual(other.current_balance, Decimal('0.00'))
+
+    def test_account_edits_leave_the_balance_to_postings(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        stale = BankAccount.objects.get(pk=self.account.pk)
+        post([Posting(self.account.id, 'CREDIT', Decimal('5.00'), datetime.date(2024, 4, 1), 'OTHERS', 'CASH')])
+
+        with mock.patch('rest_framework.generics.GenericAPIView.get_object', return_value=stale):
+            response = client.put(f'/api/bank-accounts/{self.account.id}/', {
+                'name': 'Fees', 'account_number': '111',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        for name in ('balance', 'current_balance'):
+            response = client.patch(f'/api/bank-accounts/{self.account.id}/', {name: '0.00'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('only through transactions', response.json()[name][0])
+        # Echoing the balance back unchanged is accepted
+        response = client.put(f'/api/bank-accounts/{self.account.id}/', {
+            'name': 'Fees', 'account_number': '111', 'balance': '1005.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.name, self.account.current_balance, self.account.version),
+                         ('Fees', Decimal('1005.00'), 1))
+
+    def test_ledger_verifier_in_worker_processes(self):
+        other = BankAccount.objects.create(name='Salary', account_number='222')
+        for account in (self.account, other):
+            post([Posting.of(Transaction.objects.create(
+                account=account, transaction_type='CREDIT', transaction_head='OTHERS', transaction_mode='CASH',
+                amount=Decimal('25.00'), transaction_date=datetime.date(2024, 4, 1),
+            ))])
+        self.assertEqual(verify_ledger(workers=2, batch_size=1), (2, []))
+
+        BankAccount.objects.filter(pk=other.pk).update(current_balance=F('current_balance') + 1)
+        checked, discrepancies = verify_ledger(workers=2, batch_size=1)
+        self.assertEqual(discrepancies, [Discrepancy(other.pk, Decimal('26.00'), Decimal('25.00'))])
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.fees = BankAccount.objects.create(name='Fees', account_number='111')
+        self.salary = BankAccount.objects.create(name='Salary', account_number='222')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def row(self, account, transaction_type, amount):
+        return {
+            'account': account.id, 'transaction_type': transaction_type, 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': amount, 'transaction_date': '2024-03-31',
+        }
+
+    def test_json_import_reports_bad_rows_and_posts_valid_ones(self):
+        rows = [
+            self.row(self.fees, 'CREDIT', '100.00'),
+            self.row(self.fees, 'DEBIT', 'lots'),
+            self.row(self.salary, 'DEBIT', '25.00'),
+            self.row(self.fees, 'CREDIT', '5.00') | {'account': 9999},
+            self.row(self.fees, 'CREDIT', '50.00'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/transactions/bulk/', rows, format='json')
+        statements = [q['sql'] for q in queries.captured_queries]
+        # one multi-row INSERT and one balance UPDATE per account, not per row
+        self.assertEqual(sum(sql.startswith('INSERT INTO "bank_accounts_transaction"') for sql in statements), 1)
+        self.assertEqual(sum(sql.startswith('UPDATE "bank_accounts_bankaccount"') for sql in statements), 2)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual([e['row'] for e in response.json()['errors']], [2, 4])
+        self.fees.refresh_from_db()
+        self.salary.refresh_from_db()
+        self.assertEqual(self.fees.current_balance, Decimal('150.00'))
+        self.assertEqual(self.salary.current_balance, Decimal('-25.00'))
+
+    def test_csv_import(self):
+        rows = [self.row(self.fees, 'CREDIT', '10.00'), self.row(self.salary, 'CREDIT', '20.00')]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        upload = io.BytesIO(buffer.getvalue().encode())
+        upload.name = 'receipts.csv'
+
+        response = self.client.post('/api/transactions/bulk/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.objects.filter(created_by=self.user).count(), 2)
+
+    def test_csv_that_is_not_utf8_is_rejected(self):
+        row = self.row(self.fees, 'CREDIT', '10.00') | {'description': 'Caf\u00e9 rent \u2013 March'}
+        upload = io.BytesIO((','.join(row) + '\n' + ','.join(map(str, row.values())) + '\n').encode('cp1252'))
+        upload.name = 'receipts.csv'
+
+        response = self.client.post('/api/transactions/bulk/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['error'])
+        self.assertFalse(Transaction.objects.exists())
+
+
+class QueryPlanTests(TestCase):
+    """The hot Transaction queries in views.py must be answered from an index."""
+
+    TABLE = Transaction._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='clerk', password='pw')
+        cls.account = BankAccount.objects.create(name='Fees', account_number='111')
+
+    def list_queryset(self, **params):
+        request = Request(APIRequestFactory().get('/api/transactions/', params))
+        request.user = self.user
+        view = TransactionViewSet(request=request, format_kwarg=None, action='list')
+        return view.filter_queryset(view.get_queryset())
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are written against SQLite')
+        plan = queryset.explain()
+        full_scans = [
+            line for line in plan.splitlines()
+            if re.search(rf'\bSCAN {self.TABLE}\b', line) and 'USING' not in line
+        ]
+        self.assertEqual(full_scans, [], plan)
+
+    def test_bank_statement(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)
+        self.assertUsesIndex(
+            Transaction.objects.filter(account=self.account, transaction_date__range=[start, end])
+            .order_by('transaction_date')
+        )
+        self.assertUsesIndex(statement_rows(self.account, start, end))
+        self.assertUsesIndex(Transaction.objects.filter(account=self.account, transaction_date__gte=start))
+
+    def test_list_filters(self):
+        self.assertUsesIndex(self.list_queryset())
+        self.assertUsesIndex(self.list_queryset(account=self.account.id))
+        self.assertUsesIndex(self.list_queryset(transaction_type='CREDIT'))
+
+    def test_head_by_date(self):
+        self.assertUsesIndex(
+            Transaction.objects.filter(transaction_head='OTHERS', transaction_date__gte='2024-01-01')
+        )
+
+
+class PostingAPITestCase(TestCase):
+    """A clerk's authenticated API client and a Fees account holding `balance`, posted to through the API."""
+    balance = Decimal('0.00')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111', current_balance=self.balance)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, day, transaction_type, amount, account=None, head='OTHERS', mode='CASH',
+               path='/api/transactions/', **fields):
+        return self.client.post(path, {
+            'account': (account or self.account).id, 'transaction_type': transaction_type,
+            'transaction_head': head, 'transaction_mode': mode, 'amount': amount, 'transaction_date': day, **fields,
+        }, format='json').json()['id']
+
+
+class DailyBalanceTests(PostingAPITestCase):
+    balance = Decimal('500.00')
+
+    def snapshot_rows(self):
+        return list(DailyBalance.objects.filter(account=self.account).exclude(
+            debit_total=0, credit_total=0,
+        ).values_list('date', 'closing_balance', 'debit_total', 'credit_total'))
+
+    def test_backdated_writes_match_a_full_rebuild(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        self.create('2024-03-20', 'DEBIT', '30.00')
+        backdated = self.create('2024-03-01', 'CREDIT', '7.50')   # before every snapshot
+        middle = self.create('2024-03-15', 'DEBIT', '12.00')
+        self.client.patch(f'/api/transactions/{middle}/', {'transaction_date': '2024-03-05'}, format='json')
+        self.client.delete(f'/api/transactions/{backdated}/')
+
+        incremental = self.snapshot_rows()
+        rebuild_daily_balances(self.account)
+        self.assertEqual(incremental, self.snapshot_rows())
+        self.assertEqual(incremental[-1][1], Decimal('558.00'))
+
+    def test_balance_as_of(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        self.create('2024-03-20', 'DEBIT', '30.00')
+        url = f'/api/bank-accounts/{self.account.id}/balance_as_of/'
+
+        self.assertEqual(self.client.get(url, {'date': '2024-03-01'}).json()['balance'], '500.00')
+        self.assertEqual(self.client.get(url, {'date': '2024-03-15'}).json()['balance'], '600.00')
+        self.assertEqual(self.client.get(url, {'date': '2025-01-01'}).json()['balance'], '570.00')
+        self.assertEqual(self.client.get(url, {'date': 'soon'}).status_code, 400)
+
+
+class RunningBalanceTests(PostingAPITestCase):
+    balance = Decimal('500.00')
+
+    def balances(self):
+        return list(Transaction.objects.filter(account=self.account).order_by(*STATEMENT_ORDER).values_list(
+            'transaction_date', 'balance_after',
+        ))
+
+    def test_backdated_writes_recompute_the_suffix(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        self.create('2024-03-20', 'DEBIT', '30.00')
+        backdated = self.create('2024-03-01', 'CREDIT', '7.50')
+        middle = self.create('2024-03-15', 'DEBIT', '12.00')
+        self.assertEqual([balance for _, balance in self.balances()], [
+            Decimal('507.50'), Decimal('607.50'), Decimal('595.50'), Decimal('565.50'),
+        ])
+
+        self.client.patch(f'/api/transactions/{middle}/', {'transaction_date': '2024-03-05'}, format='json')
+        self.client.delete(f'/api/transactions/{backdated}/')
+        self.assertEqual(self.balances(), [
+            (datetime.date(2024, 3, 5), Decimal('488.00')),
+            (datetime.date(2024, 3, 10), Decimal('588.00')),
+            (datetime.date(2024, 3, 20), Decimal('558.00')),
+        ])
+        incremental = self.balances()
+        self.assertEqual(rebuild_running_balances(self.account.id), 3)
+        self.assertEqual(incremental, self.balances())
+        # Only the suffix from `since` is rewritten
+        self.assertEqual(rebuild_running_balances(self.account.id, datetime.date(2024, 3, 6)), 2)
+
+    def test_statement_reads_stored_balances(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        self.create('2024-03-20', 'DEBIT', '30.00')
+        self.create('2024-04-02', 'DEBIT', '5.00')
+        params = {'account_id': self.account.id, 'start_date': '2024-03-15', 'end_date': '2024-03-31', 'stream': 'true'}
+        with self.assertNumQueries(3):  # account, opening balance, rows
+            response = self.client.get('/api/transactions/bank_statement/', params)
+            statement = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(statement['opening_balance'], '600.00')
+        self.assertEqual([row['running_balance'] for row in statement['transactions']], ['570.00'])
+        self.assertEqual(statement['closing_balance'], '570.00')
+
+        params['start_date'] = '2024-05-01'  # nothing posted since: the current balance
+        statement = json.loads(b''.join(self.client.get('/api/transactions/bank_statement/', params).streaming_content))
+        self.assertEqual((statement['opening_balance'], statement['closing_balance']), ('565.00', '565.00'))
+
+    def test_rows_without_stored_balances_are_summed(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        unposted = self.create('2024-03-20', 'DEBIT', '30.00')
+        self.create('2024-04-02', 'DEBIT', '5.00')
+        params = {'account_id': self.account.id, 'start_date': '2024-03-15', 'end_date': '2024-03-31', 'stream': 'true'}
+        url = '/api/transactions/bank_statement/'
+        stored = json.loads(b''.join(self.client.get(url, params).streaming_content))
+        # e.g. written through the admin, or before the running balance existed
+        Transaction.objects.filter(pk=unposted).update(balance_after=None)
+
+        with self.assertLogs('bank_accounts.statements', 'WARNING') as logs:
+            summed = json.loads(b''.join(self.client.get(url, params).streaming_content))
+        self.assertIn('rebuild_running_balances', logs.output[0])
+        self.assertEqual([row['balance_after'] for row in summed['transactions']], [None])  # as serialized
+        self.assertEqual(summed['transactions'][0]['running_balance'], '570.00')
+        summed['transactions'][0]['balance_after'] = '570.00'
+        self.assertEqual(summed, stored)
+        self.account.refresh_from_db()
+        with self.assertLogs('bank_accounts.statements', 'WARNING'):
+            header, rows = statement_data(self.account, datetime.date(2024, 3, 15), datetime.date(2024, 3, 31))
+        self.assertEqual((header['opening_balance'], rows[-1][-1], header['closing_balance']),
+                         ('600.00', '570.00', '570.00'))
+
+        rebuild_running_balances(self.account.id)
+        with self.assertNoLogs('bank_accounts.statements'):
+            self.assertEqual(json.loads(b''.join(self.client.get(url, params).streaming_content)), stored)
+
+    def test_streamed_statement_matches_the_serialized_one(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        self.create('2024-03-20', 'DEBIT', '30.00')
+        self.create('2024-03-20', 'CREDIT', '12.50')
+        self.create('2024-04-02', 'DEBIT', '5.00')
+        url = '/api/transactions/bank_statement/'
+        for start, end in [('2024-03-15', '2024-03-31'), ('2024-01-01', '2024-12-31'), ('2024-05-01', '2024-05-31')]:
+            params = {'account_id': self.account.id, 'start_date': start, 'end_date': end}
+            with self.subTest(start=start, end=end):
+                response = self.client.get(url, params | {'stream': 'true'})
+                self.assertTrue(response.streaming)
+                streamed = json.loads(b''.join(response.streaming_content))
+                # Streaming only adds the balances around and alongside the rows
+                opening, closing = streamed.pop('opening_balance'), streamed.pop('closing_balance')
+                running = [row.pop('running_balance') for row in streamed['transactions']]
+                self.assertEqual(streamed, self.client.get(url, params).json())
+                self.assertEqual(running, [row['balance_after'] for row in streamed['transactions']])
+                self.assertEqual(closing, running[-1] if running else opening)
+        self.assertEqual(streamed['transactions'], [])  # an empty period
+        self.assertEqual(opening, '577.50')
+
+
+class LedgerVerificationTests(PostingAPITestCase):
+    balance = Decimal('500.00')
+
+    def verify(self, **options):
+        return verify_ledger(workers=1, **options)[1]
+
+    def test_checkpoints_follow_new_and_edited_transactions(self):
+        self.assertEqual(self.account.opening_balance, Decimal('500.00'))
+        first = self.create('2024-03-10', 'CREDIT', '100.00')
+        last = self.create('2024-03-20', 'DEBIT', '30.00')
+        self.assertEqual(self.verify(), [])
+        checkpoint = LedgerCheckpoint.objects.get(account=self.account)
+        self.assertEqual((checkpoint.last_transaction_id, checkpoint.total), (last, Decimal('70.00')))
+
+        # Edits and deletes of verified transactions adjust the checkpoint as they post
+        self.client.patch(f'/api/transactions/{first}/', {'amount': '120.00'}, format='json')
+        self.client.delete(f'/api/transactions/{last}/')
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.total, Decimal('120.00'))
+        newest = self.create('2024-03-25', 'DEBIT', '5.00')
+        self.assertEqual(self.verify(), [])
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.last_transaction_id, checkpoint.total), (newest, Decimal('115.00')))
+
+    def test_only_transactions_past_the_checkpoint_are_read(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are written against SQLite')
+        with CaptureQueriesContext(connection) as queries:
+            integrity._scan([self.account.pk], full=False)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+            plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        self.assertEqual(plan.count('(account_id=? AND rowid>?)'), 2, plan)
+
+    def test_reports_and_repairs_drift(self):
+        first = self.create('2024-03-10', 'CREDIT', '100.00')
+        txn = self.create('2024-03-20', 'DEBIT', '30.00')
+        self.verify()
+        # Behind post()'s back: a balance nudged, and a verified transaction edited
+        BankAccount.objects.filter(pk=self.account.pk).update(current_balance=F('current_balance') + 1)
+        Transaction.objects.filter(pk=txn).update(amount=Decimal('40.00'))
+
+        self.assertEqual(self.verify(), [Discrepancy(self.account.pk, Decimal('571.00'), Decimal('560.00'))])
+        period = PeriodVersion.objects.get(account=self.account, month=datetime.date(2024, 3, 1)).version
+        seq = latest_seq()
+        self.assertEqual(self.verify(repair=True), [
+            Discrepancy(self.account.pk, Decimal('571.00'), Decimal('560.00'), repaired=True),
+        ])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('560.00'))
+        self.assertEqual(Transaction.objects.get(pk=txn).balance_after, Decimal('560.00'))
+        self.assertEqual(DailyBalance.objects.filter(account=self.account).last().closing_balance, Decimal('560.00'))
+        # What post() would have refreshed: the dashboard's aggregates, cached reports, the change feed
+        self.assertEqual(MonthlyAggregate.objects.get(account=self.account, transaction_type='DEBIT').total,
+                         Decimal('40.00'))
+        self.assertGreater(PeriodVersion.objects.get(account=self.account, month=datetime.date(2024, 3, 1)).version,
+                           period)
+        self.assertEqual(
+            set(ChangeLog.objects.filter(seq__gt=seq).values_list('model', 'object_id')),
+            {('bankaccount', self.account.pk), ('transaction', first), ('transaction', txn)},
+        )
+        self.assertEqual(self.verify(), [])
+
+    def test_unrecorded_openings_are_reported_until_accepted(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        # An account opened before opening balances were recorded, with a balance on top of its transactions
+        BankAccount.objects.filter(pk=self.account.pk).update(opening_balance=None)
+        unknown = Discrepancy(self.account.pk, Decimal('600.00'), Decimal('100.00'), opening_known=False)
+        self.assertEqual(self.verify(), [unknown])
+        self.assertEqual(self.verify(repair=True), [unknown])  # nothing to repair it against
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('600.00'))
+
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 of 1 accounts do not match'):
+            call_command('verify_ledger', '--workers=1', stdout=out)
+        self.assertIn(f'--accept-opening {self.account.pk}', out.getvalue())
+        out = io.StringIO()
+        call_command('verify_ledger', '--workers=1', f'--accept-opening={self.account.pk}', stdout=out)
+        self.assertIn('opening balance recorded as 500.00', out.getvalue())
+        self.assertEqual(self.verify(), [])
+
+    def test_command(self):
+        self.create('2024-03-10', 'CREDIT', '100.00')
+        out = io.StringIO()
+        call_command('verify_ledger', '--workers=1', '--full', stdout=out)
+        self.assertIn('Verified 1 accounts.', out.getvalue())
+        BankAccount.objects.filter(pk=self.account.pk).update(current_balance=Decimal('0.00'))
+        with self.assertRaisesMessage(CommandError, '1 of 1 accounts do not match'):
+            call_command('verify_ledger', '--workers=1', stdout=io.StringIO())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.row = {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '100.00', 'transaction_date': '2024-03-31',
+        }
+
+    def create(self, data, key='retry-1', path='/api/transactions/'):
+        return self.client.post(path, data, format='json', headers={'Idempotency-Key': key} if key else {})
+
+    def test_retry_replays_the_stored_response_without_posting_again(self):
+        first = self.create(self.row)
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.create(self.row)
+        self.assertEqual(len(queries), 1, [q['sql'] for q in queries.captured_queries])
+        self.assertIn('"bank_accounts_idempotencykey"', queries[0]['sql'])
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('100.00'))
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.create(self.row)
+        response = self.create(self.row | {'amount': '200.00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.create(self.row, path='/api/ledger-entries/').status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_without_a_key_every_post_creates(self):
+        self.create(self.row, key=None)
+        self.create(self.row, key=None)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.create(self.row, key='x' * 256).status_code, 400)
+
+    def test_failures_do_not_use_up_the_key(self):
+        self.assertEqual(self.create(self.row | {'amount': 'lots'}).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.create(self.row).status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_expired_keys_run_again_and_are_purged(self):
+        self.create(self.row)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        response = self.create(self.row)
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        out = io.StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_keys_belong_to_their_user(self):
+        self.create(self.row)
+        self.client.force_authenticate(User.objects.create_user(username='cashier', password='pw'))
+        self.assertNotIn('Idempotent-Replayed', self.create(self.row).headers)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_subclass_and_bulk_creates(self):
+        entry = self.row | {'reference_number': 'JV-1'}
+        self.assertEqual(self.create(entry, path='/api/ledger-entries/').status_code, 201)
+        self.assertEqual(self.create(entry, path='/api/ledger-entries/').headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+        for _ in range(2):
+            response = self.create([self.row, self.row], key='import-1', path='/api/transactions/bulk/')
+            self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Transaction.objects.filter(transaction_type='CREDIT').count(), 2)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.current_balance, Decimal('200.00'))
+
+
+class ChangeFeedTests(PostingAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cursor = self.client.get('/api/changes/').json()['cursor']
+
+    def sync(self, **params):
+        response = self.client.get('/api/changes/', {'since': self.cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        self.cursor = response.json()['cursor']
+        return response.json()
+
+    def test_writes_are_logged_with_what_they_change(self):
+        later = self.create('2024-03-20', 'CREDIT', '100.00')
+        self.sync()
+        backdated = self.create('2024-03-10', 'CREDIT', '5.00')
+
+        feed = self.sync()
+        self.assertFalse(feed['more'])
+        # The new row, the account's balance and the running balance of the row after it
+        self.assertEqual(
+            [(c['model'], c['id'], c['operation']) for c in feed['changes']],
+            [('bankaccount', self.account.id, 'update'), ('transaction', later, 'update'),
+             ('transaction', backdated, 'create')],
+        )
+        self.assertEqual(feed['changes'][0]['data']['balance'], '105.00')
+        self.assertEqual(feed['changes'][1]['data']['balance_after'], '105.00')
+        self.assertEqual(self.sync()['changes'], [])
+
+        self.client.delete(f'/api/transactions/{backdated}/')
+        changes = {(c['model'], c['id']): c for c in self.sync()['changes']}
+        self.assertEqual(changes['transaction', backdated], {
+            'seq': changes['transaction', backdated]['seq'], 'model': 'transaction', 'id': backdated,
+            'operation': 'delete',
+        })
+        self.assertEqual(changes['transaction', later]['data']['balance_after'], '100.00')
+
+    def test_changes_are_collapsed_and_paged(self):
+        txn = self.create('2024-03-10', 'CREDIT', '10.00')
+        self.client.patch(f'/api/transactions/{txn}/', {'description': 'fees'}, format='json')
+        self.client.patch(f'/api/transactions/{txn}/', {'description': 'late fees'}, format='json')
+
+        feed = self.sync(limit=2)
+        self.assertTrue(feed['more'])
+        seen = self.sync()
+        self.assertFalse(seen['more'])
+        self.assertEqual(ChangeLog.objects.filter(model='transaction', object_id=txn).count(), 3)
+        last = [c for c in seen['changes'] if c['model'] == 'transaction']
+        self.assertEqual([(c['operation'], c['data']['description']) for c in last], [('update', 'late fees')])
+
+        # Deleted later in the log: reported as deleted straight away
+        self.cursor = 0
+        self.client.delete(f'/api/transactions/{txn}/')
+        feed = self.sync(limit=2)  # the account's balance update, then the create
+        self.assertEqual([(c['model'], c['operation']) for c in feed['changes']],
+                         [('bankaccount', 'update'), ('transaction', 'delete')])
+
+    def test_entries_payments_and_cascades(self):
+        entry = self.create('2024-03-10', 'CREDIT', '10.00', path='/api/ledger-entries/', reference_number='JV-1')
+        order = AdministrativeOrder.objects.create(
+            order_number='AO-1', title='Fees', description='-', order_date=datetime.date(2024, 3, 1),
+            approved_by='Principal', related_transaction_id=entry,
+        )
+        self.client.post('/api/transactions/bulk/', [{
+            'account': self.account.id, 'transaction_type': 'DEBIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '1.00', 'transaction_date': '2024-03-11',
+        }], format='json')
+        logged = {(c['model'], c['id']): c['operation'] for c in self.sync()['changes']}
+        self.assertEqual(logged['ledgerentry', entry], 'create')
+        self.assertEqual(logged['transaction', entry], 'create')
+        self.assertIn('create', [op for (model, _), op in logged.items() if model == 'transaction' and _ != entry])
+
+        self.client.delete(f'/api/ledger-entries/{entry}/')
+        logged = {(c['model'], c['id']): c['operation'] for c in self.sync()['changes']}
+        self.assertEqual(logged['ledgerentry', entry], 'delete')
+        self.assertEqual(logged['transaction', entry], 'delete')
+        self.assertEqual(logged['administrativeorder', order.id], 'update')
+
+    def test_rejects_bad_cursors(self):
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/changes/', {'since': 0, 'limit': 0}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/changes/').status_code, 401)
+
+
+class DashboardSummaryTests(PostingAPITestCase):
+    balance = Decimal('1000.00')
+
+    def setUp(self):
+        super().setUp()
+        self.fees = self.account
+        self.salary = BankAccount.objects.create(name='Salary', account_number='222')
+
+    def test_summary_is_served_from_aggregates(self):
+        self.create('2024-05-10', 'CREDIT', '900.00', account=self.fees, head='STUDENT_FEES_TUITION', mode='NEFT')
+        self.create('2024-05-10', 'CREDIT', '100.00', account=self.fees, head='EXAM_FEES_COLLECTION')
+        self.create('2024-05-10', 'DEBIT', '400.00', account=self.salary, head='SALARIES_STAFF', mode='NEFT')
+        removed = self.create('2024-05-10', 'DEBIT', '50.00', account=self.salary, head='ELECTRICITY')
+        self.create('2024-04-30', 'CREDIT', '5.00', account=self.fees)
+        self.client.delete(f'/api/transactions/{removed}/')
+
+        with self.assertNumQueries(4):
+            summary = self.client.get('/api/dashboard-summary/', {'month': '2024-05'}).json()
+
+        self.assertEqual(summary['total_balance'], '1605.00')
+        self.assertEqual(summary['month_to_date'], {'credit': '1000.00', 'debit': '400.00'})
+        self.assertEqual(summary['top_heads'][0]['label'], 'Student Tuition Fees')
+        self.assertEqual(
+            [(m['mode'], m['credit'], m['debit']) for m in summary['modes']],
+            [('CASH', '100.00', '0.00'), ('NEFT', '900.00', '400.00')],
+        )
+
+        rebuild_monthly_aggregates()
+        self.assertEqual(self.client.get('/api/dashboard-summary/', {'month': '2024-05'}).json(), summary)
+
+    def test_filters_by_account_and_rejects_bad_parameters(self):
+        self.create('2024-05-10', 'CREDIT', '10.00', account=self.fees)
+        self.create('2024-05-10', 'DEBIT', '4.00', account=self.salary)
+        summary = self.client.get('/api/dashboard-summary/', {'month': '2024-05', 'account': self.fees.id}).json()
+        self.assertEqual(summary['month_to_date'], {'credit': '10.00', 'debit': '0.00'})
+
+        for params in ({'account': 'abc'}, {'month': 'May'}):
+            response = self.client.get('/api/dashboard-summary/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+
+class HeadPivotReportTests(PostingAPITestCase):
+    def setUp(self):
+        cache.clear()  # ids and versions repeat across rolled-back tests
+        super().setUp()
+        self.fees = self.account
+        self.salary = BankAccount.objects.create(name='Salary', account_number='222')
+
+    def pivot(self, **params):
+        params = {'start_date': '2024-04-01', 'end_date': '2024-06-30', **params}
+        return self.client.get('/api/reports/head-pivot/', params)
+
+    def test_head_by_month_and_mode(self):
+        self.create('2024-04-10', 'CREDIT', '900.00', account=self.fees, head='STUDENT_FEES_TUITION', mode='NEFT')
+        self.create('2024-04-20', 'CREDIT', '100.50', account=self.fees, head='STUDENT_FEES_TUITION')
+        self.create('2024-06-01', 'DEBIT', '40.00', account=self.fees, head='ELECTRICITY')
+        self.create('2024-05-31', 'DEBIT', '400.00', account=self.salary, head='SALARIES_STAFF', mode='NEFT')
+        self.create('2024-07-01', 'CREDIT', '5.00', account=self.fees)  # out of range
+
+        report = self.pivot().json()
+        self.assertEqual(report['column_labels'], ['2024-04', '2024-05', '2024-06'])
+        self.assertEqual([entry['account'] for entry in report['accounts']], [self.fees.id, self.salary.id])
+        fees = report['accounts'][0]
+        self.assertEqual([head['head'] for head in fees['heads']], ['ELECTRICITY', 'STUDENT_FEES_TUITION'])
+        tuition = fees['heads'][1]
+        self.assertEqual(tuition['label'], 'Student Tuition Fees')
+        self.assertEqual(tuition['income'], ['1000.50', '0.00', '0.00'])
+        self.assertEqual(tuition['expense_total'], '0.00')
+        self.assertEqual(fees['expense'], ['0.00', '0.00', '40.00'])
+        self.assertEqual(fees['income_total'], '1000.50')
+
+        by_mode = self.pivot(columns='mode', account=[self.fees.id]).json()
+        self.assertEqual(by_mode['column_labels'], ['NEFT', 'RTGS', 'CHEQUE', 'CASH', 'OTHER'])
+        self.assertEqual(len(by_mode['accounts']), 1)
+        self.assertEqual(by_mode['accounts'][0]['income'], ['900.00', '0.00', '0.00', '100.50', '0.00'])
+
+        empty = self.pivot(account=[self.salary.id], start_date='2023-01-01', end_date='2023-01-31').json()
+        self.assertEqual(empty['accounts'], [{
+            'account': self.salary.id, 'heads': [],
+            'income': ['0.00'], 'income_total': '0.00', 'expense': ['0.00'], 'expense_total': '0.00',
+        }])
+
+    def test_cached_until_a_posting_touches_its_accounts_and_months(self):
+        self.create('2024-04-10', 'CREDIT', '900.00', account=self.fees, head='STUDENT_FEES_TUITION', mode='NEFT')
+        first = self.pivot(account=[self.fees.id]).json()
+        with self.assertNumQueries(1):  # the version lookup only
+            self.assertEqual(self.pivot(account=[self.fees.id]).json(), first)
+
+        # Other accounts and months outside the range leave the cached report in place
+        self.create('2024-05-31', 'DEBIT', '400.00', account=self.salary, head='SALARIES_STAFF', mode='NEFT')
+        self.create('2024-07-01', 'DEBIT', '40.00', account=self.fees, head='ELECTRICITY')
+        with self.assertNumQueries(1):
+            self.pivot(account=[self.fees.id])
+
+        txn = self.create('2024-05-02', 'DEBIT', '40.00', account=self.fees, head='ELECTRICITY')
+        self.assertEqual(self.pivot(account=[self.fees.id]).json()['accounts'][0]['expense_total'], '40.00')
+        self.client.patch(f'/api/transactions/{txn}/', {'transaction_head': 'UTILITIES_WATER'}, format='json')
+        heads = self.pivot(account=[self.fees.id]).json()['accounts'][0]['heads']
+        self.assertEqual([head['head'] for head in heads], ['UTILITIES_WATER', 'STUDENT_FEES_TUITION'])
+
+        # Rebuilding the aggregates (after loading data in bulk) invalidates every report
+        Transaction.objects.filter(pk=txn).update(amount=Decimal('10.00'))
+        rebuild_monthly_aggregates()
+        self.assertEqual(self.pivot(account=[self.fees.id]).json()['accounts'][0]['expense_total'], '10.00')
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'start_date': 'x'}, {'end_date': '2024-03-01'}, {'columns': 'head'},
+                       {'account': 'fees'}, {'end_date': '2034-01-01'}):
+            self.assertEqual(self.pivot(**params).status_code, 400, params)
+
+
+class AsyncEndpointTests(TestCase):
+    """The /api/async/ endpoints, served through the ASGI handler, answer exactly like their DRF twins."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='clerk', password='pw')
+        cls.account = BankAccount.objects.create(name='Fees', account_number='111', current_balance=Decimal('500.00'))
+        BankAccount.objects.create(name='Hostel', account_number='222')
+        for n in range(6):
+            txn = Transaction.objects.create(
+                account=cls.account, transaction_type='DEBIT' if n % 3 else 'CREDIT',
+                transaction_head='ELECTRICITY' if n % 2 else 'STUDENT_FEES_TUITION', transaction_mode='CASH',
+                amount=Decimal('10.25') * (n + 1), transaction_date=datetime.date(2024, 5, 1 + n), created_by=cls.user,
+            )
+            post([Posting.of(txn)])
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.sync_client = APIClient()
+        self.sync_client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+        self.async_client = AsyncClient()
+
+    async def both(self, path, params=None):
+        expected = await sync_to_async(self.sync_client.get)(f'/api/{path}', params)
+        response = await self.async_client.get(f'/api/async/{path}', params, headers=self.headers)
+        self.assertEqual(response.status_code, expected.status_code, path)
+        return response, expected
+
+    async def test_same_responses_as_the_drf_endpoints(self):
+        statement = {'account_id': self.account.id, 'start_date': '2024-05-01', 'end_date': '2024-05-31'}
+        pivot = {'start_date': '2024-04-01', 'end_date': '2024-06-30'}
+        for path, params in [
+            ('bank-accounts/', {'page_size': 1}), (f'bank-accounts/{self.account.id}/', None),
+            ('transactions/bank_statement/', statement), ('transactions/bank_statement/', {'account_id': 1}),
+            ('dashboard-summary/', {'month': '2024-05'}), ('dashboard-summary/', {'month': 'May'}),
+            ('dashboard-summary/', {'month': '2024-05', 'account': self.account.id}),
+            ('dashboard-summary/', {'account': 'abc'}),
+            ('reports/head-pivot/', pivot), ('reports/head-pivot/', {**pivot, 'columns': 'mode'}),
+        ]:
+            response, expected = await self.both(path, params)
+            # page links point back at the endpoint that served them
+            self.assertEqual(json.loads(response.content.replace(b'/api/async/', b'/api/')), expected.json(), path)
+            self.assertEqual(response.get('ETag') is None, expected.get('ETag') is None, path)
+
+        response, expected = await self.both('bank-accounts/', {'page_size': 1})
+        self.assertTrue(response.json()['next'].startswith('http://testserver/api/async/bank-accounts/?'))
+        query = response.json()['next'].partition('?')[2]
+        response, expected = await self.both(f'bank-accounts/?{query}')
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(response.json()['results'], expected.json()['results'])
+
+    async def test_streamed_statement_and_conditional_get(self):
+        params = {'account_id': self.account.id, 'start_date': '2024-05-02', 'end_date': '2024-05-31', 'stream': 'true'}
+        response, expected = await self.both('transactions/bank_statement/', params)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(body), json.loads(await sync_to_async(b''.join)(expected.streaming_content)))
+        self.assertEqual(json.loads(body)['closing_balance'], '387.25')
+
+        conditional = {**self.headers, 'If-None-Match': response['ETag']}
+        response = await self.async_client.get('/api/async/transactions/bank_statement/', params, headers=conditional)
+        self.assertEqual(response.status_code, 304)
+        detail = f'/api/async/bank-accounts/{self.account.id}/'
+        etag = (await self.async_client.get(detail, headers=self.headers))['ETag']
+        response = await self.async_client.get(detail, headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_requires_a_valid_token(self):
+        response = await self.async_client.get('/api/async/bank-accounts/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_client.get('/api/async/dashboard-summary/', headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    async def test_metrics_count_queries_of_async_requests(self):
+        params = {'month': '2024-05'}
+        await self.async_client.get('/api/async/dashboard-summary/', params, headers=self.headers)  # caches the user
+        registry.clear()
+        await self.async_client.get('/api/async/dashboard-summary/', params, headers=self.headers)
+        self.assertIn('http_request_db_queries_sum{route="async-dashboard-summary",method="GET"} 4.0\n', registry.render())
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints issue the same number of queries however many rows they return."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_transactions(self, count):
+        Transaction.objects.bulk_create(
+            Transaction(
+                account=self.account, transaction_type='CREDIT', transaction_head='OTHERS',
+                transaction_mode='CHEQUE', amount=Decimal('10.00'), cheque_no=str(n),
+                transaction_date=datetime.date(2024, 1, 1) + datetime.timedelta(days=n),
+                created_by=self.user,
+            )
+            for n in range(count)
+        )
+        for n in range(count):
+            LedgerEntry.objects.create(
+                account=self.account, transaction_type='DEBIT', transaction_head='OTHERS',
+                transaction_mode='CASH', amount=Decimal('1.00'), transaction_date=datetime.date(2024, 2, 1),
+                reference_number=f'L-{self.account.id}-{LedgerEntry.objects.count()}',
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_independent_of_rows(self):
+        urls = ['/api/transactions/', '/api/ledger-entries/', '/api/bank-accounts/']
+        self.add_transactions(2)
+        small = [self.count_queries(url) for url in urls]
+        self.add_transactions(25)
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+    def test_values_rows_match_serializer_output(self):
+        self.add_transactions(3)
+        listed = self.client.get('/api/transactions/').json()
+        results = listed['results'] if isinstance(listed, dict) else listed
+        expected = TransactionSerializer(
+            Transaction.objects.filter(pk__in=[row['id'] for row in results]), many=True
+        ).data
+        by_id = {row['id']: row for row in expected}
+        self.assertEqual(results, [by_id[row['id']] for row in results])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        account = BankAccount.objects.create(name='Fees', account_number='111')
+        now = timezone.now()
+        Transaction.objects.bulk_create(
+            Transaction(
+                account=account, transaction_type='CREDIT', transaction_head='OTHERS', transaction_mode='CASH',
+                amount=Decimal(n), transaction_date=datetime.date(2024, 1, 1 + n % 3),
+            )
+            for n in range(11)
+        )
+        Transaction.objects.update(created_at=now) # force ties on everything but the id
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def follow(self, url, link):
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.client.get(url).json()
+            self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+            ids.append([row['id'] for row in body['results']])
+            url = body[link]
+        return ids
+
+    def test_pages_cover_the_ordering_both_ways(self):
+        expected = list(Transaction.objects.order_by('-transaction_date', '-created_at', '-id').values_list('id', flat=True))
+        forward = self.follow('/api/transactions/?page_size=4', 'next')
+        self.assertEqual([len(page) for page in forward], [4, 4, 3])
+        self.assertEqual(sum(forward, []), expected)
+
+        last_page = self.client.get('/api/transactions/?page_size=4').json()['next']
+        last_page = self.client.get(last_page).json()['next']
+        backward = self.follow(last_page, 'previous')
+        self.assertEqual(sum(reversed(backward), []), expected)
+
+    def test_ordering_filter_and_bad_cursor(self):
+        pages = self.follow('/api/transactions/?page_size=5&ordering=amount', 'next')
+        self.assertEqual(sum(pages, []), list(Transaction.objects.order_by('amount', 'id').values_list('id', flat=True)))
+        self.assertEqual(self.client.get('/api/transactions/?cursor=bogus').status_code, 404)
+
+    def test_search_results_are_paged_through_once(self):
+        # Repeated descriptions tie on rank, so the ordering falls through to the date, time and id
+        descriptions = ['Hostel rent', 'Hostel rent', 'Mess bill', 'Hostel and hostel mess', 'Hostel']
+        transactions = list(Transaction.objects.order_by('id'))
+        for txn, description in zip(transactions, descriptions * 2):
+            Transaction.objects.filter(pk=txn.pk).update(description=description)
+        matching = [txn.id for txn, description in zip(transactions, descriptions * 2) if 'ostel' in description]
+
+        forward = sum(self.follow('/api/transactions/?search=hostel&page_size=3', 'next'), [])
+        self.assertEqual(sorted(forward), matching)  # every match exactly once
+        last_page = '/api/transactions/?search=hostel&page_size=3'
+        for _ in range(2):
+            last_page = self.client.get(last_page).json()['next']
+        self.assertEqual(sum(reversed(self.follow(last_page, 'previous')), []), forward)
+
+    def test_expression_ordering(self):
+        paginator = KeysetPagination()
+        self.assertEqual(paginator.get_ordering(Transaction.objects.order_by(F('amount').desc())), ['-amount', '-id'])
+        with self.assertRaises(ImproperlyConfigured):
+            paginator.get_ordering(Transaction.objects.order_by(Lower('description')))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_credit(self):
+        self.client.post('/api/transactions/', {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '10.00', 'transaction_date': '2024-06-01',
+        }, format='json')
+
+    def assertRevalidates(self, url, params=None):
+        first = self.client.get(url, params)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):  # the version lookup only
+            cached = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        self.post_credit()
+        fresh = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+
+    def test_account_list(self):
+        self.assertRevalidates('/api/bank-accounts/')
+
+    def test_account_detail(self):
+        self.assertRevalidates(f'/api/bank-accounts/{self.account.id}/')
+
+    def test_bank_statement(self):
+        params = {'account_id': self.account.id, 'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+        self.assertRevalidates('/api/transactions/bank_statement/', params)
+
+
+class StatementPdfTests(TransactionTestCase):
+    """The rendering worker reads the statement itself, so the test data has to be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees & Dues', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.client.post('/api/transactions/', {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CHEQUE', 'cheque_no': '000123', 'amount': '1250.00',
+            'transaction_date': '2024-06-01', 'description': '<Term 1> fees',
+        }, format='json')
+
+    def test_pdf_is_rendered_once_per_account_version_and_edit(self):
+        params = {'account_id': self.account.id, 'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+        with self.settings(STATEMENT_PDF_CACHE_DIR=self.cache_dir):
+            response = self.client.get('/api/transactions/bank_statement_pdf/', params | {'wait': 30})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            body = b''.join(response.streaming_content)
+            self.assertTrue(body.startswith(b'%PDF'))
+            self.assertIn(b'(Statement 111)', body)
+
+            with self.assertNumQueries(1):  # account lookup; the PDF comes from the cache
+                cached = self.client.get('/api/transactions/bank_statement_pdf/', params)
+            self.assertEqual(cached.status_code, 200)
+            cached.close()
+            self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+            rendered = os.listdir(self.cache_dir)
+            self.client.patch(f'/api/bank-accounts/{self.account.id}/', {'name': 'Fees'}, format='json')
+            response = self.client.get('/api/transactions/bank_statement_pdf/', params | {'wait': 30})
+            self.assertEqual(response.status_code, 200)
+            response.close()
+            # The edit is a new file, and the one with the old name is dropped
+            self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+            self.assertNotEqual(os.listdir(self.cache_dir), rendered)
+
+    def test_wait_must_be_a_finite_number(self):
+        params = {'account_id': self.account.id, 'start_date': '2024-01-01', 'end_date': '2024-12-31'}
+        for wait in ('soon', 'nan', 'inf'):
+            with self.subTest(wait=wait):
+                response = self.client.get('/api/transactions/bank_statement_pdf/', params | {'wait': wait})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual([pdf_wait(value) for value in (None, '', '-5', '2.5', '90')], [0.0, 0.0, 0.0, 2.5, 30.0])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        Transaction.objects.bulk_create(
+            Transaction(
+                account=self.account, transaction_type='DEBIT' if n % 2 else 'CREDIT',
+                transaction_head='ELECTRICITY', transaction_mode='CASH', amount=Decimal(n) + Decimal('0.25'),
+                transaction_date=datetime.date(2024, 1, 1 + n % 4), created_by=self.user,
+            )
+            for n in range(10)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_csv_chunks_join_into_one_table(self):
+        frame = pd.read_csv(io.StringIO(''.join(iter_csv(Transaction.objects.all(), chunk_size=3))))
+        expected = list(Transaction.objects.order_by('transaction_date', 'id').values_list('id', flat=True))
+        self.assertEqual(list(frame['id']), expected)
+        self.assertEqual(set(frame['transaction_head_label']), {'Electricity Bill'})
+
+    def test_endpoint_applies_filters(self):
+        response = self.client.get('/api/transactions/export/', {'transaction_type': 'DEBIT'})
+        frame = pd.read_csv(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(frame), 5)
+
+        response = self.client.get('/api/transactions/export/', {'file_format': 'xlsx'})
+        sheet = pd.read_excel(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(sheet), 10)
+        self.assertEqual(sheet['amount'].sum(), 47.5)
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def txn(self, kind, amount, day, cheque_no=None):
+        return Transaction.objects.create(
+            account=self.account, transaction_type=kind, transaction_head='OTHERS',
+            transaction_mode='CHEQUE' if cheque_no else 'NEFT', amount=Decimal(amount),
+            transaction_date=datetime.date(2024, 1, day), cheque_no=cheque_no,
+        )
+
+    def upload(self, text, **data):
+        statement = io.BytesIO(text.encode())
+        statement.name = 'statement.csv'
+        return self.client.post(
+            f'/api/bank-accounts/{self.account.id}/reconcile/', {'file': statement, **data}, format='multipart',
+        )
+
+    def test_matches_within_tolerance_and_reports_leftovers(self):
+        fee = self.txn('CREDIT', '500.00', 10)
+        late = self.txn('DEBIT', '1200.50', 12)
+        cheque = self.txn('DEBIT', '300.00', 15, cheque_no='000123')
+        other_cheque = self.txn('DEBIT', '300.00', 15, cheque_no='999')
+        missing = self.txn('CREDIT', '75.00', 20)
+
+        response = self.upload(
+            'Date,Narration,Cheque No,Debit,Credit\n'
+            '2024-01-10,Fee,,,500.00\n'
+            '2024-01-14,Vendor,,"1,200.50",\n'
+            '2024-01-16,Chq,123,300.00,\n'
+            '2024-01-18,Charges,,15.00,\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {(m['line'], m['transaction']) for m in response.data['matches']},
+            {(1, fee.id), (2, late.id), (3, cheque.id)},
+        )
+        self.assertEqual([line['line'] for line in response.data['unmatched_statement_lines']], [4])
+        self.assertEqual({t['id'] for t in response.data['unmatched_transactions']}, {other_cheque.id})
+        self.assertNotIn(missing.id, {t['id'] for t in response.data['unmatched_transactions']})  # outside period
+        self.assertEqual(
+            set(Transaction.objects.filter(is_reconciled=True).values_list('id', flat=True)),
+            {fee.id, late.id, cheque.id},
+        )
+
+    def test_duplicate_amounts_pair_one_to_one(self):
+        ids = {self.txn('CREDIT', '50.00', 5).id for _ in range(3)}
+        response = self.upload('date,amount\n2024-01-05,50\n2024-01-05,50\n2024-01-06,50\n2024-01-06,50\n')
+        self.assertEqual({m['transaction'] for m in response.data['matches']}, ids)
+        self.assertEqual(len(response.data['unmatched_statement_lines']), 1)
+
+        # Reconciled transactions are not offered again
+        response = self.upload('date,amount\n2024-01-05,50\n')
+        self.assertEqual(response.data['matched'], 0)
+
+    def test_dry_run_and_bad_files(self):
+        self.txn('DEBIT', '10.00', 3)
+        response = self.upload('date,amount,type\n2024-01-03,10,DR\n', dry_run='true')
+        self.assertEqual(response.data['matched'], 1)
+        self.assertFalse(Transaction.objects.filter(is_reconciled=True).exists())
+
+        self.assertEqual(self.upload('when,amount\n2024-01-03,10\n').status_code, 400)
+        self.assertEqual(self.upload('date,amount\nyesterday,10\n').status_code, 400)
+
+    def test_day_first_dates(self):
+        first = self.txn('CREDIT', '10.00', 3)
+        second = self.txn('CREDIT', '20.00', 13)
+        # 03/01 is 3 January, not 1 March; the statement's window follows the dates as read
+        response = self.upload('Date,Amount\n03/01/2024,10\n13/01/2024,20\n', dry_run='true')
+        self.assertEqual({m['transaction'] for m in response.data['matches']}, {first.id, second.id})
+        self.assertEqual(response.data['unmatched_transactions'], [])
+
+        response = self.upload('Date,Amount\n01/03/2024,10\n01/13/2024,20\n', dry_run='true', dayfirst='false')
+        self.assertEqual(response.data['matched'], 2)
+        # A month-first file read day first has no 13th month
+        self.assertEqual(self.upload('Date,Amount\n01/13/2024,20\n').status_code, 400)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.fees = BankAccount.objects.create(name='Fees', account_number='111')
+        self.grants = BankAccount.objects.create(name='Research Grants', account_number='222')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def txn(self, description, account=None):
+        return Transaction.objects.create(
+            account=account or self.fees, transaction_type='CREDIT', transaction_head='OTHERS',
+            transaction_mode='CASH', amount=Decimal('10.00'), transaction_date=datetime.date(2024, 1, 1),
+            description=description,
+        )
+
+    def search(self, term, **params):
+        response = self.client.get('/api/transactions/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefix_match_ranked(self):
+        strong = self.txn('Electricity bill, electricity arrears')
+        weak = self.txn('Hostel electricity share and other charges for the month of January')
+        self.txn('Water bill')
+        self.assertEqual(self.search('elec'), [strong.id, weak.id])
+        self.assertEqual(self.search('ELECTRIC bill!'), [strong.id])
+        self.assertEqual(self.search('"unbalanced'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        entry = self.txn('Library books')
+        Transaction.objects.filter(pk=entry.pk).update(description='Lab equipment')
+        self.assertEqual(self.search('library'), [])
+        self.assertEqual(self.search('equip'), [entry.id])
+        entry.delete()
+        self.assertEqual(self.search('equip'), [])
+
+    def test_index_follows_account_changes(self):
+        entry = self.txn('Semester fees')
+        self.fees.name = 'Tuition'
+        self.fees.save()
+        self.assertEqual(self.search('tuition'), [entry.id])
+        Transaction.objects.filter(pk=entry.pk).update(account=self.grants)
+        self.assertEqual(self.search('tuition'), [])
+        self.assertEqual(self.search('research semester'), [entry.id])
+
+    def test_account_fields_and_pagination(self):
+        in_grants = [self.txn(f'Instalment {n}', account=self.grants).id for n in range(3)]
+        self.txn('Instalment for fees')
+        self.assertEqual(sorted(self.search('research')), sorted(in_grants))
+        self.assertEqual(sorted(self.search('222')), sorted(in_grants))
+
+        response = self.client.get('/api/transactions/', {'search': 'instal', 'page_size': 2})
+        seen = [row['id'] for row in response.data['results']]
+        self.assertIn('search_rank', response.data['results'][0])
+        seen += [row['id'] for row in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(sorted(seen), sorted(Transaction.objects.values_list('id', flat=True)))
+
+    def test_index_is_a_lookup_not_a_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('fees')
+        select = next(q['sql'] for q in queries.captured_queries if 'bank_accounts_transaction_fts' in q['sql'])
+        self.assertNotIn('LIKE', select.split('FROM "bank_accounts_bankaccount"')[0])
+
+
+class CachedAuthenticationTests(TestCase):
+    REQUESTS = 10
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def queries_for_requests(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(self.REQUESTS):
+                self.assertEqual(self.client.get(f'/api/bank-accounts/{self.account.id}/').status_code, 200)
+        return len(queries)
+
+    def test_user_lookup_once_per_process(self):
+        with mock.patch.object(BankAccountViewSet, 'authentication_classes', [JWTAuthentication]):
+            uncached = self.queries_for_requests()
+        cached = self.queries_for_requests()
+        # One user SELECT per request before; one in total now
+        self.assertEqual(uncached - cached, self.REQUESTS - 1)
+
+    def test_saving_user_evicts(self):
+        self.client.get(f'/api/bank-accounts/{self.account.id}/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(f'/api/bank-accounts/{self.account.id}/').status_code, 401)
+
+    @override_settings(AUTH_TOKEN_USER_FOR_SAFE_METHODS=True)
+    def test_token_user_for_reads(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/bank-accounts/{self.account.id}/')
+        self.assertFalse(any('auth_user' in q['sql'] for q in queries.captured_queries))
+
+        response = self.client.post('/api/transactions/', {
+            'account': self.account.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '5.00', 'transaction_date': '2024-01-01',
+        }, format='json')
+        self.assertEqual(Transaction.objects.get(pk=response.data['id']).created_by, self.user)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.account = BankAccount.objects.create(name='Fees', account_number='111')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_routes_recorded_and_exported(self):
+        for _ in range(3):
+            self.client.get('/api/bank-accounts/')
+        self.client.get(f'/api/bank-accounts/{self.account.id}/')
+
+        text = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_count{route="bankaccount-list",method="GET"} 3', text)
+        self.assertIn('http_request_db_queries_count{route="bankaccount-detail",method="GET"} 1', text)
+        buckets = re.findall(r'http_request_db_queries_bucket\{route="bankaccount-list",method="GET",le="([^"]+)"\} (\d+)', text)
+        self.assertEqual(buckets[-1], ('+Inf', '3'))
+        self.assertEqual([int(n) for _, n in buckets], sorted(int(n) for _, n in buckets))
+        render = re.search(r'http_response_render_duration_seconds_sum\{route="bankaccount-list",method="GET"\} (\S+)', text)
+        self.assertGreater(float(render[1]), 0)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+
+    def test_serialization_time_recorded(self):
+        # values() row shaping, a serializer, and the async list view's shaping under ASGI
+        self.client.get('/api/bank-accounts/')
+        self.client.get(f'/api/bank-accounts/{self.account.id}/')
+        response = async_to_sync(self.async_client.get)(
+            '/api/async/bank-accounts/', headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        text = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('# TYPE http_response_serialize_duration_seconds histogram', text)
+        sums = dict(re.findall(r'http_response_serialize_duration_seconds_sum\{route="([^"]+)",method="GET"\} (\S+)', text))
+        for route in ('bankaccount-list', 'bankaccount-detail', 'async-bankaccount-list'):
+            self.assertGreater(float(sums[route]), 0, route)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_requests_logged_with_queries(self):
+        with self.assertLogs('bank_accounts.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/bank-accounts/')
+        self.assertIn('(bankaccount-list)', logs.output[0])
+        self.assertIn('FROM "bank_accounts_bankaccount"', logs.output[0])
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_is_consistent_and_every_case_runs(self):
+        call_command('seed_data', transactions=300, accounts=2, batch_size=120, stdout=io.StringIO())
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertTrue(LedgerEntry.objects.exists() and CashbookEntry.objects.exists())
+        self.assertFalse(CashbookEntry.objects.exclude(transaction_mode='CASH').exists())
+        for account in BankAccount.objects.all():
+            total = account.transactions.aggregate(total=Sum(signed_amount()))['total']
+            self.assertEqual(account.current_balance, total)
+            self.assertEqual(account.daily_balances.last().closing_balance, total)
+            self.assertEqual(account.transactions.order_by(*STATEMENT_ORDER).last().balance_after, total)
+        # New rows get fresh ids after the seeded ones
+        self.assertGreater(Transaction.objects.create(
+            account=BankAccount.objects.first(), transaction_type='CREDIT', transaction_head='OTHERS',
+            transaction_mode='CASH', amount=Decimal('1.00'), transaction_date=datetime.date(2024, 1, 1),
+        ).id, 300)
+
+        results = run_cases(repeat=1)
+        self.assertEqual(set(results), {case.name for case in CASES})
+        failed = {name: r['status'] for name, r in results.items() if r['status'] and r['status'] >= 400}
+        self.assertEqual(failed, {})
+
+    def test_compare_flags_extra_queries_and_large_slowdowns(self):
+        baseline = {'1000': {'a': {'median_ms': 10.0, 'queries': 2}, 'b': {'median_ms': 1.0, 'queries': 1}}}
+        results = {'1000': {'a': {'median_ms': 30.0, 'queries': 3}, 'b': {'median_ms': 2.5, 'queries': 1}}}
+        queries, slowdowns = compare(results, baseline)
+        self.assertEqual(queries, [('1000', 'a', 2, 3)])
+        self.assertEqual(slowdowns, [('1000', 'a', 10.0, 30.0)])  # b is within the 2 ms floor
+
+
+@override_settings(SLOW_REQUEST_THRESHOLD_MS=60_000)  # logins hash passwords; don't log them
+class LoadTestHarnessTests(LiveServerTestCase):
+    def test_mixed_load_keeps_balances_consistent(self):
+        call_command('seed_data', transactions=200, accounts=2, stdout=io.StringIO())
+        credentials = []
+        for n in range(3):
+            User.objects.create_user(username=f'load-{n}', password='pw')
+            credentials.append({'username': f'load-{n}', 'password': 'pw'})
+        accounts = list(BankAccount.objects.values_list('pk', flat=True))
+        before = balance_snapshot()
+
+        report, net = run_load(self.live_server_url, credentials, accounts,
+                               datetime.date(2022, 4, 1), datetime.date(2024, 3, 31), duration=2)
+        self.assertEqual(report['auth-token']['statuses'], {'200': 3})
+        self.assertLessEqual(set(report), {op.name for op in OPERATIONS} | {'auth-token', 'all'})
+        self.assertGreater(report['all']['requests'], 10)
+        self.assertLessEqual(report['all']['p50_ms'], report['all']['p99_ms'])
+        self.assertEqual(consistency_errors(before, balance_snapshot(), net), [])
+
+    def test_consistency_errors_spot_lost_writes(self):
+        before = {1: (Decimal('100.00'), Decimal('100.00'), Decimal('100.00'))}
+        after = {1: (Decimal('110.00'), Decimal('115.00'), Decimal('110.00'))}
+        errors = consistency_errors(before, after, {1: Decimal('15.00')})
+        self.assertEqual(len(errors), 2)  # balance vs transactions, balance vs the clients' writes
+
+    def test_percentile_is_nearest_rank(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([percentile(ordered, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7.0], 99), 7.0)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Report reads go to a refreshed snapshot; writes and the reads after them stay on the primary."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Under the test runner the replica mirrors the primary; point it at a real snapshot
+        # file instead, opened read-only so anything routed there by mistake fails loudly
+        replica = connections['replica']
+        self.workdir = tempfile.mkdtemp(prefix='replica-')
+        self.mirrored = replica.settings_dict
+        replica.close()
+        replica.settings_dict = {
+            **self.mirrored, 'NAME': os.path.join(self.workdir, 'replica.sqlite3'),
+            'OPTIONS': {**self.mirrored['OPTIONS'], 'init_command': 'PRAGMA query_only = 1'},
+        }
+
+    def tearDown(self):
+        replica = connections['replica']
+        replica.close()
+        replica.settings_dict = self.mirrored
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def refresh(self):
+        call_command('refresh_replica', stdout=io.StringIO())
+
+    def account_names(self):
+        response = self.client.get('/api/bank-accounts/')
+        self.assertEqual(response.status_code, 200)
+        return {row['name'] for row in response.data['results']}
+
+    def test_mirror_or_missing_replica_reads_the_primary(self):
+        self.assertIsNone(report_database())  # no snapshot file yet
+        replica = connections['replica']
+        replica.settings_dict = self.mirrored
+        try:
+            self.assertIsNone(report_database())
+        finally:
+            replica.settings_dict = {**self.mirrored, 'NAME': os.path.join(self.workdir, 'replica.sqlite3')}
+
+    def test_lists_and_reports_read_the_snapshot(self):
+        BankAccount.objects.create(name='Fees', account_number='111')
+        self.refresh()
+        self.assertEqual(report_database(), 'replica')
+        late = BankAccount.objects.create(name='Hostel', account_number='222')
+
+        self.assertEqual(self.account_names(), {'Fees'})
+        self.assertEqual(self.client.get(f'/api/bank-accounts/{late.pk}/').status_code, 200)  # detail: primary
+        response = self.client.post('/api/transactions/', {
+            'account': late.id, 'transaction_type': 'CREDIT', 'transaction_head': 'OTHERS',
+            'transaction_mode': 'CASH', 'amount': '10.00', 'transaction_date': '2024-04-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        export = self.client.get('/api/transactions/export/')
+        self.assertEqual(b''.join(export.streaming_content).count(b'\n'), 1)  # header only
+
+        self.refresh()
+        self.assertEqual(self.account_names(), {'Fees', 'Hostel'})
+        export = self.client.get('/api/transactions/export/')
+        self.assertEqual(b''.join(export.streaming_content).count(b'\n'), 2)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        router = ReportReplicaRouter()
+        with reading_from('replica'):
+            self.assertEqual(router.db_for_read(Transaction), 'replica')
+            self.assertIsNone(router.db_for_read(User))  # auth always reads the primary
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            self.assertIsNone(router.db_for_read(Transaction))
+        self.assertIsNone(router.db_for_read(Transaction))
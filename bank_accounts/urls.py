@@ -1,8 +1,9 @@
 # college_bank_backend/bank_accounts/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
-    UserRegistrationView, 
+    UserRegistrationView, DashboardSummaryView, HeadPivotReportView, MetricsView, ChangeFeedView,
     BankAccountViewSet, TransactionViewSet, LedgerEntryViewSet
 )
 
@@ -13,6 +14,16 @@ router.register(r'ledger-entries', LedgerEntryViewSet, basename='ledgerentry') #
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
-    #path('dashboard-summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('dashboard-summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('reports/head-pivot/', HeadPivotReportView.as_view(), name='head-pivot-report'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    # Async-native read endpoints for ASGI deployments (async_views.py)
+    path('async/bank-accounts/', async_views.AccountListView.as_view(), name='async-bankaccount-list'),
+    path('async/bank-accounts/<int:pk>/', async_views.AccountDetailView.as_view(), name='async-bankaccount-detail'),
+    path('async/transactions/bank_statement/', async_views.BankStatementView.as_view(),
+         name='async-transaction-bank-statement'),
+    path('async/dashboard-summary/', async_views.DashboardSummaryView.as_view(), name='async-dashboard-summary'),
+    path('async/reports/head-pivot/', async_views.HeadPivotReportView.as_view(), name='async-head-pivot-report'),
     path('', include(router.urls)), # Important: This includes all routes from the router
 ]
\ No newline at end of file
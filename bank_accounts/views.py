@@ -2,28 +2,54 @@ from django.shortcuts import render
 
 # Create your views here.
 # bank_accounts/views.py
-from rest_framework import viewsets, status,generics
+from rest_framework import viewsets, status, generics, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth.models import User
-from .models import BankAccount, Transaction, LedgerEntry, CashbookEntry, Payment, Budget, AdministrativeOrder
+from .models import STATEMENT_ORDER, BankAccount, Transaction, LedgerEntry, CashbookEntry, Payment, Budget, AdministrativeOrder
 from .serializers import (
     BankAccountSerializer, TransactionSerializer, LedgerEntrySerializer,
     CashbookEntrySerializer, PaymentSerializer, BudgetSerializer,
-    AdministrativeOrderSerializer, UserSerializer # Import the new UserSerializer
+    AdministrativeOrderSerializer, UserSerializer, # Import the new UserSerializer
+    TransactionImportSerializer,
 )
-from django.db.models import Sum
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 
+import csv
+import io
+
 from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from . import changes
+from .conditional import account_etag, accounts_etag, make_etag, not_modified
+from .exports import iter_csv, write_xlsx
+from .idempotency import idempotent
+from .metrics import registry
+from .mixins import BalancePostingMixin, ChangeLogMixin, IdempotentCreateMixin, ReplicaReadMixin, ValuesListMixin
+from .pdf import pdf_wait, statement_pdf
+from .reconciliation import DEFAULT_TOLERANCE_DAYS, reconcile as reconcile_statement
+from .reports import (
+    ACCOUNT_TOTALS, DASHBOARD_TOP_HEADS, dashboard_account, dashboard_month, dashboard_queries, dashboard_summary,
+    head_pivot, pivot_params,
+)
+from .search import FullTextSearchFilter
+from .services import Posting, post
+from .statements import balance_as_of, statement_period, stream_statement
+
+BULK_IMPORT_BATCH_SIZE = 1000 # rows per INSERT in bulk imports
+BULK_IMPORT_MAX_ROWS = 50000
 
 
-class BankAccountViewSet(viewsets.ModelViewSet):
+class BankAccountViewSet(ReplicaReadMixin, ValuesListMixin, ChangeLogMixin, viewsets.ModelViewSet):
     # Add the queryset attribute here
     queryset = BankAccount.objects.all() # Define the base queryset for the viewset
     serializer_class = BankAccountSerializer
+    replica_actions = ('list', 'balance_as_of')
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = []
@@ -37,126 +63,244 @@ class BankAccountViewSet(viewsets.ModelViewSet):
         # or if you previously had a filter here for user-specific data, you'd remove it for global view.
         return self.queryset.all().order_by('-created_at') # Or simply return self.queryset if no further filtering
 
-class TransactionViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+    # Conditional GETs: answer 304 from the account version counters before touching the serializer
+    def list(self, request, *args, **kwargs):
+        etag = accounts_etag(request)
+        response = not_modified(request, etag) or super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = account_etag(request, kwargs['pk'])
+        response = not_modified(request, etag) or super().retrieve(request, *args, **kwargs)
+        if etag is not None and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        return response
+
+    @action(detail=True, methods=['get'])
+    def balance_as_of(self, request, pk=None):
+        """Closing balance on ?date=YYYY-MM-DD, from the daily snapshots."""
+        account = self.get_object()
+        try:
+            day = parse_date(request.query_params.get('date', ''))
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({"error": "date must be a YYYY-MM-DD date."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"account": account.id, "date": day, "balance": str(balance_as_of(account, day))})
+
+    @action(detail=True, methods=['post'])
+    def reconcile(self, request, pk=None):
+        """
+        Match the bank's statement CSV ('file') against this account's unreconciled transactions.
+
+        Optional form fields: tolerance_days (date slack, default 3, at most 31), dry_run, and
+        dayfirst (default true: 03/04/2025 is 3 April; false reads it month first). Matched
+        transactions are marked reconciled unless dry_run is set.
+        """
+        account = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the bank statement CSV in 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tolerance = int(request.data.get('tolerance_days', DEFAULT_TOLERANCE_DAYS))
+        except (TypeError, ValueError):
+            tolerance = -1
+        if not 0 <= tolerance <= 31:
+            return Response({"error": "tolerance_days must be a whole number from 0 to 31."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        dayfirst = str(request.data.get('dayfirst', 'true')).lower() in ('1', 'true', 'yes')
+
+        try:
+            result = reconcile_statement(account, upload.file, tolerance, dry_run=dry_run, dayfirst=dayfirst)
+        except (ValueError, UnicodeDecodeError) as exc:
+            return Response({"error": f"Could not read the statement: {exc}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        unmatched_lines = result.unmatched_lines.assign(amount=result.unmatched_lines['cents'] / 100)
+        unmatched_transactions = result.unmatched_transactions
+        return Response({
+            "account": account.id,
+            "dry_run": dry_run,
+            "matched": len(result.matches),
+            "matches": [
+                {"line": int(line), "transaction": int(txn)}
+                for line, txn in result.matches.itertuples(index=False, name=None)
+            ],
+            "unmatched_statement_lines": [
+                {"line": int(line), "date": day, "transaction_type": kind, "amount": f'{amount:.2f}',
+                 "cheque_no": cheque or None, "description": description or None}
+                for line, day, kind, amount, cheque, description in unmatched_lines[
+                    ['line', 'date', 'type', 'amount', 'cheque_no', 'description']
+                ].itertuples(index=False, name=None)
+            ],
+            "unmatched_transactions": [
+                {"id": int(txn), "transaction_date": day, "transaction_type": kind, "amount": str(amount),
+                 "cheque_no": cheque or None}
+                for txn, day, kind, amount, cheque in unmatched_transactions[
+                    ['transaction_id', 'date', 'type', 'amount', 'cheque_no']
+                ].itertuples(index=False, name=None)
+            ],
+        })
+
+class TransactionViewSet(ReplicaReadMixin, ValuesListMixin, IdempotentCreateMixin, ChangeLogMixin, BalancePostingMixin, viewsets.ModelViewSet):
+    queryset = Transaction.objects.select_related('account', 'created_by')
     serializer_class = TransactionSerializer
+    replica_actions = ('list', 'export', 'bank_statement', 'bank_statement_pdf')
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
 
     filterset_fields = ['transaction_type', 'account']
     search_fields = ['description', 'account__name', 'account__account_number']
     ordering_fields = ['amount', 'date', 'created_at']
 
-    @transaction.atomic  # Wrap in an atomic transaction
-    def perform_create(self, serializer):
-        transaction = serializer.save(created_by=self.request.user)
-        account = transaction.account
-        amount = transaction.amount
-
-        if transaction.transaction_type == 'CREDIT':
-            account.current_balance += amount
-        elif transaction.transaction_type == 'DEBIT':
-            account.current_balance -= amount
-        account.save()
-
-    @transaction.atomic  # Wrap in an atomic transaction
-    def perform_update(self, serializer):
-        original_transaction = self.get_object()
-        original_account = original_transaction.account
-        original_amount = original_transaction.amount
-        original_type = original_transaction.transaction_type
-
-        transaction = serializer.save()
-        new_account = transaction.account
-        new_amount = transaction.amount
-        new_type = transaction.transaction_type
-
-        # Scenario 1: Account changed
-        if original_account != new_account:
-            # Revert original account's balance
-            if original_type == 'CREDIT':
-                original_account.current_balance -= original_amount
-            elif original_type == 'DEBIT':
-                original_account.current_balance += original_amount
-            original_account.save()
-
-            # Apply new transaction to new account's balance
-            if new_type == 'CREDIT':
-                new_account.current_balance += new_amount
-            elif new_type == 'DEBIT':
-                new_account.current_balance -= new_amount
-            new_account.save()
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @idempotent
+    def bulk_import(self, request):
+        """Create many transactions from a JSON array or an uploaded CSV ('file'), posting balances once per account."""
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                rows = list(csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig')))
+            except UnicodeDecodeError:
+                return Response({"error": "The CSV file must be UTF-8 encoded; re-save it as UTF-8 and upload it again."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
         else:
-            # Scenario 2: Account is the same, amount or type changed
-            # Calculate the *difference* in amount
-            amount_difference = new_amount - original_amount
-
-            # Apply the *difference* based on transaction type
-            if new_type == 'CREDIT':
-                original_account.current_balance += amount_difference
-            elif new_type == 'DEBIT':
-                original_account.current_balance -= amount_difference
-            original_account.save()
-
-    @transaction.atomic  # Wrap in an atomic transaction
-    def perform_destroy(self, instance):
-        account = instance.account
-        amount = instance.amount
-        transaction_type = instance.transaction_type
-
-        if transaction_type == 'CREDIT':
-            account.current_balance -= amount
-        elif transaction_type == 'DEBIT':
-            account.current_balance += amount
-        account.save()
-        instance.delete()
+            return Response({"error": "Send a JSON array of transactions or a CSV file in 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > BULK_IMPORT_MAX_ROWS:
+            return Response({"error": f"At most {BULK_IMPORT_MAX_ROWS} rows per import."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One validator reused for every row; account ids are checked against a single query
+        validator = TransactionImportSerializer(
+            context={'account_ids': set(BankAccount.objects.values_list('id', flat=True))}
+        )
+        valid, errors = [], []
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as exc:
+                errors.append({"row": row_number, "errors": exc.detail})
+                continue
+            valid.append(Transaction(account_id=data.pop('account'), created_by=request.user, **data))
+
+        with transaction.atomic():
+            created = Transaction.objects.bulk_create(valid, batch_size=BULK_IMPORT_BATCH_SIZE)
+            post(Posting.of(txn) for txn in created)
+            changes.record(Transaction, [txn.pk for txn in created], changes.CREATE)
+
+        return Response(
+            {"created": len(created), "errors": errors},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
 
     @action(detail=False, methods=['get'])
-    def bank_statement(self, request):
-        account_id = request.query_params.get('account_id')
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        if not all([account_id, start_date, end_date]):
-            return Response({"error": "account_id, start_date, and end_date are required."}, status=status.HTTP_400_BAD_REQUEST)
+    def export(self, request):
+        """Filtered transactions as CSV (streamed) or XLSX (?file_format=xlsx), read in fixed-size chunks."""
+        queryset = self.filter_queryset(self.get_queryset())
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        filename = f"transactions-{timezone.localdate():%Y%m%d}"
+        if file_format == 'csv':
+            return StreamingHttpResponse(
+                iter_csv(queryset), content_type='text/csv',
+                headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'},
+            )
+        if file_format == 'xlsx':
+            return FileResponse(
+                write_xlsx(queryset), as_attachment=True, filename=f"{filename}.xlsx",
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
+        return Response({"error": "file_format must be csv or xlsx."}, status=status.HTTP_400_BAD_REQUEST)
+
+    def statement_params(self, request):
+        """((account, start_date, end_date), None) for valid statement parameters, else (None, error response)."""
+        try:
+            account_id, start_date, end_date = statement_period(request.query_params)
+        except ValueError as exc:
+            return None, Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             account = BankAccount.objects.get(id=account_id)
-            transactions = Transaction.objects.filter(
+        except (BankAccount.DoesNotExist, ValueError):
+            return None, Response({"error": "Bank account not found."}, status=status.HTTP_404_NOT_FOUND)
+        return (account, start_date, end_date), None
+
+    @action(detail=False, methods=['get'])
+    def bank_statement(self, request):
+        params, error = self.statement_params(request)
+        if error is not None:
+            return error
+        account, start_date, end_date = params
+
+        try:
+            # The statement only changes when the account is posted to (version) or edited
+            etag = make_etag(account.id, account.version, account.updated_at, request.get_full_path())
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
+            # ?stream=true sends the statement incrementally, with opening/running balances from SQL
+            if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+                return StreamingHttpResponse(
+                    stream_statement(BankAccountSerializer(account).data, account, start_date, end_date),
+                    content_type='application/json', headers={'ETag': etag},
+                )
+            transactions = Transaction.objects.select_related('account', 'created_by').filter(
                 account=account,
                 transaction_date__range=[start_date, end_date]
-            ).order_by('transaction_date')
+            ).order_by(*STATEMENT_ORDER)
             serializer = self.get_serializer(transactions, many=True)
             return Response({
                 "account": BankAccountSerializer(account).data,
                 "transactions": serializer.data
-            })
-        except BankAccount.DoesNotExist:
-            return Response({"error": "Bank account not found."}, status=status.HTTP_404_NOT_FOUND)
+            }, headers={'ETag': etag})
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class LedgerEntryViewSet(viewsets.ModelViewSet):
-    queryset = LedgerEntry.objects.all()
+    @action(detail=False, methods=['get'])
+    def bank_statement_pdf(self, request):
+        """
+        Printable statement for the bank_statement parameters.
+
+        Rendering happens in a worker process; until it is done this answers 202 and the client
+        polls the same URL (or passes ?wait=<seconds>, at most 30, to block for it). Finished
+        PDFs are cached per account version and edit, so repeat downloads are served straight
+        from disk.
+        """
+        params, error = self.statement_params(request)
+        if error is not None:
+            return error
+        account, start_date, end_date = params
+
+        try:
+            wait = pdf_wait(request.query_params.get('wait'))
+        except ValueError:
+            return Response({"error": "wait must be a number of seconds."}, status=status.HTTP_400_BAD_REQUEST)
+        job = statement_pdf(account, start_date, end_date, wait=wait)
+        if job.error is not None:
+            return Response({"error": f"Statement rendering failed: {job.error}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if not job.ready:
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '2'})
+        return FileResponse(
+            open(job.path, 'rb'), as_attachment=True, content_type='application/pdf',
+            filename=f"statement-{account.account_number}-{start_date}-{end_date}.pdf",
+        )
+
+class LedgerEntryViewSet(ReplicaReadMixin, ValuesListMixin, IdempotentCreateMixin, ChangeLogMixin, BalancePostingMixin, viewsets.ModelViewSet):
+    queryset = LedgerEntry.objects.select_related('account')
     serializer_class = LedgerEntrySerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
-
-class CashbookEntryViewSet(viewsets.ModelViewSet):
-    queryset = CashbookEntry.objects.all()
+class CashbookEntryViewSet(ReplicaReadMixin, ValuesListMixin, IdempotentCreateMixin, ChangeLogMixin, BalancePostingMixin, viewsets.ModelViewSet):
+    queryset = CashbookEntry.objects.select_related('account')
     serializer_class = CashbookEntrySerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
-
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all()
+class PaymentViewSet(ReplicaReadMixin, IdempotentCreateMixin, ChangeLogMixin, viewsets.ModelViewSet):
+    queryset = Payment.objects.select_related('transaction__account', 'transaction__created_by')
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         # When creating a payment, ensure a corresponding transaction is created first
         # This is a simplified example; in a real app, you'd handle this more robustly
@@ -171,24 +315,136 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
         transaction_serializer = TransactionSerializer(data=transaction_data)
         transaction_serializer.is_valid(raise_exception=True)
-        transaction = transaction_serializer.save(created_by=self.request.user) # Save with user
+        payment_transaction = transaction_serializer.save(created_by=self.request.user) # Save with user
+        post([Posting.of(payment_transaction)])
 
-        serializer.save(transaction=transaction)
+        serializer.save(transaction=payment_transaction)
+        changes.record_instance(payment_transaction, changes.CREATE)
+        changes.record_instance(serializer.instance, changes.CREATE)
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(ReplicaReadMixin, ValuesListMixin, ChangeLogMixin, viewsets.ModelViewSet):
     queryset = Budget.objects.all()
     serializer_class = BudgetSerializer
     permission_classes = [IsAuthenticated]
 
-class AdministrativeOrderViewSet(viewsets.ModelViewSet):
-    queryset = AdministrativeOrder.objects.all()
+class AdministrativeOrderViewSet(ReplicaReadMixin, ChangeLogMixin, viewsets.ModelViewSet):
+    queryset = AdministrativeOrder.objects.select_related(
+        'related_transaction__account', 'related_transaction__created_by'
+    )
     serializer_class = AdministrativeOrderSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
         # If a related_transaction_id is provided, link it.
         # Otherwise, the order might be created before the transaction.
-        serializer.save()
+        super().perform_create(serializer)
+
+
+class MetricsView(APIView):
+    """Per-route request metrics of this process in the Prometheus text format."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class DashboardSummaryView(ReplicaReadMixin, APIView):
+    """Headline dashboard figures, read from MonthlyAggregate rather than the transaction table."""
+    permission_classes = [IsAuthenticated]
+    replica_actions = None
+    top_heads = DASHBOARD_TOP_HEADS
+
+    def get(self, request):
+        try:
+            month = dashboard_month(request.query_params.get('month'))
+        except ValueError:
+            return Response({"error": "month must be YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            account_id = dashboard_account(request.query_params.get('account'))
+        except ValueError:
+            return Response({"error": "account must be an account id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        accounts, by_type, heads, modes = dashboard_queries(month, account_id, self.top_heads)
+        return Response(dashboard_summary(month, accounts.aggregate(**ACCOUNT_TOTALS), by_type, heads, modes))
+
+
+class HeadPivotReportView(ReplicaReadMixin, APIView):
+    """
+    Income/expense by transaction head x month (or ?columns=mode) per account.
+
+    Query parameters: start_date and end_date (YYYY-MM-DD, required), account (repeatable;
+    default every account). Aggregated in one GROUP BY and cached until the next posting to
+    any of the accounts and months it covers (reports.py).
+    """
+    permission_classes = [IsAuthenticated]
+    replica_actions = None
+
+    def get(self, request):
+        try:
+            params = pivot_params(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(head_pivot(*params))
+
+
+class ChangeFeedView(APIView):
+    """
+    What changed after ?since=<seq>, from the change log (changes.py), for clients keeping
+    local copies of the lists in sync.
+
+    Each change is the object's latest operation in the page, in sequence order: creates and
+    updates carry the object as its list endpoint shows it (fetched with one query per model),
+    deletes only the id. Pass `cursor` back as `since` until `more` is false; ?limit= sets the
+    page size. Without `since` only the current cursor is returned: read it before a full
+    download of the lists, then poll from it.
+    """
+    permission_classes = [IsAuthenticated]
+    viewsets = {
+        viewset.queryset.model._meta.model_name: viewset
+        for viewset in (BankAccountViewSet, TransactionViewSet, LedgerEntryViewSet, CashbookEntryViewSet,
+                        PaymentViewSet, BudgetViewSet, AdministrativeOrderViewSet)
+    }
+
+    def get(self, request):
+        if 'since' not in request.query_params:
+            return Response({"changes": [], "cursor": changes.latest_seq(), "more": False})
+        try:
+            since = int(request.query_params['since'])
+            limit = int(request.query_params.get('limit', changes.CHANGE_FEED_PAGE_SIZE))
+        except ValueError:
+            since = limit = -1
+        if since < 0 or not 0 < limit <= changes.CHANGE_FEED_MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"since must be a sequence number and limit from 1 to {changes.CHANGE_FEED_MAX_PAGE_SIZE}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Objects are read after the log, so they are at least as new as their entries; anything
+        # changed in between is logged past the cursor and delivered again on the next poll
+        entries, cursor, more = changes.changes_since(since, limit)
+        current = self.current_objects(request, entries)
+        delta = []
+        for seq, model, object_id, operation in entries:
+            data = current.get((model, object_id))
+            if data is None:  # deleted since; its delete is further along the log
+                delta.append({"seq": seq, "model": model, "id": object_id, "operation": changes.DELETE})
+            else:
+                delta.append({"seq": seq, "model": model, "id": object_id, "operation": operation, "data": data})
+        return Response({"changes": delta, "cursor": cursor, "more": more})
+
+    def current_objects(self, request, entries):
+        """{(model, id): serialized object} for the entries' objects that still exist."""
+        ids = {}
+        for _, model, object_id, operation in entries:
+            if operation != changes.DELETE:
+                ids.setdefault(model, []).append(object_id)
+        current = {}
+        for model, model_ids in ids.items():
+            viewset = self.viewsets[model]
+            objects = viewset.queryset.filter(pk__in=model_ids)
+            for data in viewset.serializer_class(objects, many=True, context={'request': request}).data:
+                current[model, data['id']] = data
+        return current
 
 
 # --- New User Registration View ---
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bank_accounts.metrics.RequestMetricsMiddleware', # Outermost, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # Add this
@@ -82,18 +83,58 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'college_bank_backend.wsgi.application'
+# For ASGI servers, e.g. `uvicorn college_bank_backend.asgi:application`; the async read
+# endpoints (bank_accounts/async_views.py, under /api/async/) only pay off there.
+ASGI_APPLICATION = 'college_bank_backend.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite production mode, applied to every new connection. WAL, which lets readers run
+# alongside the single writer, is a property of the database file and is switched on once by
+# migration 0016, so merely opening a database never rewrites it. synchronous=NORMAL only
+# fsyncs at checkpoints (still crash-safe under WAL); mmap and a larger page cache cut read
+# syscalls. `manage.py benchmark_sqlite` compares this against Django's defaults.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            # Write transactions take the write lock at BEGIN, so concurrent writers queue on
+            # the busy timeout instead of failing a read-to-write lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # seconds a writer waits for the lock
+            'init_command': '; '.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        # File-backed (not in-memory) test DB so threaded tests see real SQLite locking
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    # Read-only snapshot of the primary for report and list endpoints (bank_accounts/routers.py),
+    # refreshed with `manage.py refresh_replica`. Until the file exists reads stay on the primary.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'OPTIONS': {
+            'init_command': '; '.join(
+                ['PRAGMA query_only = 1'] + [f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()
+                                             if name in ('mmap_size', 'cache_size', 'temp_store')]
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+REPORT_DATABASE = 'replica'
+DATABASE_ROUTERS = ['bank_accounts.routers.ReportReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,13 +179,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'bank_accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Default to authenticated access
-    )
+    ),
+    # Keyset (cursor) pages: constant cost at any depth, no COUNT(*). Clients may pass ?page_size= up to 500.
+    'DEFAULT_PAGINATION_CLASS': 'bank_accounts.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# PDF bank statements: rendered by a pool of worker processes (0 = render in the request thread)
+# and cached on disk per account version.
+STATEMENT_PDF_WORKERS = 2
+STATEMENT_PDF_CACHE_DIR = BASE_DIR / 'statement_pdfs'
+
+# Authenticated users are cached per process for AUTH_USER_CACHE_TTL seconds. Set
+# AUTH_TOKEN_USER_FOR_SAFE_METHODS to serve read-only requests from the token claims alone.
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+AUTH_TOKEN_USER_FOR_SAFE_METHODS = False
+
+# Seconds a head x month pivot report stays cached; postings invalidate it sooner (bank_accounts/reports.py).
+# Cache keys are derived from the database, so any CACHES backend (per-process or shared) stays correct.
+REPORT_CACHE_TIMEOUT = 15 * 60
+
+# Seconds a create request's response is kept for replay to retries with the same Idempotency-Key header.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Requests slower than this are logged (logger 'bank_accounts.slow_requests') with their slowest queries.
+SLOW_REQUEST_THRESHOLD_MS = 500
+SLOW_REQUEST_TOP_QUERIES = 5
+
 from datetime import timedelta
 
 SIMPLE_JWT = {